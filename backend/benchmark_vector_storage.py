@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Benchmark compact vector storage against full-precision float32
+
+For each precision / index dimension it reports index size on disk, load
+time, query latency (truncated search + full-vector re-score) and recall@k
+against exact float32 search. Vectors come from the local chroma_db (ingested
+without compact storage) or are generated with --synthetic.
+
+    python benchmark_vector_storage.py
+    python benchmark_vector_storage.py --synthetic 20000 --dims 768,512,256
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import django
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from rag_service.quantization import PRECISIONS, CompactVectors, rescore, truncate
+
+
+def load_vectors(args):
+    """Stored chunk vectors, from chroma_db or synthetic"""
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        # Decaying variance, so the leading dimensions carry most of the signal
+        # like a Matryoshka-trained model
+        vectors = (rng.standard_normal((args.synthetic, args.dim)) / np.sqrt(np.arange(1, args.dim + 1))).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    from rag_service.vector_store import VectorStore
+    store = VectorStore(persist_directory=args.persist_directory)
+    if store._compact_vectors() is not None:
+        sys.exit("❌ chroma_db uses compact storage; re-ingest with RAG_VECTOR_PRECISION=float32 or use --synthetic")
+    results = store.collection.get(include=['embeddings'])
+    return np.asarray(results['embeddings'], dtype=np.float32)
+
+
+def make_queries(vectors, count, noise=0.5):
+    """Perturbed copies of stored vectors, standing in for question embeddings"""
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * noise / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def top_k(index, query, k):
+    """Exact squared-L2 nearest neighbours (stands in for ChromaDB's HNSW search)"""
+    distances = ((index - query) ** 2).sum(axis=1)
+    k = min(k, len(index))
+    candidates = np.argpartition(distances, k - 1)[:k]
+    return candidates[np.argsort(distances[candidates])]
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def benchmark(vectors, queries, ids, precision, dim, k, factor):
+    """Size, load time, latency and recall of one configuration"""
+    truth = [set(top_k(vectors, query, k).tolist()) for query in queries]
+    plain = precision == 'float32' and dim is None
+
+    with tempfile.TemporaryDirectory() as directory:
+        np.save(os.path.join(directory, "index.npy"), truncate(vectors, dim))
+        if not plain:
+            CompactVectors.build(ids, vectors, precision, dim).save(directory)
+        size = directory_size(directory)
+
+        start = time.perf_counter()
+        index = np.load(os.path.join(directory, "index.npy"))
+        compact = None if plain else CompactVectors.load(directory)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            if plain:
+                found = top_k(index, query, k)
+            else:
+                candidates = top_k(index, truncate(query, dim), k * factor)
+                order, _, _ = rescore(query, [ids[i] for i in candidates], compact, k)
+                found = candidates[order]
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(expected & set(found.tolist()))
+
+    return {
+        'size_mb': size / 1e6,
+        'load_ms': load_ms,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'recall': hits / (len(queries) * min(k, len(vectors))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many vectors instead of reading chroma_db")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension of synthetic vectors")
+    parser.add_argument("--dims", default="full,512,256,128", help="Index dimensions to compare")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=int(os.getenv('RAG_RESCORE_FACTOR', '4')))
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    if len(vectors) == 0:
+        sys.exit("❌ No vectors found; run ingest_documents.py or pass --synthetic")
+    queries = make_queries(vectors, args.queries)
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    dims = [None if dim == "full" else int(dim) for dim in args.dims.split(",")]
+
+    print(f"🔍 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}, re-score {args.rescore_factor}x\n")
+    print(f"{'precision':<10} {'index dim':>9} {'size MB':>9} {'load ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+    for precision in PRECISIONS:
+        for dim in dims:
+            if dim is not None and dim >= vectors.shape[1]:
+                continue
+            result = benchmark(vectors, queries, ids, precision, dim, args.k, args.rescore_factor)
+            print(
+                f"{precision:<10} {dim or vectors.shape[1]:>9} {result['size_mb']:>9.2f} {result['load_ms']:>9.1f} "
+                f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['recall']:>9.3f}"
+            )
+
+    print("\nSizes cover the indexed vectors plus the re-scoring copy (ChromaDB's own overhead excluded).")
+
+
+if __name__ == "__main__":
+    main()
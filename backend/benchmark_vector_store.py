@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Benchmark the flat NumPy vector store against ChromaDB
+
+For each backend and corpus size it builds a store of synthetic chunks, then
+opens it in a fresh process and reports open time, query latency and the
+process RSS after querying.
+
+    python benchmark_vector_store.py
+    python benchmark_vector_store.py --sizes 10000 --backends flat --queries 500
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from rag_service.flat_vector_store import FlatIndex, encode_payloads, normalize
+
+BUILD_BATCH = 5000
+
+
+def synthetic_batches(size, dim, batch=BUILD_BATCH):
+    """Yield (ids, documents, metadatas, normalized embeddings) in batches"""
+    rng = np.random.default_rng(0)
+    for start in range(0, size, batch):
+        end = min(start + batch, size)
+        ids = [f"doc_{i}" for i in range(start, end)]
+        documents = [f"Synthetic chunk {i} about kubernetes, terraform and vertex ai pipelines." for i in range(start, end)]
+        metadatas = [{'source': f"docs/synthetic_{i // 20}.md", 'category': "synthetic", 'chunk_id': i % 20} for i in range(start, end)]
+        yield ids, documents, metadatas, normalize(rng.standard_normal((end - start, dim)))
+
+
+def build_flat(directory, size, dim):
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(directory, "build_embeddings.npy"), mode='w+', dtype=np.float32, shape=(size, dim)
+    )
+    all_ids, sources, payloads, lengths = [], [], [], []
+    for ids, documents, metadatas, vectors in synthetic_batches(size, dim):
+        start = len(all_ids)
+        embeddings[start:start + len(ids)] = vectors
+        all_ids.extend(ids)
+        sources.extend(metadata['source'] for metadata in metadatas)
+        payload, batch_lengths = encode_payloads(documents, metadatas)
+        payloads.append(payload)
+        lengths.append(batch_lengths)
+    FlatIndex.write(directory, embeddings, all_ids, sources, b"".join(payloads), np.concatenate(lengths), "synthetic")
+    del embeddings
+    os.remove(os.path.join(directory, "build_embeddings.npy"))
+
+
+def build_chroma(directory, size, dim):
+    from rag_service.vector_store import VectorStore
+    store = VectorStore(persist_directory=directory, precision='float32', index_dim=None)
+    batch = min(BUILD_BATCH, store.client.get_max_batch_size())
+    for ids, documents, metadatas, vectors in synthetic_batches(size, dim, batch):
+        store.collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=vectors)
+
+
+def rss_mb():
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(backend, directory, queries, dim, k):
+    """Run in a fresh process: open the store and query it"""
+    baseline = rss_mb()
+    start = time.perf_counter()
+    if backend == 'flat':
+        from rag_service.flat_vector_store import FlatVectorStore
+        store = FlatVectorStore(directory)
+    else:
+        from rag_service.vector_store import VectorStore
+        store = VectorStore(directory)
+    count = store.count()
+    open_ms = (time.perf_counter() - start) * 1000
+
+    rng = np.random.default_rng(1)
+    query_vectors = normalize(rng.standard_normal((queries + 1, dim)))
+
+    start = time.perf_counter()
+    store.search(query_vectors[0].tolist(), k=k)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for query in query_vectors[1:]:
+        start = time.perf_counter()
+        store.search(query.tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'count': count,
+        'open_ms': open_ms,
+        'first_query_ms': first_ms,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'rss_mb': rss_mb() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,1000000", help="Corpus sizes (chunks)")
+    parser.add_argument("--backends", default="chroma,flat")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=20)
+    parser.add_argument("--measure", nargs=2, metavar=("BACKEND", "DIRECTORY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure, args.queries, args.dim, args.k)))
+        return
+
+    print(f"{'backend':<8} {'chunks':>9} {'build s':>8} {'open ms':>9} {'1st query':>10} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        for backend in args.backends.split(","):
+            directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+            try:
+                start = time.perf_counter()
+                (build_flat if backend == 'flat' else build_chroma)(directory, size, args.dim)
+                build_s = time.perf_counter() - start
+
+                # A new process, so open time and RSS are not skewed by the build
+                output = subprocess.run(
+                    [sys.executable, __file__, "--measure", backend, directory,
+                     "--queries", str(args.queries), "--dim", str(args.dim), "-k", str(args.k)],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(
+                    f"{backend:<8} {result['count']:>9} {build_s:>8.1f} {result['open_ms']:>9.1f} "
+                    f"{result['first_query_ms']:>10.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['rss_mb']:>8.1f}"
+                )
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    print("\nRSS is the growth over the interpreter baseline after the queries; "
+          "memory-mapped pages count while resident but are shared between workers.")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -106,6 +107,28 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    # Shared across workers (Memorystore); requires the redis package
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    # Per-process memory cache for local development
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -175,5 +198,141 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # Cloud Run's frontend appends the client IP to X-Forwarded-For; throttles
+    # identify clients by that last entry
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
+}
+
+# RAG Chatbot Settings
+# Semantic answer cache: reuse answers for near-paraphrased questions
+RAG_ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE_ENABLED", "True") == "True"
+RAG_ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.92"))
+RAG_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "256"))
+RAG_ANSWER_CACHE_TTL = int(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))
+
+# Hybrid retrieval: BM25 + vector search merged with reciprocal-rank fusion
+RAG_HYBRID_SEARCH_ENABLED = os.getenv("RAG_HYBRID_SEARCH_ENABLED", "True") == "True"
+RAG_HYBRID_FETCH_MULTIPLIER = int(os.getenv("RAG_HYBRID_FETCH_MULTIPLIER", "2"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Prompt context budget (estimated tokens) filled by the context packer
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# MMR diversity re-ranking over over-fetched candidates
+RAG_MMR_ENABLED = os.getenv("RAG_MMR_ENABLED", "True") == "True"
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.5"))
+RAG_MMR_FETCH_MULTIPLIER = int(os.getenv("RAG_MMR_FETCH_MULTIPLIER", "4"))
+
+# Relevance gating: drop chunks too far from the question (squared L2 distance,
+# 1.0 is cosine similarity 0.5) and cut at the largest distance jump; with
+# nothing left the templated answer is returned without calling Gemini
+RAG_RELEVANCE_GATING_ENABLED = os.getenv("RAG_RELEVANCE_GATING_ENABLED", "True") == "True"
+RAG_RELEVANCE_MAX_DISTANCE = float(os.getenv("RAG_RELEVANCE_MAX_DISTANCE", "1.0"))
+RAG_RELEVANCE_MIN_GAP = float(os.getenv("RAG_RELEVANCE_MIN_GAP", "0.1"))
+
+# Build the chatbot and run a dummy retrieval when a server worker boots
+RAG_EAGER_WARMUP = os.getenv("RAG_EAGER_WARMUP", "True") == "True"
+
+# Batch query endpoint
+RAG_BATCH_MAX_QUESTIONS = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", "500"))
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "4"))
+
+# Precomputed answers for the suggested questions
+RAG_SUGGESTED_ANSWERS_ENABLED = os.getenv("RAG_SUGGESTED_ANSWERS_ENABLED", "True") == "True"
+
+# Single-flight coalescing of identical concurrent questions
+# Cross-worker mode needs a cache shared by all workers (set REDIS_URL)
+RAG_SINGLE_FLIGHT_ENABLED = os.getenv("RAG_SINGLE_FLIGHT_ENABLED", "True") == "True"
+RAG_SINGLE_FLIGHT_CROSS_WORKER = os.getenv("RAG_SINGLE_FLIGHT_CROSS_WORKER", "False") == "True"
+RAG_SINGLE_FLIGHT_CACHE_ALIAS = os.getenv("RAG_SINGLE_FLIGHT_CACHE_ALIAS", "default")
+RAG_SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv("RAG_SINGLE_FLIGHT_WAIT_TIMEOUT", "30"))
+
+# Admission control for the LLM endpoints: a bounded number of requests per
+# worker wait on Gemini, a few more queue briefly, the rest get a 503. Keep
+# in-flight + queue below gunicorn's --threads so the read APIs keep a thread
+RAG_ADMISSION_ENABLED = os.getenv("RAG_ADMISSION_ENABLED", "True") == "True"
+RAG_ADMISSION_MAX_IN_FLIGHT = int(os.getenv("RAG_ADMISSION_MAX_IN_FLIGHT", "2"))
+RAG_ADMISSION_QUEUE_SIZE = int(os.getenv("RAG_ADMISSION_QUEUE_SIZE", "1"))
+RAG_ADMISSION_QUEUE_TIMEOUT = float(os.getenv("RAG_ADMISSION_QUEUE_TIMEOUT", "2"))
+RAG_ADMISSION_RETRY_AFTER = int(os.getenv("RAG_ADMISSION_RETRY_AFTER", "5"))
+
+# Per-client token bucket on the LLM endpoints (requests per minute, burst size)
+RAG_THROTTLE_ENABLED = os.getenv("RAG_THROTTLE_ENABLED", "True") == "True"
+RAG_THROTTLE_RATE = float(os.getenv("RAG_THROTTLE_RATE", "10"))
+RAG_THROTTLE_BURST = int(os.getenv("RAG_THROTTLE_BURST", "5"))
+RAG_THROTTLE_CACHE_ALIAS = os.getenv("RAG_THROTTLE_CACHE_ALIAS", "default")
+
+# Gemini function-calling loop: rounds of tool calls and seconds of tool time
+# per request, and how long identical tool calls reuse a result
+RAG_TOOL_MAX_ROUNDS = int(os.getenv("RAG_TOOL_MAX_ROUNDS", "3"))
+RAG_TOOL_TIME_BUDGET = float(os.getenv("RAG_TOOL_TIME_BUDGET", "8"))
+RAG_TOOL_CACHE_TTL = int(os.getenv("RAG_TOOL_CACHE_TTL", "300"))
+
+# End-to-end deadline for /query/ and /query/async/: past it (minus the
+# reserve kept for the fallback) a local extractive answer is returned
+RAG_DEGRADED_MODE_ENABLED = os.getenv("RAG_DEGRADED_MODE_ENABLED", "True") == "True"
+RAG_REQUEST_DEADLINE = float(os.getenv("RAG_REQUEST_DEADLINE", "15"))
+RAG_DEGRADED_RESERVE = float(os.getenv("RAG_DEGRADED_RESERVE", "0.5"))
+
+# Timeouts, retries, hedging and circuit breakers for the Vertex AI calls
+# (seconds; each upstream gets its own breaker with these thresholds)
+RAG_EMBEDDING_TIMEOUT = float(os.getenv("RAG_EMBEDDING_TIMEOUT", "5"))
+RAG_EMBEDDING_RETRIES = int(os.getenv("RAG_EMBEDDING_RETRIES", "2"))
+RAG_EMBEDDING_HEDGE = os.getenv("RAG_EMBEDDING_HEDGE", "True") == "True"
+RAG_EMBEDDING_HEDGE_DELAY = float(os.getenv("RAG_EMBEDDING_HEDGE_DELAY", "0.3"))
+RAG_GENERATION_TIMEOUT = float(os.getenv("RAG_GENERATION_TIMEOUT", "30"))
+RAG_BREAKER_FAILURE_THRESHOLD = int(os.getenv("RAG_BREAKER_FAILURE_THRESHOLD", "5"))
+RAG_BREAKER_RESET_TIMEOUT = float(os.getenv("RAG_BREAKER_RESET_TIMEOUT", "30"))
+
+# Ingest embedding: batches packed under Vertex AI's per-request limits (250
+# texts, 20k tokens; the token budget leaves headroom for the chars/4 estimate),
+# embedded in parallel and retried through their own caller and breaker
+RAG_EMBEDDING_BATCH_SIZE = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "250"))
+RAG_EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("RAG_EMBEDDING_BATCH_MAX_TOKENS", "16000"))
+RAG_EMBEDDING_CONCURRENCY = int(os.getenv("RAG_EMBEDDING_CONCURRENCY", "4"))
+RAG_INGEST_EMBEDDING_RETRIES = int(os.getenv("RAG_INGEST_EMBEDDING_RETRIES", "6"))
+RAG_INGEST_EMBEDDING_BACKOFF = float(os.getenv("RAG_INGEST_EMBEDDING_BACKOFF", "1"))
+RAG_INGEST_EMBEDDING_MAX_BACKOFF = float(os.getenv("RAG_INGEST_EMBEDDING_MAX_BACKOFF", "30"))
+RAG_INGEST_BREAKER_FAILURE_THRESHOLD = int(os.getenv("RAG_INGEST_BREAKER_FAILURE_THRESHOLD", "30"))
+
+# Vector store backend opened by the chatbot and the ingest scripts: 'chroma'
+# or 'flat' (exact NumPy search over memory-mapped files)
+RAG_VECTOR_STORE_BACKEND = os.getenv("RAG_VECTOR_STORE_BACKEND", "chroma")
+
+# Compact vector storage (applied at ingest, ChromaDB backend): vectors are
+# indexed truncated to RAG_VECTOR_INDEX_DIM (0 for full) and kept in
+# RAG_VECTOR_PRECISION for re-scoring RAG_RESCORE_FACTOR x k candidates
+RAG_VECTOR_PRECISION = os.getenv("RAG_VECTOR_PRECISION", "float32")
+RAG_VECTOR_INDEX_DIM = int(os.getenv("RAG_VECTOR_INDEX_DIM", "0"))
+RAG_RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+
+# Answer modes trading quality for latency, chosen per request with "mode".
+# RAG_ANSWER_MODES (JSON) overrides fields per mode, e.g.
+# '{"fast": {"max_output_tokens": 200}, "thorough": {"k": 8}}'
+RAG_ANSWER_MODES = {
+    "fast": {
+        "k": 3,
+        "tools": False,
+        "max_output_tokens": 256,
+        "context_token_budget": 1200,
+        "answer_length": "one short paragraph",
+    },
+    "balanced": {
+        "k": 5,
+        "tools": True,
+        "max_output_tokens": 800,
+        "context_token_budget": RAG_CONTEXT_TOKEN_BUDGET,
+        "answer_length": "2-4 paragraphs max",
+    },
+    "thorough": {
+        "k": 10,
+        "tools": True,
+        "max_output_tokens": 1600,
+        "context_token_budget": 6000,
+        "answer_length": "up to 6 paragraphs, with specific technical details",
+    },
 }
+for _mode, _overrides in json.loads(os.getenv("RAG_ANSWER_MODES", "{}")).items():
+    RAG_ANSWER_MODES[_mode] = {**RAG_ANSWER_MODES.get(_mode, RAG_ANSWER_MODES["balanced"]), **_overrides}
+RAG_DEFAULT_ANSWER_MODE = os.getenv("RAG_DEFAULT_ANSWER_MODE", "balanced")
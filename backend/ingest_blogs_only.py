@@ -1,12 +1,17 @@
 #!/usr/bin/env python
 """
 Simple script to add blog posts to existing vector store
-Fetches blogs from production API
+Fetches blogs from production API; re-running it updates posts in place
 """
 import os
+import django
 import requests
-from rag_service.vector_store import VectorStore
-from rag_service.embeddings import EmbeddingGenerator
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from rag_service.base_store import open_vector_store
+from rag_service.embeddings import EmbeddingGenerator, print_progress
 from rag_service.document_processor import DocumentProcessor
 
 def main():
@@ -53,7 +58,7 @@ def main():
 
     # Initialize components
     print("\n📦 Initializing components...")
-    vector_store = VectorStore(persist_directory="./chroma_db")
+    vector_store = open_vector_store(persist_directory="./chroma_db")
     embedding_gen = EmbeddingGenerator()
     doc_processor = DocumentProcessor(chunk_size=500, overlap=50)
 
@@ -63,16 +68,22 @@ def main():
 
     # Generate embeddings
     print(f"\n🧮 Generating embeddings for {len(chunks)} chunks...")
-    embeddings = embedding_gen.generate_embeddings(chunks)
+    embeddings = embedding_gen.generate_embeddings(chunks, progress=print_progress)
 
     # Add to vector store
     print("\n💾 Adding to vector store...")
     vector_store.add_documents(
         documents=chunks,
         embeddings=embeddings,
-        metadatas=metadatas
+        metadatas=metadatas,
+        embedding_model=embedding_gen.model_name,
+        replace_sources=True
     )
 
+    # Rebuild the BM25 keyword index used by hybrid search
+    print("\n🔤 Building lexical (BM25) index...")
+    vector_store.rebuild_lexical_index()
+
     # Summary
     print("\n" + "=" * 60)
     print("🎉 BLOG POSTS ADDED TO VECTOR STORE!")
@@ -2,16 +2,23 @@
 """
 Document ingestion script for RAG system
 Loads markdown documentation and populates vector store
+
+Ingestion is incremental: chunks are upserted under content-hash IDs, and
+chunks of edited or deleted documents are removed. Pass --rebuild to clear
+the store first (needed after changing the embedding model or storage layout).
 """
 import os
+import sys
 import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
-from rag_service.vector_store import VectorStore
-from rag_service.embeddings import EmbeddingGenerator
+from rag_service.backends import get_backend_name
+from rag_service.base_store import open_vector_store
+from rag_service.embeddings import EmbeddingGenerator, print_progress
 from rag_service.document_processor import DocumentProcessor
+from rag_service.chatbot import PortfolioRAGChatbot
 from portfolio.models import Paper
 
 def fetch_blog_posts_as_documents():
@@ -38,12 +45,12 @@ def fetch_blog_posts_as_documents():
 **Source:** Blog post from portfolio
 **URL:** /blog/{post.id}
 """
-            documents.append({
-                'content': doc_content,
+            # Same (content, metadata) shape as DocumentProcessor.load_markdown_files
+            documents.append((doc_content, {
                 'source': f'blog-{post.source_id}',
                 'category': 'blog-post',
                 'title': post.title
-            })
+            }))
             print(f"    ✓ Loaded blog post: {post.title[:60]}...")
     except Exception as e:
         print(f"  ⚠️  Error fetching blog posts: {e}")
@@ -56,8 +63,8 @@ def main():
     print("   Using Google Vertex AI Embeddings")
     print("=" * 60)
 
-    # Check for GCP credentials
-    if not os.getenv('GOOGLE_CLOUD_PROJECT'):
+    # Check for GCP credentials (not needed with RAG_MODEL_BACKEND=fake)
+    if get_backend_name() == 'vertex' and not os.getenv('GOOGLE_CLOUD_PROJECT'):
         print("\n❌ ERROR: GOOGLE_CLOUD_PROJECT environment variable not set")
         print("Please set it with: export GOOGLE_CLOUD_PROJECT='your-project-id'")
         print("Also ensure GOOGLE_APPLICATION_CREDENTIALS is set to your service account key")
@@ -65,13 +72,14 @@ def main():
 
     # Initialize components
     print("\n📦 Initializing components...")
-    vector_store = VectorStore(persist_directory="./chroma_db")
+    vector_store = open_vector_store(persist_directory="./chroma_db")
     embedding_gen = EmbeddingGenerator()
     doc_processor = DocumentProcessor(chunk_size=500, overlap=50)
 
-    # Clear existing data (optional - comment out if you want to keep existing data)
-    print("\n🗑️  Clearing existing vector store...")
-    vector_store.clear()
+    # Re-ingest from scratch only on request; unchanged chunks are updated in place
+    if '--rebuild' in sys.argv:
+        print("\n🗑️  Clearing existing vector store...")
+        vector_store.clear()
 
     # Define document directories to ingest
     doc_directories = [
@@ -109,23 +117,47 @@ def main():
     # Generate embeddings
     print(f"\n🧮 Generating embeddings for {len(chunks)} chunks...")
     print("  (This may take a minute...)")
-    embeddings = embedding_gen.generate_embeddings(chunks)
+    embeddings = embedding_gen.generate_embeddings(chunks, progress=print_progress)
 
     # Add to vector store
     print("\n💾 Adding to vector store...")
     vector_store.add_documents(
         documents=chunks,
         embeddings=embeddings,
-        metadatas=metadatas
+        metadatas=metadatas,
+        embedding_model=embedding_gen.model_name,
+        replace_sources=True
+    )
+
+    # Drop documents that no longer exist (keep stored blog posts if none could be fetched)
+    print("\n🗑️  Removing deleted documents...")
+    removed = vector_store.remove_missing_sources(
+        {metadata['source'] for metadata in metadatas},
+        keep_prefixes=() if blog_docs else ('blog-',)
     )
+    print(f"  ✓ Removed {len(removed)} documents")
+
+    # Rebuild the BM25 keyword index used by hybrid search
+    print("\n🔤 Building lexical (BM25) index...")
+    vector_store.rebuild_lexical_index()
+
+    # Answer the suggested questions now so they are served instantly
+    print("\n💬 Precomputing answers for suggested questions...")
+    try:
+        chatbot = PortfolioRAGChatbot(vector_store=vector_store)
+        count = chatbot.suggested_answers.generate(chatbot) if chatbot.suggested_answers else 0
+        print(f"  ✓ Precomputed {count} answers")
+    except Exception as e:
+        # Serving workers regenerate stale answers in the background
+        print(f"  ⚠️  Could not precompute suggested answers: {e}")
 
     # Summary
     print("\n" + "=" * 60)
     print("🎉 DOCUMENT INGESTION COMPLETE!")
     print("=" * 60)
     print(f"\n📊 Summary:")
-    print(f"   - Markdown documents: {len([d for d in all_documents if 'blog-post' not in d.get('category', '')])}")
-    print(f"   - Blog posts: {len([d for d in all_documents if d.get('category') == 'blog-post'])}")
+    print(f"   - Markdown documents: {len([m for _, m in all_documents if m.get('category') != 'blog-post'])}")
+    print(f"   - Blog posts: {len([m for _, m in all_documents if m.get('category') == 'blog-post'])}")
     print(f"   - Total source documents: {len(all_documents)}")
     print(f"   - Text chunks: {len(chunks)}")
     print(f"   - Vector store size: {vector_store.count()} documents")
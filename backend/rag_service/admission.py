@@ -0,0 +1,194 @@
+"""
+Admission control and per-client throttling for the chatbot
+Bounds how many worker threads can be blocked on Gemini at once, so the cheap
+read APIs sharing the workers keep serving when the LLM path is saturated
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't get an in-flight slot"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded in-flight limit with a short wait queue
+
+    Up to max_in_flight requests run at once; up to queue_size more wait at
+    most queue_timeout seconds for a slot. Anything beyond that is rejected
+    immediately.
+    """
+
+    def __init__(self, max_in_flight=2, queue_size=1, queue_timeout=2.0, retry_after=5):
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._background_waiting = 0
+
+        self.admitted = 0
+        self.admitted_background = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def acquire(self):
+        """
+        Take an in-flight slot, waiting in the queue if needed
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait timed out
+        """
+        with self._condition:
+            if self._in_flight < self.max_in_flight:
+                self._in_flight += 1
+                self.admitted += 1
+                return
+
+            if self._waiting >= self.queue_size:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected("queue full", self.retry_after)
+
+            self._waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self._in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_timeout += 1
+                        raise AdmissionRejected("queue timeout", self.retry_after)
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            self._in_flight += 1
+            self.admitted += 1
+
+    def acquire_background(self):
+        """
+        Take an in-flight slot for background work such as batch generations
+
+        Waits as long as it takes, outside the request queue, and only takes a
+        slot no queued request is waiting for: background work shares the
+        in-flight limit with requests but never gets them rejected.
+        """
+        with self._condition:
+            self._background_waiting += 1
+            try:
+                while self._in_flight >= self.max_in_flight or self._waiting:
+                    self._condition.wait()
+            finally:
+                self._background_waiting -= 1
+
+            self._in_flight += 1
+            self.admitted_background += 1
+
+    def release(self):
+        """Give back a slot taken with acquire() or acquire_background()"""
+        with self._condition:
+            self._in_flight -= 1
+            # Requests and background work wait for different conditions
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold an in-flight slot for the duration of the block"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """Return in-flight/queue occupancy and admission counters"""
+        with self._condition:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'background_waiting': self._background_waiting,
+                'max_in_flight': self.max_in_flight,
+                'queue_size': self.queue_size,
+                'admitted': self.admitted,
+                'admitted_background': self.admitted_background,
+                'rejected_queue_full': self.rejected_queue_full,
+                'rejected_timeout': self.rejected_timeout,
+            }
+
+
+# Process-wide controller (each worker limits its own threads)
+admission = AdmissionController(
+    max_in_flight=settings.RAG_ADMISSION_MAX_IN_FLIGHT,
+    queue_size=settings.RAG_ADMISSION_QUEUE_SIZE,
+    queue_timeout=settings.RAG_ADMISSION_QUEUE_TIMEOUT,
+    retry_after=settings.RAG_ADMISSION_RETRY_AFTER,
+)
+
+
+class ChatbotRateThrottle(BaseThrottle):
+    """
+    Per-client token bucket kept in the Django cache
+
+    Each client IP gets a bucket of RAG_THROTTLE_BURST tokens refilled at
+    RAG_THROTTLE_RATE tokens per minute; a request spends cost() tokens. With a
+    shared cache (REDIS_URL) the bucket is enforced across workers. Concurrent
+    updates of one bucket can race, so the limit is approximate.
+    """
+
+    cache_prefix = 'rag-throttle'
+
+    def __init__(self):
+        self.cache = caches[settings.RAG_THROTTLE_CACHE_ALIAS]
+        self.rate = settings.RAG_THROTTLE_RATE / 60.0
+        self.burst = settings.RAG_THROTTLE_BURST
+        self._wait = None
+
+    def allow_request(self, request, view):
+        if not settings.RAG_THROTTLE_ENABLED or self.rate <= 0:
+            return True
+
+        key = f"{self.cache_prefix}:{self.get_ident(request)}"
+        now = time.time()
+        tokens, updated = self.cache.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        # Never more than a full bucket, so any request can eventually pass
+        cost = min(self.cost(request), self.burst)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        else:
+            self._wait = (cost - tokens) / self.rate
+
+        # Expire the key once the bucket would be full again
+        self.cache.set(key, (tokens, now), timeout=math.ceil(self.burst / self.rate))
+        return allowed
+
+    def cost(self, request):
+        """Tokens the request spends"""
+        return 1
+
+    def wait(self):
+        return self._wait
+
+
+class ChatbotBatchRateThrottle(ChatbotRateThrottle):
+    """Chatbot token bucket where a batch spends one token per question"""
+
+    def cost(self, request):
+        questions = request.data.get('questions') if hasattr(request.data, 'get') else None
+        return max(1, len(questions)) if isinstance(questions, list) else 1
@@ -0,0 +1,156 @@
+"""
+Semantic answer cache for the RAG chatbot
+Reuses answers for near-paraphrases of questions already answered
+"""
+import copy
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Small in-memory similarity index of past questions and their answers.
+
+    Entries expire after a TTL and the least recently used entry is evicted
+    once the cache is full. The whole cache is dropped whenever the vector
+    store version changes, i.e. after a re-ingest.
+    """
+
+    def __init__(self, threshold=0.92, max_entries=256, ttl_seconds=3600):
+        """
+        Initialize the answer cache
+
+        Args:
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            max_entries: Maximum number of cached answers (LRU eviction)
+            ttl_seconds: Time-to-live of a cached answer in seconds
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, embedding, version, k, mode=None, diversity=None):
+        """
+        Find a cached answer for a semantically similar question
+
+        Args:
+            embedding: Question embedding vector
+            version: Current vector store version
+            k: Number of context documents the answer was built from
+            mode: Answer mode the answer was generated in
+            diversity: MMR diversity the context was retrieved with (None for the default)
+
+        Returns:
+            Copy of the cached response dict, or None on a miss
+        """
+        query = self._normalize(embedding)
+
+        with self._lock:
+            self._sync_version(version)
+            self._purge_expired()
+
+            best_id, best_score = None, -1.0
+            for entry_id, entry in self._entries.items():
+                if entry['k'] != k or entry['mode'] != mode or entry['diversity'] != diversity:
+                    continue
+                score = float(np.dot(query, entry['embedding']))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            response = copy.deepcopy(self._entries[best_id]['response'])
+
+        response['cache_similarity'] = round(best_score, 4)
+        return response
+
+    def store(self, embedding, version, k, response, mode=None, diversity=None):
+        """
+        Cache the answer for a question
+
+        Args:
+            embedding: Question embedding vector
+            version: Vector store version the answer was generated against
+            k: Number of context documents the answer was built from
+            response: Response dict returned by the chatbot
+            mode: Answer mode the answer was generated in
+            diversity: MMR diversity the context was retrieved with (None for the default)
+        """
+        with self._lock:
+            # The store was re-ingested while this answer was being generated
+            if self._version is not None and version != self._version:
+                return
+
+            self._sync_version(version)
+            self._entries[next(self._ids)] = {
+                'embedding': self._normalize(embedding),
+                'k': k,
+                'mode': mode,
+                'diversity': diversity,
+                'response': copy.deepcopy(response),
+                'expires_at': time.monotonic() + self.ttl_seconds,
+            }
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        """Return hit/miss counters for tuning the similarity threshold"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'threshold': self.threshold,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+    def _sync_version(self, version):
+        """Invalidate the cache if the vector store was rebuilt (lock held)"""
+        if version != self._version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+
+    def _purge_expired(self):
+        """Remove entries past their TTL (lock held)"""
+        now = time.monotonic()
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry['expires_at'] <= now]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
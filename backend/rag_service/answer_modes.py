@@ -0,0 +1,56 @@
+"""
+Quality/latency answer modes for the chatbot
+Each mode bundles retrieval depth, tool use, output length and context budget
+(configured in RAG_ANSWER_MODES)
+"""
+from django.conf import settings
+
+
+class AnswerMode:
+    """Generation settings for one answer mode"""
+
+    def __init__(self, name, k, tools, max_output_tokens, context_token_budget, answer_length):
+        """
+        Args:
+            name: Mode name reported in responses and metrics
+            k: Default number of context documents to retrieve
+            tools: Whether Gemini may call search_blogs
+            max_output_tokens: Gemini output token limit
+            context_token_budget: Estimated tokens of retrieved context in the prompt
+            answer_length: Answer length instruction for the prompt
+        """
+        self.name = name
+        self.k = k
+        self.tools = tools
+        self.max_output_tokens = max_output_tokens
+        self.context_token_budget = context_token_budget
+        self.answer_length = answer_length
+
+    @property
+    def generation_config(self):
+        """Gemini generation config for this mode"""
+        return {
+            "temperature": 0.7,
+            "max_output_tokens": self.max_output_tokens,
+        }
+
+
+def answer_mode_names():
+    """Names of the configured modes"""
+    return list(settings.RAG_ANSWER_MODES)
+
+
+def get_answer_mode(name=None):
+    """
+    Look up an answer mode
+
+    Args:
+        name: Mode name (None for RAG_DEFAULT_ANSWER_MODE)
+
+    Raises:
+        ValueError: If the mode is not configured
+    """
+    name = name or settings.RAG_DEFAULT_ANSWER_MODE
+    if name not in settings.RAG_ANSWER_MODES:
+        raise ValueError(f"Unknown answer mode '{name}' (expected one of {', '.join(answer_mode_names())})")
+    return AnswerMode(name, **settings.RAG_ANSWER_MODES[name])
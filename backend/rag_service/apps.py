@@ -1,6 +1,31 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RagServiceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "rag_service"
+
+    def ready(self):
+        # Runs in every gunicorn worker after fork (no --preload), so each
+        # worker warms its own chatbot before taking traffic
+        if settings.RAG_EAGER_WARMUP and _is_server_process():
+            from .warmup import start_warmup
+            start_warmup()
+
+
+def _is_server_process():
+    """Only warm up in processes that serve requests, not in management commands or scripts"""
+    program = sys.argv[0] if sys.argv else ""
+
+    if any(server in program for server in ("gunicorn", "uvicorn", "daphne")):
+        return True
+
+    if os.path.basename(program) == "manage.py" and sys.argv[1:2] == ["runserver"]:
+        # The autoreloader parent process never serves requests
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+    return False
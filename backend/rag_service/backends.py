@@ -0,0 +1,292 @@
+"""
+Pluggable model backends for the RAG pipeline
+'vertex' calls Google Vertex AI; 'fake' is a deterministic offline stand-in
+for load and latency testing without network access or quota; embeddings can
+also run locally on CPU with 'onnx'
+"""
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+
+from .vertex import init_vertexai
+
+BACKENDS = ('vertex', 'fake')
+EMBEDDING_BACKENDS = ('vertex', 'onnx', 'fake')
+
+
+def get_backend_name():
+    """Backend selected with the RAG_MODEL_BACKEND environment variable"""
+    backend = os.getenv('RAG_MODEL_BACKEND', 'vertex').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown RAG_MODEL_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+
+def get_embedding_backend_name():
+    """Embedding backend selected with RAG_EMBEDDING_BACKEND (defaults to RAG_MODEL_BACKEND)"""
+    backend = os.getenv('RAG_EMBEDDING_BACKEND', '').lower() or get_backend_name()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown RAG_EMBEDDING_BACKEND '{backend}' (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+    return backend
+
+
+def init_backend(project_id, location):
+    """Initialize the selected backend's SDK (a no-op for the fake backend)"""
+    if get_backend_name() == 'vertex':
+        init_vertexai(project_id, location)
+
+
+def load_embedding_model(model_name, project_id=None, location="us-central1"):
+    """
+    Load a text embedding model
+
+    Returns:
+        Object with get_embeddings(texts) and get_embeddings_async(texts),
+        each returning a list of objects with a .values vector
+    """
+    backend = get_embedding_backend_name()
+    if backend == 'onnx':
+        # onnxruntime and tokenizers are only needed for local embeddings
+        from .onnx_embeddings import OnnxEmbeddingModel
+        return OnnxEmbeddingModel.from_env()
+
+    if backend == 'fake':
+        return FakeEmbeddingModel(
+            dimension=int(os.getenv('RAG_FAKE_EMBEDDING_DIM', '768')),
+            latency=LatencyDistribution.parse(os.getenv('RAG_FAKE_EMBEDDING_LATENCY', 'constant:0')),
+        )
+
+    from vertexai.language_models import TextEmbeddingModel
+    init_vertexai(project_id, location)
+    return TextEmbeddingModel.from_pretrained(model_name)
+
+
+def load_generative_model(model_name, tools=None, project_id=None, location="us-central1"):
+    """
+    Load a generative model
+
+    Returns:
+        Object with start_chat() whose chat session supports send_message()
+        and send_message_async(), like vertexai's GenerativeModel
+    """
+    if get_backend_name() == 'fake':
+        return FakeGenerativeModel(
+            latency=LatencyDistribution.parse(os.getenv('RAG_FAKE_GENERATION_LATENCY', 'lognormal:800:0.4')),
+            function_call_rate=float(os.getenv('RAG_FAKE_FUNCTION_CALL_RATE', '0.5')) if tools else 0.0,
+            answer_tokens=int(os.getenv('RAG_FAKE_ANSWER_TOKENS', '120')),
+        )
+
+    from vertexai.generative_models import GenerativeModel
+    init_vertexai(project_id, location)
+    return GenerativeModel(model_name, tools=tools)
+
+
+class LatencyDistribution:
+    """
+    Latency sampler configured by a spec string:
+
+        constant:<ms>
+        uniform:<min_ms>:<max_ms>
+        lognormal:<median_ms>:<sigma>
+    """
+
+    def __init__(self, kind, params, seed=None):
+        self.kind = kind
+        self.params = params
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec):
+        kind, *params = spec.split(':')
+        params = [float(p) for p in params]
+        expected = {'constant': 1, 'uniform': 2, 'lognormal': 2}
+        if expected.get(kind) != len(params):
+            raise ValueError(f"Invalid latency spec '{spec}'")
+        seed = os.getenv('RAG_FAKE_SEED')
+        return cls(kind, params, seed=int(seed) if seed else None)
+
+    def sample(self):
+        """Draw one latency in seconds"""
+        with self._lock:
+            if self.kind == 'constant':
+                ms = self.params[0]
+            elif self.kind == 'uniform':
+                ms = self._random.uniform(*self.params)
+            else:
+                median, sigma = self.params
+                ms = self._random.lognormvariate(np.log(median), sigma) if median > 0 else 0.0
+        return ms / 1000
+
+
+class FakeEmbeddingModel:
+    """
+    Deterministic embeddings: the sum of hash-seeded random vectors of the
+    text's tokens, normalized. Identical texts get identical vectors and texts
+    sharing words are similar, so caching and retrieval behave realistically.
+    """
+
+    def __init__(self, dimension=768, latency=None):
+        self.dimension = dimension
+        self.latency = latency or LatencyDistribution('constant', [0])
+
+    def get_embeddings(self, texts):
+        time.sleep(self.latency.sample())
+        return [SimpleNamespace(values=self._embed(text)) for text in texts]
+
+    async def get_embeddings_async(self, texts):
+        await asyncio.sleep(self.latency.sample())
+        return [SimpleNamespace(values=self._embed(text)) for text in texts]
+
+    def _embed(self, text):
+        tokens = re.findall(r"\w+", text.lower()) or [""]
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in tokens:
+            vector += _token_vector(token, self.dimension)
+        return (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token, dimension):
+    seed = int.from_bytes(hashlib.sha256(token.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+
+class FakeGenerativeModel:
+    """Canned Gemini stand-in with configurable latency and function-call behavior"""
+
+    def __init__(self, latency=None, function_call_rate=0.5, answer_tokens=120):
+        """
+        Args:
+            latency: LatencyDistribution for one full generation
+            function_call_rate: Fraction of prompts (chosen deterministically by
+                prompt hash) answered with a search_blogs function call first
+            answer_tokens: Number of words in a canned answer
+        """
+        self.latency = latency or LatencyDistribution('constant', [0])
+        self.function_call_rate = function_call_rate
+        self.answer_tokens = answer_tokens
+
+    def start_chat(self):
+        return FakeChatSession(self)
+
+
+class FakeChatSession:
+    """Chat session producing vertexai-shaped responses"""
+
+    def __init__(self, model):
+        self.model = model
+        self.question = ""
+
+    def send_message(self, content, generation_config=None, stream=False, **kwargs):
+        delay = self.model.latency.sample()
+        chunks = self._respond(content)
+        if stream:
+            return self._stream(chunks, delay)
+        time.sleep(delay)
+        return _merge_chunks(chunks)
+
+    async def send_message_async(self, content, generation_config=None, stream=False, **kwargs):
+        delay = self.model.latency.sample()
+        chunks = self._respond(content)
+        if stream:
+            return self._astream(chunks, delay)
+        await asyncio.sleep(delay)
+        return _merge_chunks(chunks)
+
+    def _respond(self, content):
+        """Build the response chunks for one turn"""
+        if isinstance(content, str):
+            match = re.search(r"^Question: (.*)$", content, re.MULTILINE)
+            self.question = match.group(1) if match else content[:200]
+
+            if self._wants_tool(content):
+                call = SimpleNamespace(name="search_blogs", args={"query": _first_keyword(self.question)})
+                return [_response([_FakePart(function_call=call)], content, 0)]
+
+            prefix = "Here is what the documentation says"
+        else:
+            # Function response turn
+            prefix = "Based on the related blog posts"
+
+        words = f"{prefix} about '{self.question}'. ".split()
+        filler = ("This is a canned offline answer generated by the fake model backend "
+                  "for load and latency testing of the retrieval pipeline. ").split()
+        while len(words) < self.model.answer_tokens:
+            words.extend(filler)
+        words = words[:self.model.answer_tokens]
+
+        prompt_text = content if isinstance(content, str) else ""
+        return [
+            _response([_FakePart(text=" ".join(words[i:i + 8]) + " ")], prompt_text, len(words[i:i + 8]))
+            for i in range(0, len(words), 8)
+        ]
+
+    def _wants_tool(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'little') / 2 ** 32 < self.model.function_call_rate
+
+    @staticmethod
+    def _stream(chunks, delay):
+        # A third of the latency before the first token, the rest spread evenly
+        time.sleep(delay * 0.3)
+        for chunk in chunks:
+            yield chunk
+            time.sleep(delay * 0.7 / len(chunks))
+
+    @staticmethod
+    async def _astream(chunks, delay):
+        await asyncio.sleep(delay * 0.3)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(delay * 0.7 / len(chunks))
+
+
+class _FakePart:
+    def __init__(self, text=None, function_call=None):
+        self._text = text
+        self.function_call = function_call
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise AttributeError("Part has no text.")
+        return self._text
+
+
+def _response(parts, prompt_text, output_tokens):
+    content = SimpleNamespace(parts=parts)
+    text = "".join(part._text for part in parts if part._text is not None)
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=content, text=text)],
+        text=text,
+        usage_metadata=SimpleNamespace(
+            prompt_token_count=len(prompt_text) // 4,
+            candidates_token_count=output_tokens,
+        ),
+    )
+
+
+def _merge_chunks(chunks):
+    """Combine streamed chunks into one non-streaming response"""
+    parts = [part for chunk in chunks for part in chunk.candidates[0].content.parts]
+    text_parts = [part for part in parts if part._text is not None]
+    if text_parts:
+        parts = [_FakePart(text="".join(part._text for part in text_parts).strip())]
+    response = _response(parts, "", sum(c.usage_metadata.candidates_token_count for c in chunks))
+    response.usage_metadata.prompt_token_count = chunks[0].usage_metadata.prompt_token_count
+    return response
+
+
+def _first_keyword(question):
+    """Pick a search query for the fake search_blogs call"""
+    words = [word for word in re.findall(r"\w+", question.lower()) if len(word) > 3]
+    return max(words, key=len) if words else question
@@ -0,0 +1,272 @@
+"""
+Backend-independent parts of the vector store
+The BM25 side index, the index version file and the embedding-model guard,
+shared by the ChromaDB and flat NumPy backends
+"""
+import hashlib
+import os
+import threading
+import uuid
+from django.conf import settings
+from .bm25 import BM25Index, INDEX_FILENAME
+
+VERSION_FILE = "index_version"
+
+VECTOR_STORE_BACKENDS = ('chroma', 'flat')
+
+
+class EmbeddingModelMismatch(ValueError):
+    """The vectors being added or queried come from a different embedding model than the store's"""
+
+
+def chunk_id(document, metadata):
+    """
+    Stable ID of a chunk, from its source, position and content
+
+    The same chunk always gets the same ID, so re-ingesting a document updates
+    its chunks in place instead of duplicating them, and an edited chunk gets
+    a new ID.
+    """
+    content_hash = hashlib.sha256(document.encode('utf-8')).hexdigest()
+    key = f"{metadata.get('source', '')}\x00{metadata.get('chunk_id', '')}\x00{content_hash}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def get_vector_store_backend():
+    """Vector store backend selected with the RAG_VECTOR_STORE_BACKEND setting"""
+    backend = settings.RAG_VECTOR_STORE_BACKEND.lower()
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unknown RAG_VECTOR_STORE_BACKEND '{backend}' (expected one of {', '.join(VECTOR_STORE_BACKENDS)})")
+    return backend
+
+
+def open_vector_store(persist_directory="./chroma_db"):
+    """Open the vector store of the selected backend"""
+    if get_vector_store_backend() == 'flat':
+        from .flat_vector_store import FlatVectorStore
+        return FlatVectorStore(persist_directory)
+
+    from .vector_store import VectorStore
+    return VectorStore(persist_directory)
+
+
+class BaseVectorStore:
+    """
+    Vector store API shared by the backends
+
+    Subclasses implement add_documents, search_many, count, clear,
+    embedding_model, the row lookups used by the lexical index
+    (_get_by_ids, _all_documents) and the source bookkeeping (_source_ids,
+    _delete_ids).
+    """
+
+    def __init__(self, persist_directory):
+        self.persist_directory = persist_directory
+
+        # Create persist directory if it doesn't exist
+        os.makedirs(persist_directory, exist_ok=True)
+
+        # Lexical index is loaded lazily and reloaded when the file changes
+        self._bm25 = None
+        self._bm25_mtime = None
+        self._bm25_lock = threading.Lock()
+
+    def search(self, query_embedding, k=5, include_embeddings=False):
+        """
+        Search for similar documents
+
+        Args:
+            query_embedding: Query embedding vector
+            k: Number of results to return
+            include_embeddings: Also return the stored embedding of each result
+
+        Returns:
+            Dictionary with documents, metadatas, and distances
+        """
+        return self.search_many([query_embedding], k=k, include_embeddings=include_embeddings)[0]
+
+    def lexical_search(self, query_text, k=5):
+        """
+        Search for documents by BM25 keyword match
+
+        Args:
+            query_text: Query string
+            k: Number of results to return
+
+        Returns:
+            Dictionary with ids, documents, metadatas, embeddings and BM25 scores
+            (empty lists if the lexical index has not been built)
+        """
+        index = self._lexical_index()
+        hits = index.search(query_text, k=k) if index is not None else []
+        if not hits:
+            return {'ids': [], 'documents': [], 'metadatas': [], 'embeddings': [], 'scores': []}
+
+        rows = self._get_by_ids([chunk_id for chunk_id, _ in hits])
+        found = [(chunk_id, score) for chunk_id, score in hits if chunk_id in rows]
+
+        return {
+            'ids': [chunk_id for chunk_id, _ in found],
+            'documents': [rows[chunk_id][0] for chunk_id, _ in found],
+            'metadatas': [rows[chunk_id][1] for chunk_id, _ in found],
+            'embeddings': [rows[chunk_id][2] for chunk_id, _ in found],
+            'scores': [score for _, score in found]
+        }
+
+    def delete_source(self, source):
+        """
+        Remove every chunk of a source document
+
+        Args:
+            source: The 'source' metadata value of the document
+
+        Returns:
+            Number of chunks removed
+        """
+        ids = [chunk_id for chunk_id, _ in self._source_ids([source])]
+        if ids:
+            self._delete_ids(ids)
+            self._bump_version()
+        print(f"✅ Removed {len(ids)} chunks of {source}")
+        return len(ids)
+
+    def sources(self):
+        """Set of the source documents in the store"""
+        return {source for _, source in self._source_ids(None)}
+
+    def remove_missing_sources(self, ingested, keep_prefixes=()):
+        """
+        Delete the stored documents that were not part of a full ingest
+
+        Args:
+            ingested: Sources of the documents just ingested
+            keep_prefixes: Source prefixes to leave alone (e.g. 'blog-' when
+                the blog posts could not be fetched this run)
+
+        Returns:
+            Sorted list of the removed sources
+        """
+        removed = sorted(
+            source for source in self.sources()
+            if source is not None and source not in ingested and not source.startswith(tuple(keep_prefixes))
+        )
+        for source in removed:
+            self.delete_source(source)
+        return removed
+
+    @staticmethod
+    def _prepare_rows(documents, embeddings, metadatas, ids):
+        """
+        Assign content-hash IDs and drop repeated chunks
+
+        Returns:
+            Tuple of (documents, embeddings, metadatas, ids), one row per ID
+            (the last occurrence wins)
+        """
+        if ids is None:
+            ids = [chunk_id(document, metadata) for document, metadata in zip(documents, metadatas)]
+
+        last = {chunk: i for i, chunk in enumerate(ids)}
+        if len(last) == len(ids):
+            return list(documents), list(embeddings), list(metadatas), list(ids)
+        rows = sorted(last.values())
+        return (
+            [documents[i] for i in rows], [embeddings[i] for i in rows],
+            [metadatas[i] for i in rows], [ids[i] for i in rows],
+        )
+
+    def _stale_ids(self, ids, metadatas):
+        """IDs of stored chunks of these metadatas' sources that are not in ids"""
+        keep = set(ids)
+        sources = {metadata['source'] for metadata in metadatas if metadata.get('source')}
+        return [chunk_id for chunk_id, _ in self._source_ids(sources) if chunk_id not in keep]
+
+    def _source_ids(self, sources):
+        """Return (id, source) of the chunks of the given sources (None for all)"""
+        raise NotImplementedError
+
+    def _delete_ids(self, ids):
+        """Remove chunks by ID"""
+        raise NotImplementedError
+
+    def rebuild_lexical_index(self):
+        """Rebuild the BM25 index from every chunk in the store"""
+        ids, documents = self._all_documents()
+        index = BM25Index.build(ids, documents)
+        index.save(self.persist_directory)
+        print(f"✅ Built BM25 index over {len(index)} chunks")
+        return index
+
+    def _lexical_index(self):
+        """Return the BM25 index, reloading it if ingest rewrote the file"""
+        path = os.path.join(self.persist_directory, INDEX_FILENAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._bm25_lock:
+            if mtime != self._bm25_mtime:
+                self._bm25 = BM25Index.load(self.persist_directory)
+                self._bm25_mtime = mtime
+            return self._bm25
+
+    def _remove_lexical_index(self):
+        index_path = os.path.join(self.persist_directory, INDEX_FILENAME)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+    def _get_by_ids(self, ids):
+        """Return {id: (document, metadata, embedding)} for the IDs that exist"""
+        raise NotImplementedError
+
+    def _all_documents(self):
+        """Return (ids, documents) of every chunk"""
+        raise NotImplementedError
+
+    def embedding_model(self):
+        """Name of the embedding model the stored vectors came from (None if not recorded)"""
+        raise NotImplementedError
+
+    def check_embedding_model(self, model_name):
+        """
+        Refuse to mix embedding spaces
+
+        Raises:
+            EmbeddingModelMismatch: If the store was built with another model
+        """
+        stored = self.embedding_model()
+        if stored is not None and stored != model_name:
+            raise EmbeddingModelMismatch(
+                f"Vector store holds {stored} embeddings but the embedding model is {model_name}; "
+                f"re-ingest with {model_name} or switch RAG_EMBEDDING_BACKEND back"
+            )
+
+    def version(self):
+        """
+        Get the current index version
+
+        The version changes every time documents are added or the store is
+        cleared, so caches built on top of the store can detect a re-ingest.
+        """
+        try:
+            with open(os.path.join(self.persist_directory, VERSION_FILE), 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return "0"
+
+    def _bump_version(self):
+        """Record a new index version after the collection changed"""
+        with open(os.path.join(self.persist_directory, VERSION_FILE), 'w') as f:
+            f.write(uuid.uuid4().hex)
+
+    def preload(self):
+        """
+        Load on-disk indexes ahead of the first query
+
+        Returns:
+            Number of documents in the store
+        """
+        count = self.count()
+        self._lexical_index()
+        return count
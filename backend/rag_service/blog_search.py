@@ -0,0 +1,48 @@
+"""
+In-process blog search for the chatbot's search_blogs tool
+Queries the Paper table directly instead of calling our own REST API
+"""
+import re
+
+from django.db.models import Q
+from django.db.models.functions import Substr
+
+from portfolio.models import Paper
+
+SEARCH_FIELDS = ('title', 'abstract', 'authors', 'tags')
+
+
+def search_blog_posts(query, limit=3, excerpt_chars=800):
+    """
+    Search blog posts the same way /api/papers/?search= does
+
+    Every search term must match (case-insensitively) at least one of the
+    title, abstract, authors or tags. Only the top results are fetched and
+    the abstract is truncated in the database, so full posts never leave it.
+
+    Args:
+        query: Search query
+        limit: Maximum number of posts to return
+        excerpt_chars: Number of abstract characters to return per post
+
+    Returns:
+        List of dicts with id, title, authors, published_date, tags and excerpt
+    """
+    terms = [term for term in re.split(r'[\s,]+', query) if term]
+    if not terms:
+        return []
+
+    posts = Paper.objects.all()
+    for term in terms:
+        term_filter = Q()
+        for field in SEARCH_FIELDS:
+            term_filter |= Q(**{f"{field}__icontains": term})
+        posts = posts.filter(term_filter)
+
+    posts = posts.order_by('-published_date', '-relevance_score').annotate(
+        excerpt=Substr('abstract', 1, excerpt_chars)
+    )
+
+    return list(
+        posts.values('id', 'title', 'authors', 'published_date', 'tags', 'excerpt')[:limit]
+    )
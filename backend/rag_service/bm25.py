@@ -0,0 +1,183 @@
+"""
+Lexical BM25 index over the RAG chunks
+Stored as compact NumPy arrays next to the ChromaDB data
+"""
+import os
+import re
+
+import numpy as np
+
+INDEX_FILENAME = "bm25_index.npz"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./_-][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase terms
+
+    Compound terms such as "ci/cd", "v1.28" or "aks-cluster" are kept whole
+    and also split into their parts, so both exact and partial queries match.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        parts = re.split(r"[./_-]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of chunks, using CSR-style posting arrays"""
+
+    def __init__(self, ids, terms, doc_lengths, offsets, postings_docs, postings_tfs, k1=1.5, b=0.75):
+        """
+        Wrap prebuilt index arrays (use BM25Index.build or BM25Index.load)
+
+        Args:
+            ids: Chunk IDs, one per document row
+            terms: Vocabulary, sorted; term i owns postings offsets[i]:offsets[i + 1]
+            doc_lengths: Number of terms per document
+            offsets: Start of each term's postings (len(terms) + 1 entries)
+            postings_docs: Document row of each posting
+            postings_tfs: Term frequency of each posting
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        self.ids = np.asarray(ids)
+        self.terms = np.asarray(terms)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.postings_docs = np.asarray(postings_docs, dtype=np.int32)
+        self.postings_tfs = np.asarray(postings_tfs, dtype=np.float32)
+        self.k1 = float(k1)
+        self.b = float(b)
+
+        self._term_index = {term: i for i, term in enumerate(self.terms.tolist())}
+        self._avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, ids, documents, k1=1.5, b=0.75):
+        """
+        Build an index from chunk texts
+
+        Args:
+            ids: Chunk IDs
+            documents: Chunk texts aligned with ids
+
+        Returns:
+            BM25Index instance
+        """
+        postings = {}
+        doc_lengths = []
+
+        for row, document in enumerate(documents):
+            terms = tokenize(document)
+            doc_lengths.append(len(terms))
+
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        vocabulary = sorted(postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        postings_docs = []
+        postings_tfs = []
+
+        for i, term in enumerate(vocabulary):
+            entries = postings[term]
+            offsets[i + 1] = offsets[i] + len(entries)
+            postings_docs.extend(row for row, _ in entries)
+            postings_tfs.extend(tf for _, tf in entries)
+
+        return cls(
+            ids=np.array(ids, dtype=str),
+            terms=np.array(vocabulary, dtype=str),
+            doc_lengths=doc_lengths,
+            offsets=offsets,
+            postings_docs=postings_docs,
+            postings_tfs=postings_tfs,
+            k1=k1,
+            b=b,
+        )
+
+    def save(self, directory):
+        """Write the index arrays to directory/bm25_index.npz"""
+        path = os.path.join(directory, INDEX_FILENAME)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            ids=self.ids,
+            terms=self.terms,
+            doc_lengths=self.doc_lengths,
+            offsets=self.offsets,
+            postings_docs=self.postings_docs,
+            postings_tfs=self.postings_tfs.astype(np.uint16),
+            params=np.array([self.k1, self.b], dtype=np.float32),
+        )
+        # Atomic swap so serving workers never load a half-written index
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, directory):
+        """Load the index saved in directory, or return None if there is none"""
+        path = os.path.join(directory, INDEX_FILENAME)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as data:
+            k1, b = data['params'].tolist()
+            return cls(
+                ids=data['ids'],
+                terms=data['terms'],
+                doc_lengths=data['doc_lengths'],
+                offsets=data['offsets'],
+                postings_docs=data['postings_docs'],
+                postings_tfs=data['postings_tfs'],
+                k1=k1,
+                b=b,
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=5):
+        """
+        Rank chunks by BM25 score
+
+        Args:
+            query: Query text
+            k: Number of results to return
+
+        Returns:
+            List of (chunk_id, score) tuples, best first
+        """
+        n_docs = len(self.ids)
+        if n_docs == 0:
+            return []
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self._avg_length or 1.0))
+
+        for term in set(tokenize(query)):
+            i = self._term_index.get(term)
+            if i is None:
+                continue
+
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs = self.postings_docs[start:end]
+            tfs = self.postings_tfs[start:end]
+
+            df = end - start
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(str(self.ids[row]), float(scores[row])) for row in top if scores[row] > 0]
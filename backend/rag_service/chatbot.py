@@ -2,12 +2,46 @@
 RAG Chatbot implementation using Google Vertex AI
 Demonstrates hands-on GCP Generative AI experience
 """
-from vertexai.generative_models import GenerativeModel, Tool, FunctionDeclaration
-import vertexai
+from vertexai.generative_models import Tool, FunctionDeclaration, Part
+from django.conf import settings
+from django.core.cache import caches
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import asyncio
+import contextlib
+import functools
+import hashlib
+import itertools
 import os
-import requests
-from .vector_store import VectorStore
+import re
+import threading
+import time
+from .base_store import open_vector_store
 from .embeddings import EmbeddingGenerator
+from .answer_cache import SemanticAnswerCache
+from .blog_search import search_blog_posts
+from .fusion import fuse_search_results
+from .context_packer import ContextPacker
+from .reranking import rerank_search_results
+from .relevance import gate_search_results
+from .deadline import Deadline, DeadlineExceeded, request_deadline
+from .extractive import extractive_answer
+from .resilience import UpstreamUnavailable, generation_caller
+from .answer_modes import get_answer_mode
+from .suggested_answers import SuggestedAnswers, normalize_question
+from .single_flight import SingleFlight, CacheSingleFlight
+from .backends import get_backend_name, init_backend, load_generative_model
+from .metrics import stage, record_stage, record_tokens
+from .tools import ToolResultCache, ToolRunner, TOOL_LIMIT_MESSAGE, call_in_pool_thread
+
+NO_CONTEXT_ANSWER = "I don't have enough information to answer that question. Try asking about Vasu's learning journey, tech stack, or projects."
+
+# Topics covered by the blog; questions mentioning them almost always end up
+# calling search_blogs, so the async pipeline starts that search early
+TECHNICAL_KEYWORDS = (
+    "kubernetes", "k8s", "aks", "gke", "helm", "docker", "terraform", "gcp",
+    "vertex", "cloud run", "rag", "embeddings", "chromadb", "ci/cd", "cicd",
+    "monitoring", "prometheus", "grafana", "database", "postgres", "redis", "celery",
+)
 
 class PortfolioRAGChatbot:
     """
@@ -15,24 +49,70 @@ class PortfolioRAGChatbot:
     AI/ML platform engineering journey using Google Vertex AI
     """
 
-    def __init__(self, vector_store=None, project_id=None, location="us-central1"):
+    def __init__(self, vector_store=None, project_id=None, location="us-central1", answer_cache=None,
+                 suggested_answers=None):
         """
         Initialize RAG chatbot with Vertex AI
 
         Args:
-            vector_store: VectorStore instance
+            vector_store: Vector store instance (defaults to the RAG_VECTOR_STORE_BACKEND one)
             project_id: GCP project ID
             location: GCP region
+            answer_cache: SemanticAnswerCache instance (defaults to one built from settings)
+            suggested_answers: SuggestedAnswers instance (defaults to the one in the vector store directory)
         """
         self.project_id = project_id or os.getenv('GOOGLE_CLOUD_PROJECT')
         self.location = location
 
+        # Milliseconds spent in each initialization step
+        self.init_timings = {}
+
         # Initialize Vertex AI
-        vertexai.init(project=self.project_id, location=self.location)
+        step = time.perf_counter()
+        init_backend(self.project_id, self.location)
+        self.init_timings['backend_init'] = _elapsed_ms(step)
 
         # Initialize components
-        self.vector_store = vector_store or VectorStore()
+        step = time.perf_counter()
+        self.vector_store = vector_store or open_vector_store()
+        self.init_timings['vector_store_open'] = _elapsed_ms(step)
+
+        step = time.perf_counter()
         self.embedding_gen = EmbeddingGenerator(project_id=self.project_id, location=self.location)
+        self.vector_store.check_embedding_model(self.embedding_gen.model_name)
+        self.init_timings['embedding_model_load'] = _elapsed_ms(step)
+
+        # Semantic answer cache for near-duplicate questions
+        if answer_cache is None and settings.RAG_ANSWER_CACHE_ENABLED:
+            answer_cache = SemanticAnswerCache(
+                threshold=settings.RAG_ANSWER_CACHE_THRESHOLD,
+                max_entries=settings.RAG_ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.RAG_ANSWER_CACHE_TTL,
+            )
+        self.answer_cache = answer_cache
+
+        # Answers to the suggested questions, precomputed after each ingest
+        if suggested_answers is None and settings.RAG_SUGGESTED_ANSWERS_ENABLED:
+            suggested_answers = SuggestedAnswers(self.vector_store.persist_directory)
+        self.suggested_answers = suggested_answers
+
+        # Identical concurrent questions share one pipeline run
+        self.single_flight = SingleFlight() if settings.RAG_SINGLE_FLIGHT_ENABLED else None
+        self.cross_worker_flight = None
+        if self.single_flight is not None and settings.RAG_SINGLE_FLIGHT_CROSS_WORKER:
+            self.cross_worker_flight = CacheSingleFlight(
+                caches[settings.RAG_SINGLE_FLIGHT_CACHE_ALIAS],
+                wait_timeout=settings.RAG_SINGLE_FLIGHT_WAIT_TIMEOUT,
+            )
+
+        # Token-budgeted prompt context
+        self.context_packer = ContextPacker(token_budget=settings.RAG_CONTEXT_TOKEN_BUDGET)
+
+        # Worker threads for running retrieval legs concurrently
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-retrieval")
+
+        # Worker threads for deadline-bound upstream calls (abandoned calls keep theirs)
+        self._deadline_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rag-deadline")
 
         # Define blog search tool
         search_blogs_func = FunctionDeclaration(
@@ -52,117 +132,783 @@ class PortfolioRAGChatbot:
 
         blog_tool = Tool(function_declarations=[search_blogs_func])
 
+        # Executes the function calls Gemini asks for, concurrently
+        self.tool_runner = ToolRunner(
+            {"search_blogs": self._search_blogs},
+            cache=ToolResultCache(ttl_seconds=settings.RAG_TOOL_CACHE_TTL),
+        )
+
         # Initialize Gemini model with tools (using Gemini 2.0)
-        self.model = GenerativeModel("gemini-2.0-flash-exp", tools=[blog_tool])
-        print(f"✅ Initialized Vertex AI Gemini 2.0 Flash with blog search tool (Project: {self.project_id})")
+        step = time.perf_counter()
+        self.model = load_generative_model(
+            "gemini-2.0-flash-exp", tools=[blog_tool],
+            project_id=self.project_id, location=self.location
+        )
+        # Same model without tools, for answer modes that skip function calling
+        self.plain_model = load_generative_model(
+            "gemini-2.0-flash-exp", tools=None,
+            project_id=self.project_id, location=self.location
+        )
+        self.init_timings['generative_model_load'] = _elapsed_ms(step)
+        print(f"✅ Initialized Gemini 2.0 Flash with blog search tool (Backend: {get_backend_name()}, Project: {self.project_id})")
 
-    def query(self, question, k=5, include_sources=True):
+    def query(self, question, k=None, include_sources=True, diversity=None, deadline=None, mode=None):
         """
         Answer a question using RAG
 
         Args:
             question: User's question
-            k: Number of context documents to retrieve
+            k: Number of context documents to retrieve (None uses the mode's)
             include_sources: Whether to include source documents in response
+            diversity: MMR relevance/diversity trade-off (None uses the default)
+            deadline: Deadline for the answer (defaults to RAG_REQUEST_DEADLINE
+                seconds from now); past it a local extractive answer is returned
+            mode: Answer mode name (None uses RAG_DEFAULT_ANSWER_MODE)
 
         Returns:
             Dictionary with answer, sources, and metadata
         """
+        mode = get_answer_mode(mode)
+        k = k or mode.k
+        if deadline is None:
+            deadline = request_deadline()
+
+        if self.single_flight is None:
+            response = self._query(question, k, include_sources, diversity, deadline, mode)
+        else:
+            # Concurrent duplicates wait for the first request's answer
+            key = self._flight_key(question, k, include_sources, diversity, mode)
+            response, shared = self.single_flight.do(
+                key, self._query_across_workers, key, question, k, include_sources, diversity, deadline, mode
+            )
+            if shared:
+                response['coalesced'] = True
+
+        response['mode'] = mode.name
+        return response
+
+    def _query_across_workers(self, key, question, k, include_sources, diversity, deadline, mode):
+        """Run the query, coalescing with other workers when cross-worker mode is on"""
+        if self.cross_worker_flight is None:
+            return self._query(question, k, include_sources, diversity, deadline, mode)
+
+        response, shared = self.cross_worker_flight.do(
+            key, self._query, question, k, include_sources, diversity, deadline, mode
+        )
+        if shared:
+            response['coalesced'] = True
+        return response
+
+    @staticmethod
+    def _flight_key(question, k, include_sources, diversity, mode):
+        """Coalescing key: requests with equal keys get the same response"""
+        raw = f"{normalize_question(question)}|{k}|{include_sources}|{diversity}|{mode.name}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _query(self, question, k, include_sources, diversity, deadline, mode):
+        """Run the RAG pipeline for one question (see query)"""
+        reserve = settings.RAG_DEGRADED_RESERVE
         try:
+            # Suggested questions are answered ahead of time
+            with stage('precomputed_lookup'):
+                precomputed = self._precomputed_answer(question, k, diversity, include_sources, mode)
+            if precomputed is not None:
+                return precomputed
+
             # Generate embedding for the question
-            query_embedding = self.embedding_gen.generate_embedding(question)
+            try:
+                with stage('embedding'):
+                    query_embedding = deadline.run(
+                        self._deadline_executor, self.embedding_gen.generate_embedding, question,
+                        reserve=reserve
+                    )
+            except (DeadlineExceeded, UpstreamUnavailable):
+                return self._degraded_response(question, None, k, include_sources)
+
+            # Reuse a cached answer for a near-identical question
+            with stage('cache_lookup'):
+                cached, index_version = self._lookup_cached_answer(query_embedding, k, mode, diversity)
+            if cached is not None:
+                return self._finalize_cached(cached, include_sources)
 
             # Search vector store for relevant context
-            search_results = self.vector_store.search(query_embedding, k=k)
+            try:
+                search_results = deadline.run(
+                    self._deadline_executor, self._retrieve, question, query_embedding, k, diversity,
+                    reserve=reserve
+                )
+            except (DeadlineExceeded, UpstreamUnavailable):
+                return self._degraded_response(question, None, k, include_sources)
+            self._record_retrieval_stages(search_results)
+
+            return self._answer_from_results(
+                question, search_results, query_embedding, index_version, k, diversity, include_sources, mode,
+                deadline
+            )
+
+        except Exception as e:
+            print(f"❌ Error in RAG query: {e}")
+            return {
+                'answer': f"Sorry, I encountered an error: {str(e)}",
+                'sources': [],
+                'context_used': 0
+            }
+
+    def query_batch(self, questions, k=None, include_sources=True, diversity=None, max_concurrency=4, mode=None,
+                    generation_slot=None):
+        """
+        Answer many questions, sharing one embedding call and one vector search
+
+        Args:
+            questions: List of questions
+            k: Number of context documents to retrieve per question (None uses the mode's)
+            include_sources: Whether to include source documents in responses
+            diversity: MMR relevance/diversity trade-off (None uses the default)
+            max_concurrency: Maximum number of Gemini generations in flight
+            mode: Answer mode name (None uses RAG_DEFAULT_ANSWER_MODE)
+            generation_slot: Context manager factory entered around each
+                generation, e.g. to hold an admission slot (None for no limit)
+
+        Yields:
+            Response dicts (as returned by query) with the question's 'index'
+            and 'question', in completion order
+        """
+        mode = get_answer_mode(mode)
+        k = k or mode.k
+        try:
+            # One embedding request for typical batches (split only past the API limits)
+            embeddings = self.embedding_gen.generate_embeddings(questions)
+
+            pending = []
+            for index, (question, embedding) in enumerate(zip(questions, embeddings)):
+                cached, index_version = self._lookup_cached_answer(embedding, k, mode, diversity)
+                if cached is not None:
+                    yield {
+                        'index': index, 'question': question, 'mode': mode.name,
+                        **self._finalize_cached(cached, include_sources)
+                    }
+                else:
+                    pending.append((index, question, embedding, index_version))
+
+            if not pending:
+                return
+
+            # One multi-query vector search for every uncached question
+            all_results = self._retrieve_many(
+                [question for _, question, _, _ in pending],
+                [embedding for _, _, embedding, _ in pending],
+                k, diversity
+            )
+        except Exception as e:
+            print(f"❌ Error in batch RAG query: {e}")
+            for index, question in enumerate(questions):
+                yield {'index': index, 'question': question, 'error': str(e)}
+            return
+
+        generation_slot = generation_slot or contextlib.nullcontext
+        closed = threading.Event()
+
+        def answer(*args):
+            with generation_slot():
+                if closed.is_set():
+                    # The client went away while this generation waited for a slot
+                    return None
+                return self._answer_from_results(*args)
+
+        # Submit as workers free up, so a client that disconnects (generator
+        # closed) leaves at most max_concurrency generations behind
+        work = iter(zip(pending, all_results))
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="rag-batch")
+        try:
+            futures = {}
+
+            def submit_next():
+                item = next(work, None)
+                if item is None:
+                    return
+                (index, question, embedding, index_version), search_results = item
+                future = executor.submit(
+                    answer,
+                    question, search_results, embedding, index_version, k, diversity, include_sources, mode
+                )
+                futures[future] = (index, question)
+
+            for _ in range(max_concurrency):
+                submit_next()
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, question = futures.pop(future)
+                    submit_next()
+                    try:
+                        yield {'index': index, 'question': question, 'mode': mode.name, **future.result()}
+                    except Exception as e:
+                        print(f"❌ Error answering batch question {index}: {e}")
+                        yield {'index': index, 'question': question, 'error': str(e)}
+        finally:
+            closed.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stream_query(self, question, k=None, include_sources=True, diversity=None, mode=None, deadline=None):
+        """
+        Answer a question using RAG, streaming the answer as Gemini generates it
+
+        Args:
+            question: User's question
+            k: Number of context documents to retrieve (None uses the mode's)
+            include_sources: Whether to include source documents in the stream
+            diversity: MMR relevance/diversity trade-off (None uses the default)
+            mode: Answer mode name (None uses RAG_DEFAULT_ANSWER_MODE)
+            deadline: Deadline for the answer (see query); past it a local
+                extractive answer is streamed instead, or the answer is cut
+                short if text was already sent
+
+        Yields:
+            (event, data) tuples: 'sources' with the retrieved sources, 'token'
+            with answer text fragments, and a final 'metadata' event
+            ('error' replaces the remaining events if something fails)
+        """
+        try:
+            mode = get_answer_mode(mode)
+            k = k or mode.k
+            if deadline is None:
+                deadline = request_deadline()
+            reserve = settings.RAG_DEGRADED_RESERVE
+
+            with stage('precomputed_lookup'):
+                precomputed = self._precomputed_answer(question, k, diversity, include_sources, mode)
+            if precomputed is not None:
+                yield from self._stream_response(precomputed, include_sources, mode)
+                return
+
+            try:
+                with stage('embedding'):
+                    query_embedding = deadline.run(
+                        self._deadline_executor, self.embedding_gen.generate_embedding, question,
+                        reserve=reserve
+                    )
+            except (DeadlineExceeded, UpstreamUnavailable):
+                degraded = self._degraded_response(question, None, k, include_sources)
+                yield from self._stream_response(degraded, include_sources, mode)
+                return
+
+            with stage('cache_lookup'):
+                cached, index_version = self._lookup_cached_answer(query_embedding, k, mode, diversity)
+            if cached is not None:
+                yield from self._stream_response(self._finalize_cached(cached, include_sources), include_sources, mode)
+                return
+
+            try:
+                search_results = deadline.run(
+                    self._deadline_executor, self._retrieve, question, query_embedding, k, diversity,
+                    reserve=reserve
+                )
+            except (DeadlineExceeded, UpstreamUnavailable):
+                degraded = self._degraded_response(question, None, k, include_sources)
+                yield from self._stream_response(degraded, include_sources, mode)
+                return
+            self._record_retrieval_stages(search_results)
 
-            # Check if we have any results
             if not search_results['documents']:
-                return {
-                    'answer': "I don't have enough information to answer that question. Try asking about Vasu's learning journey, tech stack, or projects.",
-                    'sources': [],
-                    'context_used': 0
-                }
+                yield from self._stream_response(self._no_context_response(), include_sources, mode)
+                return
 
-            # Build context from retrieved documents
-            context = self._build_context(search_results)
+            # Sources are known before generation starts, so send them first
+            sources = self._format_sources(search_results)
+            if include_sources:
+                yield 'sources', {'sources': sources}
 
-            # Generate answer using LLM with function calling
-            answer, blog_sources = self._generate_answer_with_tools(question, context)
+            with stage('context_packing'):
+                context = self._build_context(search_results, mode)
 
-            # Prepare response
-            response = {
-                'answer': answer,
-                'context_used': len(search_results['documents'])
+            answer_parts = []
+            degraded = False
+            start = time.perf_counter()
+            stream = self._stream_answer_with_tools(question, context, mode)
+            while True:
+                try:
+                    # Each chunk is awaited like any other upstream call, so a
+                    # stalled stream is abandoned at the deadline
+                    event, data = deadline.run(self._deadline_executor, next, stream, reserve=reserve)
+                except StopIteration as done:
+                    blog_sources = done.value
+                    break
+                except (DeadlineExceeded, UpstreamUnavailable):
+                    degraded = True
+                    blog_sources = []
+                    if not answer_parts:
+                        # Nothing sent yet, so the extractive answer can take its place
+                        fallback = self._degraded_response(question, search_results, k, include_sources=False)
+                        yield 'token', {'text': fallback['answer']}
+                    break
+                if not answer_parts:
+                    record_stage('gemini_first_token', _elapsed_ms(start))
+                answer_parts.append(data['text'])
+                yield event, data
+            record_stage('gemini_stream', _elapsed_ms(start))
+
+            if blog_sources:
+                sources.extend(blog_sources)
+                if include_sources:
+                    yield 'sources', {'sources': blog_sources}
+
+            metadata = {
+                'context_used': len(search_results['documents']),
+                'cached': False,
+                'mode': mode.name,
+                'retrieval_ms': search_results['retrieval_ms']
             }
+            if degraded:
+                # A cut-short or extractive answer is not cached
+                metadata['degraded'] = True
+            yield 'metadata', metadata
 
-            if include_sources:
-                sources = self._format_sources(search_results)
-                # Add blog sources if any were used
-                if blog_sources:
-                    sources.extend(blog_sources)
-                response['sources'] = sources
+            if not degraded:
+                self._store_answer(query_embedding, index_version, k, mode, diversity, {
+                    'answer': "".join(answer_parts),
+                    'context_used': len(search_results['documents']),
+                    'sources': sources
+                })
+
+        except Exception as e:
+            print(f"❌ Error in streaming RAG query: {e}")
+            yield 'error', {'error': f"Sorry, I encountered an error: {str(e)}"}
+
+    @staticmethod
+    def _stream_response(response, include_sources, mode):
+        """Stream a complete response (cached, precomputed, degraded...) as events"""
+        if include_sources:
+            yield 'sources', {'sources': response.get('sources', [])}
+        yield 'token', {'text': response['answer']}
 
-            return response
+        metadata = {name: value for name, value in response.items() if name not in ('answer', 'sources')}
+        metadata.setdefault('cached', False)
+        metadata['mode'] = mode.name
+        yield 'metadata', metadata
+
+    async def aquery(self, question, k=None, include_sources=True, diversity=None, deadline=None, mode=None):
+        """
+        Answer a question using RAG without blocking the event loop
+
+        Vertex AI calls use the async gRPC clients and ChromaDB / blog search
+        run in worker threads. For technical questions the blog search is
+        started speculatively while the question is embedded and retrieved.
+
+        Args:
+            question: User's question
+            k: Number of context documents to retrieve
+            include_sources: Whether to include source documents in response
+            diversity: MMR relevance/diversity trade-off (None uses the default)
+            deadline: Deadline for the answer (see query)
+            mode: Answer mode name (see query)
+
+        Returns:
+            Dictionary with answer, sources, and metadata
+        """
+        mode = get_answer_mode(mode)
+        k = k or mode.k
+        if deadline is None:
+            deadline = request_deadline()
+
+        response = await self._aquery(question, k, include_sources, diversity, deadline, mode)
+        response['mode'] = mode.name
+        return response
+
+    async def _aquery(self, question, k, include_sources, diversity, deadline, mode):
+        """Run the async RAG pipeline for one question (see aquery)"""
+        reserve = settings.RAG_DEGRADED_RESERVE
+
+        blog_prefetch = None
+        search_results = None
+        try:
+            with stage('precomputed_lookup'):
+                precomputed = await asyncio.to_thread(
+                    self._precomputed_answer, question, k, diversity, include_sources, mode
+                )
+            if precomputed is not None:
+                return precomputed
+
+            blog_query = self._speculative_blog_query(question) if mode.tools else None
+            if blog_query:
+                blog_prefetch = asyncio.create_task(
+                    asyncio.to_thread(call_in_pool_thread, self._search_blogs, blog_query)
+                )
+
+            with stage('embedding'):
+                query_embedding = await deadline.arun(
+                    self.embedding_gen.agenerate_embedding(question), reserve=reserve
+                )
+
+            with stage('cache_lookup'):
+                cached, index_version = self._lookup_cached_answer(query_embedding, k, mode, diversity)
+            if cached is not None:
+                return self._finalize_cached(cached, include_sources)
+
+            search_results = await deadline.arun(
+                asyncio.to_thread(self._retrieve, question, query_embedding, k, diversity), reserve=reserve
+            )
+            self._record_retrieval_stages(search_results)
+
+            if not search_results['documents']:
+                return self._no_context_response()
+
+            with stage('context_packing'):
+                context = self._build_context(search_results, mode)
+
+            prefetched = None
+            if blog_prefetch is not None:
+                with stage('blog_prefetch_wait'):
+                    try:
+                        prefetched = (blog_query, await blog_prefetch)
+                    except Exception as e:
+                        # Gemini can still call search_blogs itself
+                        print(f"⚠️  Error prefetching blogs: {e}")
+                blog_prefetch = None
+
+            answer, blog_sources = await deadline.arun(
+                self._agenerate_answer_with_tools(question, context, mode, prefetched), reserve=reserve
+            )
+
+            return self._complete_response(
+                answer, search_results, blog_sources,
+                query_embedding, index_version, k, diversity, include_sources, mode
+            )
+
+        except (DeadlineExceeded, UpstreamUnavailable):
+            return await asyncio.to_thread(self._degraded_response, question, search_results, k, include_sources)
 
         except Exception as e:
-            print(f"❌ Error in RAG query: {e}")
+            print(f"❌ Error in async RAG query: {e}")
             return {
                 'answer': f"Sorry, I encountered an error: {str(e)}",
                 'sources': [],
                 'context_used': 0
             }
 
-    def _build_context(self, search_results):
-        """Build context string from search results"""
-        context_parts = []
+        finally:
+            if blog_prefetch is not None:
+                blog_prefetch.cancel()
 
-        for i, doc in enumerate(search_results['documents']):
-            metadata = search_results['metadatas'][i]
-            source = metadata.get('source', 'Unknown')
+    def _speculative_blog_query(self, question):
+        """Return a blog search query if the question mentions a blog topic"""
+        lowered = question.lower()
+        for keyword in TECHNICAL_KEYWORDS:
+            if re.search(rf"(?<![\w/]){re.escape(keyword)}(?![\w/])", lowered):
+                return keyword
+        return None
 
-            context_parts.append(f"[Source: {source}]\n{doc}")
+    def _retrieve(self, question, query_embedding, k, diversity=None):
+        """
+        Retrieve context chunks for a question
 
-        return "\n\n---\n\n".join(context_parts)
+        With hybrid search enabled, the BM25 leg runs in a worker thread while
+        the dense leg runs in the calling thread, and both rankings are merged
+        with reciprocal-rank fusion. With MMR enabled, k * RAG_MMR_FETCH_MULTIPLIER
+        candidates are fetched and re-ranked down to k diverse chunks. With
+        relevance gating enabled, dense candidates beyond RAG_RELEVANCE_MAX_DISTANCE
+        or past the elbow of the distance curve are dropped before fusion, so
+        fewer than k chunks may come back; lexical hits are kept, unless no
+        dense candidate survived (the question is off-topic, and BM25 would
+        only match it on common words), in which case nothing comes back.
 
-    def _search_blogs(self, query):
-        """Search blog posts via API"""
+        Args:
+            question: User's question (for the lexical leg)
+            query_embedding: Question embedding (for the dense leg)
+            k: Number of chunks to return
+            diversity: MMR lambda for this request (None uses RAG_MMR_LAMBDA,
+                1.0 is pure relevance)
+
+        Returns:
+            Search result dict plus 'retrieval_ms' latencies per stage
+        """
+        return self._retrieve_many([question], [query_embedding], k, diversity)[0]
+
+    def _retrieve_many(self, questions, query_embeddings, k, diversity=None):
+        """
+        Retrieve context chunks for several questions at once
+
+        The dense leg is a single multi-query vector search; see _retrieve
+        for the hybrid and MMR stages applied to each question.
+
+        Returns:
+            List of search result dicts, one per question
+        """
+        start = time.perf_counter()
+
+        if diversity is None and settings.RAG_MMR_ENABLED:
+            diversity = settings.RAG_MMR_LAMBDA
+        rerank = diversity is not None and diversity < 1.0
+        candidates_k = k * settings.RAG_MMR_FETCH_MULTIPLIER if rerank else k
+        hybrid = settings.RAG_HYBRID_SEARCH_ENABLED
+        fetch_k = candidates_k * settings.RAG_HYBRID_FETCH_MULTIPLIER if hybrid else candidates_k
+
+        lexical_futures = [
+            self._executor.submit(_timed, self.vector_store.lexical_search, question, fetch_k)
+            for question in questions
+        ] if hybrid else []
+        dense_results, dense_ms = _timed(self.vector_store.search_many, query_embeddings, fetch_k, rerank)
+
+        all_results = []
+        for i, query_embedding in enumerate(query_embeddings):
+            results = dense_results[i]
+            timings = {'dense': dense_ms}
+
+            # Gate the dense leg only: BM25 exact-term hits and the diverse
+            # chunks MMR picks on purpose are not judged by vector distance
+            off_topic = False
+            if settings.RAG_RELEVANCE_GATING_ENABLED:
+                gate_start = time.perf_counter()
+                results = gate_search_results(
+                    results, settings.RAG_RELEVANCE_MAX_DISTANCE, settings.RAG_RELEVANCE_MIN_GAP
+                )
+                timings['gate'] = _elapsed_ms(gate_start)
+                # Nothing near the question: BM25 would only match it on common words
+                off_topic = not results['ids']
+
+            if off_topic:
+                if hybrid:
+                    lexical_futures[i].cancel()
+            elif hybrid:
+                lexical_results, timings['lexical'] = lexical_futures[i].result()
+                results = fuse_search_results(
+                    results, lexical_results, query_embedding,
+                    k=candidates_k, rrf_k=settings.RAG_RRF_K
+                )
+
+            if rerank and not off_topic:
+                rerank_start = time.perf_counter()
+                results = rerank_search_results(results, query_embedding, k, lambda_mult=diversity)
+                timings['rerank'] = _elapsed_ms(rerank_start)
+
+            timings['total'] = _elapsed_ms(start)
+            results['retrieval_ms'] = timings
+            all_results.append(results)
+
+        return all_results
+
+    @staticmethod
+    def _record_retrieval_stages(search_results):
+        """Report the retrieval leg latencies as stages of the current request"""
+        for name, ms in search_results['retrieval_ms'].items():
+            record_stage('retrieval' if name == 'total' else f"retrieval_{name}", ms)
+
+    def _answer_from_results(self, question, search_results, query_embedding, index_version, k, diversity,
+                             include_sources, mode, deadline=None):
+        """Generate the answer for a question whose context is already retrieved"""
+        # Nothing relevant: answer from the template without calling Gemini
+        if not search_results['documents']:
+            return self._no_context_response()
+
+        # Build context from retrieved documents
+        with stage('context_packing'):
+            context = self._build_context(search_results, mode)
+
+        # Generate answer using LLM with function calling
         try:
-            # Call the blog API
-            api_url = os.getenv('API_BASE_URL', 'http://127.0.0.1:8000/api')
-            response = requests.get(f"{api_url}/papers/", params={"search": query})
-            response.raise_for_status()
+            answer, blog_sources = (deadline or Deadline(None)).run(
+                self._deadline_executor, self._generate_answer_with_tools, question, context, mode,
+                reserve=settings.RAG_DEGRADED_RESERVE
+            )
+        except (DeadlineExceeded, UpstreamUnavailable):
+            return self._degraded_response(question, search_results, k, include_sources)
+
+        # Prepare response
+        return self._complete_response(
+            answer, search_results, blog_sources,
+            query_embedding, index_version, k, diversity, include_sources, mode
+        )
+
+    def _degraded_response(self, question, search_results, k, include_sources):
+        """
+        Answer locally when the deadline would be missed or Vertex AI is unavailable
+
+        The answer is extracted from the retrieved chunks, or from a BM25
+        search if retrieval didn't finish. Degraded answers are not cached.
+        """
+        print(f"⚠️  Deadline exceeded or upstream unavailable, answering extractively: {question}")
+        with stage('degraded_answer'):
+            if search_results is None or not search_results['documents']:
+                search_results = self.vector_store.lexical_search(question, k=k)
+                search_results['distances'] = []
+
+            answer = extractive_answer(question, search_results['documents'])
+
+        if answer is None:
+            response = self._no_context_response()
+        else:
+            response = {
+                'answer': answer,
+                'context_used': len(search_results['documents']),
+                'sources': self._format_sources(search_results)
+            }
+
+        response['cached'] = False
+        response['degraded'] = True
+        if not include_sources:
+            response.pop('sources', None)
+        return response
+
+    def _no_context_response(self):
+        """Templated answer for questions with no relevant context"""
+        return {
+            'answer': NO_CONTEXT_ANSWER,
+            'sources': [],
+            'context_used': 0,
+            'suggestions': self._no_context_suggestions()
+        }
+
+    def _no_context_suggestions(self):
+        """Suggested questions offered with the no-context answer"""
+        return self.get_suggested_questions()[:3]
+
+    def _lookup_cached_answer(self, query_embedding, k, mode, diversity):
+        """
+        Look up a cached answer for the question embedding (generated in the same
+        mode from context retrieved with the same k and diversity)
+
+        Returns:
+            Tuple of (cached response or None, vector store version)
+        """
+        if self.answer_cache is None:
+            return None, None
+
+        index_version = self.vector_store.version()
+        return self.answer_cache.lookup(query_embedding, index_version, k, mode.name, diversity), index_version
+
+    def _store_answer(self, query_embedding, index_version, k, mode, diversity, response):
+        """Add a freshly generated answer to the answer cache"""
+        if self.answer_cache is not None:
+            self.answer_cache.store(query_embedding, index_version, k, response, mode.name, diversity)
+
+    def _complete_response(self, answer, search_results, blog_sources,
+                           query_embedding, index_version, k, diversity, include_sources, mode):
+        """Build the query response, caching it for similar questions"""
+        sources = self._format_sources(search_results)
+        # Add blog sources if any were used
+        if blog_sources:
+            sources.extend(blog_sources)
+
+        response = {
+            'answer': answer,
+            'context_used': len(search_results['documents']),
+            'sources': sources
+        }
+        self._store_answer(query_embedding, index_version, k, mode, diversity, response)
 
-            results = response.json().get('results', [])
+        response['cached'] = False
+        response['retrieval_ms'] = search_results['retrieval_ms']
+        if not include_sources:
+            del response['sources']
 
-            # Format blog posts for context
-            blog_context = []
-            blog_sources = []
+        return response
 
-            for post in results[:3]:  # Top 3 most relevant
-                blog_context.append(f"""
+    def _precomputed_answer(self, question, k, diversity, include_sources, mode):
+        """
+        Serve a suggested question from the precomputed answers
+
+        Only requests using the default retrieval settings and answer mode are
+        served. When the stored answers belong to an older index, a suggested
+        question triggers their regeneration in the background and is answered
+        live meanwhile.
+        """
+        if self.suggested_answers is None or diversity is not None:
+            return None
+        if mode.name != settings.RAG_DEFAULT_ANSWER_MODE:
+            return None
+
+        answer = self.suggested_answers.lookup(question, self.vector_store.version(), k)
+        if answer is None:
+            suggested = {normalize_question(q) for q in self.get_suggested_questions()}
+            if normalize_question(question) in suggested:
+                self.refresh_suggested_answers()
+            return None
+
+        answer['precomputed'] = True
+        return self._finalize_cached(answer, include_sources)
+
+    def refresh_suggested_answers(self):
+        """Regenerate the precomputed answers in the background if they are missing or stale"""
+        if self.suggested_answers is None:
+            return None
+        if not self.vector_store.count():
+            return None
+        if self.suggested_answers.is_current(self.vector_store.version(), get_answer_mode().k):
+            return None
+        return self.suggested_answers.refresh_in_background(self)
+
+    def _finalize_cached(self, cached, include_sources):
+        """Shape a cached response like a freshly generated one"""
+        cached['cached'] = True
+        if not include_sources:
+            cached.pop('sources', None)
+        return cached
+
+    def _build_context(self, search_results, mode):
+        """Build context string from search results within the mode's token budget"""
+        context, _ = self.context_packer.pack(search_results, token_budget=mode.context_token_budget)
+        return context
+
+    def _search_blogs(self, query):
+        """
+        Search blog posts directly in the database
+
+        Errors propagate, so the tool runner reports them to the model
+        without caching them as an empty result.
+        """
+        # Top 3 most relevant, with the abstract truncated by the database
+        with stage('search_blogs'):
+            results = search_blog_posts(query, limit=3, excerpt_chars=800)
+
+        # Format blog posts for context
+        blog_context = []
+        blog_sources = []
+
+        for post in results:
+            blog_context.append(f"""
 Blog Post: {post['title']}
 Author: {post['authors']}
 Published: {post['published_date']}
 Tags: {', '.join(post['tags'])}
 
-{post['abstract'][:800]}...
+{post['excerpt']}...
 """)
-                blog_sources.append({
-                    'source': f"blog-{post['id']}",
-                    'category': 'blog-post',
-                    'title': post['title'],
-                    'relevance_score': 0.9
-                })
+            blog_sources.append({
+                'source': f"blog-{post['id']}",
+                'category': 'blog-post',
+                'title': post['title'],
+                'relevance_score': 0.9
+            })
 
-            return "\n\n---\n\n".join(blog_context), blog_sources
+        return "\n\n---\n\n".join(blog_context), blog_sources
 
-        except Exception as e:
-            print(f"⚠️  Error searching blogs: {e}")
-            return "", []
+    def _build_prompt(self, question, context, mode, blog_context=None):
+        """Build the Gemini prompt from the question and retrieved context"""
+        if blog_context:
+            context = f"{context}\n\n---\n\nRelated blog posts (already retrieved, only call search_blogs for other topics):\n{blog_context}"
+
+        if not mode.tools:
+            return f"""You are an AI assistant helping visitors learn about Vasu Kapoor's
+journey to becoming an AI/ML Platform Engineer. You have access to
+documentation about his 12-hour learning sprint (provided as context).
+
+Your role:
+- Answer questions based on the provided context
+- Be specific and cite relevant details
+- Keep answers concise but informative ({mode.answer_length})
+- Use a friendly, professional tone
+
+Context from documentation:
+
+{context}
+
+---
+
+Question: {question}
+
+Please provide a helpful answer."""
 
-    def _generate_answer_with_tools(self, question, context):
-        """Generate answer using Vertex AI Gemini with function calling"""
-        prompt = f"""You are an AI assistant helping visitors learn about Vasu Kapoor's
+        return f"""You are an AI assistant helping visitors learn about Vasu Kapoor's
 journey to becoming an AI/ML Platform Engineer. You have access to:
 1. Documentation about his 12-hour learning sprint (provided as context)
 2. His technical blog posts (via search_blogs tool)
@@ -172,7 +918,7 @@ Your role:
 - If the question is about technical topics like Kubernetes, Docker, GCP, RAG, CI/CD, etc.,
   USE the search_blogs tool to find his blog posts about those topics
 - Be specific and cite relevant details
-- Keep answers concise but informative (2-4 paragraphs max)
+- Keep answers concise but informative ({mode.answer_length})
 - Use a friendly, professional tone
 
 Context from documentation:
@@ -185,48 +931,224 @@ Question: {question}
 
 Please provide a helpful answer. Use search_blogs if you need specific technical details from his blog posts."""
 
+    def _model_for(self, mode):
+        """Gemini model for an answer mode (without tools if the mode disables them)"""
+        return self.model if mode.tools else self.plain_model
+
+    def _generate_answer_with_tools(self, question, context, mode):
+        """
+        Generate answer using Vertex AI Gemini with function calling
+
+        Every function call of a turn is executed concurrently and the results
+        are sent back together, for up to RAG_TOOL_MAX_ROUNDS rounds and
+        RAG_TOOL_TIME_BUDGET seconds of tool time.
+
+        Returns:
+            Tuple of (answer text, blog sources)
+        """
+        prompt = self._build_prompt(question, context, mode)
+
         # Start conversation with model
-        chat = self.model.start_chat()
+        chat = self._model_for(mode).start_chat()
 
         # Send initial prompt
-        response = chat.send_message(
-            prompt,
-            generation_config={
-                "temperature": 0.7,
-                "max_output_tokens": 800,
-            }
-        )
+        with stage('gemini_first'):
+            response = self._send(chat, prompt, mode.generation_config)
+        record_tokens('gemini_first', response)
 
         blog_sources = []
+        deadline = time.monotonic() + settings.RAG_TOOL_TIME_BUDGET
 
-        # Check if model wants to use function
-        function_call = response.candidates[0].content.parts[0].function_call if response.candidates[0].content.parts else None
+        for round_number in itertools.count(1):
+            # Check if model wants to use functions
+            calls = self._function_calls(self._response_parts(response))
+            if not calls:
+                break
 
-        if function_call and function_call.name == "search_blogs":
-            # Extract query argument
-            query = function_call.args.get("query", "")
-            print(f"🔍 Chatbot searching blogs for: {query}")
+            exhausted = self._tools_exhausted(round_number, deadline)
+            if exhausted:
+                results = self._limit_results(calls)
+            else:
+                with stage('tools'):
+                    results = self.tool_runner.run(calls, deadline)
+            blog_sources = _merge_sources(blog_sources, results)
 
-            # Actually search blogs
-            blog_context, blog_sources = self._search_blogs(query)
+            # Send function responses back to model
+            with stage('gemini_second'):
+                response = self._send(chat, self._function_responses(results), mode.generation_config)
+            record_tokens('gemini_second', response)
 
-            # Send function response back to model
-            function_response = {
-                "name": "search_blogs",
-                "response": {
-                    "content": blog_context if blog_context else "No relevant blog posts found."
-                }
-            }
+            if exhausted:
+                break
+
+        return self._response_text(response), blog_sources
+
+    async def _agenerate_answer_with_tools(self, question, context, mode, prefetched=None):
+        """
+        Async variant of _generate_answer_with_tools
 
-            response = chat.send_message(
-                function_response,
-                generation_config={
-                    "temperature": 0.7,
-                    "max_output_tokens": 800,
+        Args:
+            question: User's question
+            context: Context built from retrieved documents
+            mode: AnswerMode to generate with
+            prefetched: Optional (query, (blog_context, blog_sources)) from a
+                speculative blog search, added to the prompt up front
+
+        Returns:
+            Tuple of (answer text, blog sources)
+        """
+        blog_context, blog_sources = prefetched[1] if prefetched else ("", [])
+        # A search_blogs call for the prefetched query is answered without searching again
+        known = {ToolResultCache.key("search_blogs", {"query": prefetched[0]}): prefetched[1]} if prefetched else None
+
+        chat = self._model_for(mode).start_chat()
+        with stage('gemini_first'):
+            response = await self._asend(
+                chat, self._build_prompt(question, context, mode, blog_context), mode.generation_config
+            )
+        record_tokens('gemini_first', response)
+
+        deadline = time.monotonic() + settings.RAG_TOOL_TIME_BUDGET
+
+        for round_number in itertools.count(1):
+            calls = self._function_calls(self._response_parts(response))
+            if not calls:
+                break
+
+            exhausted = self._tools_exhausted(round_number, deadline)
+            if exhausted:
+                results = self._limit_results(calls)
+            else:
+                with stage('tools'):
+                    results = await self.tool_runner.arun(calls, deadline, known)
+
+            # Sources of the prefetched posts stay attached since they are in the prompt
+            blog_sources = _merge_sources(blog_sources, results)
+
+            with stage('gemini_second'):
+                response = await self._asend(chat, self._function_responses(results), mode.generation_config)
+            record_tokens('gemini_second', response)
+
+            if exhausted:
+                break
+
+        return self._response_text(response), blog_sources
+
+    def _stream_answer_with_tools(self, question, context, mode):
+        """
+        Stream an answer from Vertex AI Gemini with function calling
+
+        Yields:
+            ('token', {'text': ...}) events as answer text arrives
+
+        Returns:
+            List of blog sources used for the answer
+        """
+        chat = self._model_for(mode).start_chat()
+        content = self._build_prompt(question, context, mode)
+
+        blog_sources = []
+        deadline = time.monotonic() + settings.RAG_TOOL_TIME_BUDGET
+        exhausted = False
+
+        for round_number in itertools.count(1):
+            # A stream can't be timed out or retried, only guarded by the breaker
+            stream = generation_caller.guard(
+                functools.partial(chat.send_message, generation_config=mode.generation_config, stream=True),
+                content
+            )
+
+            parts = []
+            for chunk in stream:
+                for part in self._response_parts(chunk):
+                    if self._part_text(part):
+                        yield 'token', {'text': self._part_text(part)}
+                    else:
+                        parts.append(part)
+
+            calls = self._function_calls(parts)
+            if not calls or exhausted:
+                break
+
+            # The chat history is complete once the stream is exhausted,
+            # so the tool results can be sent as the next turn
+            exhausted = self._tools_exhausted(round_number, deadline)
+            if exhausted:
+                results = self._limit_results(calls)
+            else:
+                with stage('tools'):
+                    results = self.tool_runner.run(calls, deadline)
+            blog_sources = _merge_sources(blog_sources, results)
+            content = self._function_responses(results)
+
+        return blog_sources
+
+    @staticmethod
+    def _send(chat, content, generation_config):
+        """Send a chat turn with the generation timeout and circuit breaker"""
+        # Not idempotent (the chat history advances), so never retried or hedged
+        return generation_caller.call(
+            functools.partial(chat.send_message, generation_config=generation_config), content
+        )
+
+    @staticmethod
+    async def _asend(chat, content, generation_config):
+        """Async variant of _send"""
+        return await generation_caller.acall(
+            lambda: chat.send_message_async(content, generation_config=generation_config)
+        )
+
+    @staticmethod
+    def _tools_exhausted(round_number, deadline):
+        """Whether a tool round would exceed the per-request round or time limit"""
+        return round_number > settings.RAG_TOOL_MAX_ROUNDS or time.monotonic() >= deadline
+
+    @staticmethod
+    def _limit_results(calls):
+        """Tool results telling the model to answer without further calls"""
+        return [(name, TOOL_LIMIT_MESSAGE, []) for name, _ in calls]
+
+    @staticmethod
+    def _function_calls(parts):
+        """Return the (name, args) function calls among a turn's content parts"""
+        calls = []
+        for part in parts:
+            function_call = getattr(part, 'function_call', None)
+            if function_call and function_call.name:
+                print(f"🔍 Chatbot calling {function_call.name}: {dict(function_call.args)}")
+                calls.append((function_call.name, dict(function_call.args)))
+        return calls
+
+    def _function_responses(self, results):
+        """Wrap tool results as function responses for Gemini (one part per call)"""
+        return [
+            Part.from_function_response(
+                name=name,
+                response={
+                    "content": content if content else "No relevant blog posts found."
                 }
             )
+            for name, content, _ in results
+        ]
 
-        return response.text, blog_sources
+    def _response_text(self, response):
+        """Return the answer text of a response, ignoring any function call parts"""
+        return "".join(self._part_text(part) for part in self._response_parts(response))
+
+    @staticmethod
+    def _response_parts(chunk):
+        """Return the content parts of a response or streamed response chunk"""
+        if not chunk.candidates or not chunk.candidates[0].content:
+            return []
+        return chunk.candidates[0].content.parts
+
+    @staticmethod
+    def _part_text(part):
+        """Return the text of a content part, or an empty string for non-text parts"""
+        try:
+            return part.text
+        except AttributeError:
+            return ""
 
     def _format_sources(self, search_results):
         """Format source documents for response"""
@@ -255,3 +1177,27 @@ Please provide a helpful answer. Use search_blogs if you need specific technical
             "How did Vasu implement Infrastructure as Code?",
             "What's the architecture of this portfolio?",
         ]
+
+
+def _elapsed_ms(start):
+    """Milliseconds since a time.perf_counter() timestamp"""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _merge_sources(sources, results):
+    """Add the sources of tool results, skipping ones already listed"""
+    seen = {source['source'] for source in sources}
+    merged = list(sources)
+    for _, _, result_sources in results:
+        for source in result_sources:
+            if source['source'] not in seen:
+                seen.add(source['source'])
+                merged.append(source)
+    return merged
+
+
+def _timed(func, *args):
+    """Call func and return (result, elapsed milliseconds)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, _elapsed_ms(start)
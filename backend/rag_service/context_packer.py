@@ -0,0 +1,145 @@
+"""
+Token-budgeted context packing for the RAG prompt
+Merges overlapping chunks, drops duplicates and fills a fixed token budget
+"""
+import math
+import re
+
+# Gemini averages roughly four characters of English text per token
+CHARS_PER_TOKEN = 4
+
+# Longest word overlap searched for when stitching neighbouring chunks
+# (DocumentProcessor uses a 50-word overlap)
+MAX_OVERLAP_WORDS = 200
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for budgeting"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class ContextPacker:
+    """Build the prompt context from search results within a token budget"""
+
+    def __init__(self, token_budget=3000, separator="\n\n---\n\n"):
+        """
+        Initialize the packer
+
+        Args:
+            token_budget: Maximum estimated tokens of context per prompt
+            separator: Text placed between passages
+        """
+        self.token_budget = token_budget
+        self.separator = separator
+
+    def pack(self, search_results, token_budget=None):
+        """
+        Pack search results into a context string
+
+        Args:
+            search_results: Result dict with documents and metadatas, best first
+            token_budget: Budget for this call (None uses the packer's)
+
+        Returns:
+            Tuple of (context string, stats dict)
+        """
+        token_budget = token_budget or self.token_budget
+        passages, duplicates = self._dedupe(search_results)
+        passages, merged = self._merge_neighbours(passages)
+        passages.sort(key=lambda passage: passage['rank'])
+
+        parts = []
+        used_tokens = 0
+        separator_tokens = estimate_tokens(self.separator)
+
+        for passage in passages:
+            text = f"[Source: {passage['source']}]\n{passage['text']}"
+            cost = estimate_tokens(text) + (separator_tokens if parts else 0)
+            remaining = token_budget - used_tokens
+
+            if cost > remaining:
+                # Never send an empty context: trim the best passage to fit
+                if parts:
+                    continue
+                text = self._truncate(text, remaining)
+                cost = estimate_tokens(text)
+
+            parts.append(text)
+            used_tokens += cost
+
+        stats = {
+            'passages': len(parts),
+            'tokens': used_tokens,
+            'duplicates_removed': duplicates,
+            'chunks_merged': merged,
+        }
+        return self.separator.join(parts), stats
+
+    def _dedupe(self, search_results):
+        """Drop passages whose text was already retrieved at a better rank"""
+        passages = []
+        seen = set()
+
+        for i, doc in enumerate(search_results['documents']):
+            key = re.sub(r'\s+', ' ', doc).strip().lower()
+            if key in seen:
+                continue
+            seen.add(key)
+
+            metadata = search_results['metadatas'][i]
+            passages.append({
+                'source': metadata.get('source', 'Unknown'),
+                'chunk_id': metadata.get('chunk_id'),
+                'text': doc,
+                'rank': i,
+            })
+
+        return passages, len(search_results['documents']) - len(passages)
+
+    def _merge_neighbours(self, passages):
+        """Stitch consecutive chunks of the same source into one passage"""
+        by_source = {}
+        for passage in passages:
+            by_source.setdefault(passage['source'], []).append(passage)
+
+        result = []
+        merged = 0
+
+        for group in by_source.values():
+            ordered = [p for p in group if p['chunk_id'] is not None]
+            ordered.sort(key=lambda p: p['chunk_id'])
+            result.extend(p for p in group if p['chunk_id'] is None)
+
+            current = None
+            for passage in ordered:
+                if current is not None and passage['chunk_id'] == current['chunk_id'] + 1:
+                    current['text'] = self._stitch(current['text'], passage['text'])
+                    current['chunk_id'] = passage['chunk_id']
+                    current['rank'] = min(current['rank'], passage['rank'])
+                    merged += 1
+                else:
+                    current = dict(passage)
+                    result.append(current)
+
+        return result, merged
+
+    @staticmethod
+    def _stitch(first, second):
+        """Join two chunks, removing the words the second repeats from the first"""
+        first_words = first.split()
+        second_words = second.split()
+
+        longest = min(len(first_words), len(second_words), MAX_OVERLAP_WORDS)
+        for size in range(longest, 0, -1):
+            if first_words[-size:] == second_words[:size]:
+                return " ".join(first_words + second_words[size:])
+
+        return f"{first} {second}"
+
+    @staticmethod
+    def _truncate(text, token_budget):
+        """Cut text at a word boundary so it fits token_budget"""
+        max_chars = max(token_budget, 0) * CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text
+        return text[:max_chars].rsplit(' ', 1)[0]
@@ -0,0 +1,86 @@
+"""
+End-to-end request deadlines for the chatbot
+Slow upstream calls are abandoned once the request's time is up, so the
+pipeline can fall back to a local answer instead of waiting on Vertex AI
+"""
+import asyncio
+import contextvars
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a step can't finish before the request deadline"""
+
+
+class Deadline:
+    """Point in time by which a request must be answered"""
+
+    def __init__(self, seconds):
+        """
+        Args:
+            seconds: Time budget from now (None for no deadline)
+        """
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self):
+        """Seconds left (None without a deadline, never negative)"""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def run(self, executor, func, *args, reserve=0.0):
+        """
+        Call func in executor, giving up when the deadline is near
+
+        The abandoned call keeps its worker thread until it returns, so the
+        executor must not be shared with work that has to run promptly.
+
+        Args:
+            executor: ThreadPoolExecutor for deadline-bound calls
+            func: Callable to run
+            reserve: Seconds to keep for answering after func (e.g. for the fallback)
+
+        Raises:
+            DeadlineExceeded: If func doesn't return in time
+        """
+        if self.expires is None:
+            return func(*args)
+
+        timeout = self.remaining() - reserve
+        if timeout <= 0:
+            raise DeadlineExceeded(func.__name__)
+
+        # Run with the request's context so stage timings are still recorded
+        future = executor.submit(contextvars.copy_context().run, func, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceeded(func.__name__)
+
+    async def arun(self, awaitable, reserve=0.0):
+        """Async variant of run: await awaitable, cancelling it when the deadline is near"""
+        if self.expires is None:
+            return await awaitable
+
+        timeout = self.remaining() - reserve
+        try:
+            if timeout <= 0:
+                raise asyncio.TimeoutError
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(getattr(awaitable, '__name__', 'awaitable'))
+
+
+def request_deadline():
+    """Start the default deadline of a chatbot request (none if degraded mode is off)"""
+    return Deadline(settings.RAG_REQUEST_DEADLINE if settings.RAG_DEGRADED_MODE_ENABLED else None)
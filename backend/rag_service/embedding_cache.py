@@ -0,0 +1,166 @@
+"""
+Persistent content-addressed embedding cache
+SQLite on disk with an in-memory LRU in front, keyed by (model, sha256(text))
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Cache embedding vectors so unchanged texts are never re-embedded"""
+
+    def __init__(self, path="./embedding_cache.sqlite3", max_memory_entries=4096):
+        """
+        Open (or create) the embedding cache
+
+        Args:
+            path: SQLite database file
+            max_memory_entries: Size of the in-memory LRU in front of SQLite
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        conn.commit()
+
+    @staticmethod
+    def text_hash(text):
+        """Content address of a text"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model_name, texts):
+        """
+        Look up cached embeddings
+
+        Args:
+            model_name: Embedding model the vectors were produced by
+            texts: List of text strings
+
+        Returns:
+            List aligned with texts: embedding vector, or None on a miss
+        """
+        hashes = [self.text_hash(text) for text in texts]
+        results = [None] * len(texts)
+        pending = {}
+
+        with self._lock:
+            for i, text_hash in enumerate(hashes):
+                key = (model_name, text_hash)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                else:
+                    pending.setdefault(text_hash, []).append(i)
+
+        if pending:
+            found = self._load(model_name, list(pending))
+            with self._lock:
+                for text_hash, vector in found.items():
+                    self._remember((model_name, text_hash), vector)
+                    for i in pending[text_hash]:
+                        results[i] = vector
+
+        with self._lock:
+            missed = sum(1 for vector in results if vector is None)
+            self.misses += missed
+            self.hits += len(results) - missed
+
+        return results
+
+    def put_many(self, model_name, texts, embeddings):
+        """
+        Store embeddings for texts
+
+        Args:
+            model_name: Embedding model the vectors were produced by
+            texts: List of text strings
+            embeddings: List of embedding vectors aligned with texts
+        """
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                text_hash = self.text_hash(text)
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._remember((model_name, text_hash), vector.tolist())
+                rows.append((model_name, text_hash, vector.tobytes()))
+
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            rows
+        )
+        conn.commit()
+
+    def get(self, model_name, text):
+        """Look up a single cached embedding (None on a miss)"""
+        return self.get_many(model_name, [text])[0]
+
+    def put(self, model_name, text, embedding):
+        """Store a single embedding"""
+        self.put_many(model_name, [text], [embedding])
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+            }
+
+    def _load(self, model_name, hashes, chunk_size=500):
+        """Fetch vectors from SQLite for the given hashes"""
+        conn = self._connection()
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(hashes), chunk_size):
+            chunk = hashes[i:i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [model_name, *chunk]
+            )
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _remember(self, key, vector):
+        """Add a vector to the in-memory LRU (lock held)"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _connection(self):
+        """SQLite connections cannot be shared across threads, so keep one per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
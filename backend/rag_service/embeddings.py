@@ -2,30 +2,123 @@
 Embedding generation using Google Vertex AI
 Demonstrates hands-on GCP AI Platform experience
 """
-from vertexai.language_models import TextEmbeddingModel
-import vertexai
+import asyncio
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from .backends import get_embedding_backend_name, load_embedding_model
+from .context_packer import estimate_tokens
+from .embedding_cache import EmbeddingCache
+from .resilience import embedding_caller, ingest_embedding_caller
+
+EMBEDDING_MODEL = "text-embedding-004"
+
+
+def pack_batches(texts, max_items=None, max_tokens=None):
+    """
+    Split texts into consecutive batches within the per-request limits
+
+    Args:
+        texts: List of text strings
+        max_items: Maximum texts per batch (defaults to RAG_EMBEDDING_BATCH_SIZE)
+        max_tokens: Maximum estimated tokens per batch (defaults to
+            RAG_EMBEDDING_BATCH_MAX_TOKENS; a longer single text still gets a
+            batch of its own, which the API truncates)
+
+    Returns:
+        List of (start, end) index ranges into texts, in order
+    """
+    max_items = max_items or settings.RAG_EMBEDDING_BATCH_SIZE
+    max_tokens = max_tokens or settings.RAG_EMBEDDING_BATCH_MAX_TOKENS
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_items or tokens + cost > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+class EmbeddingProgress:
+    """Progress of a generate_embeddings call, passed to its progress callback"""
+
+    def __init__(self, total, cached=0):
+        """
+        Args:
+            total: Texts to embed through the API
+            cached: Texts served from the embedding cache
+        """
+        self.total = total
+        self.cached = cached
+        self.done = 0
+        self.batches = 0
+        self.retries = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def chunks_per_second(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+def print_progress(progress):
+    """Progress callback for the ingest scripts"""
+    if progress.done < progress.total:
+        print(f"  Processed {progress.done}/{progress.total} embeddings ({progress.chunks_per_second:.1f} chunks/s)...")
+        return
+
+    if progress.cached:
+        print(f"  ♻️  Reused {progress.cached} cached embeddings")
+    if progress.total:
+        print(
+            f"✅ Generated {progress.done} embeddings in {progress.batches} batches, "
+            f"{progress.elapsed:.1f}s ({progress.chunks_per_second:.1f} chunks/s, {progress.retries} retries)"
+        )
 
 class EmbeddingGenerator:
     """Generate embeddings using Google Vertex AI Text Embeddings"""
 
-    def __init__(self, project_id=None, location="us-central1"):
+    def __init__(self, project_id=None, location="us-central1", cache=None):
         """
         Initialize Vertex AI client
 
         Args:
             project_id: GCP project ID (defaults to GOOGLE_CLOUD_PROJECT env var)
             location: GCP region for Vertex AI
+            cache: EmbeddingCache instance (defaults to one at RAG_EMBEDDING_CACHE_PATH,
+                disabled with RAG_EMBEDDING_CACHE_ENABLED=False)
         """
         self.project_id = project_id or os.getenv('GOOGLE_CLOUD_PROJECT')
         self.location = location
 
-        # Initialize Vertex AI
-        vertexai.init(project=self.project_id, location=self.location)
+        # Load the text embedding model (initializing Vertex AI if it is used);
+        # every backend has its own model name so their vectors never share
+        # cache entries or a vector store
+        self.backend = get_embedding_backend_name()
+        self.model = load_embedding_model(EMBEDDING_MODEL, self.project_id, self.location)
+        if self.backend == 'onnx':
+            self.model_name = self.model.name
+        else:
+            self.model_name = EMBEDDING_MODEL if self.backend == 'vertex' else f"{self.backend}-{EMBEDDING_MODEL}"
+
+        # A local model has no network to time out, retry or hedge, and its
+        # threads already use every core
+        self.local = self.backend == 'onnx'
 
-        # Load the text embedding model (using latest version)
-        self.model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-        print(f"✅ Initialized Vertex AI Embeddings (Project: {self.project_id})")
+        # Content-addressed cache so unchanged texts are never re-embedded
+        if cache is None and os.getenv('RAG_EMBEDDING_CACHE_ENABLED', 'True') == 'True':
+            cache = EmbeddingCache(os.getenv('RAG_EMBEDDING_CACHE_PATH', './embedding_cache.sqlite3'))
+        self.cache = cache
+        print(f"✅ Initialized {self.model_name} embeddings (Backend: {self.backend}, Project: {self.project_id})")
 
     def generate_embedding(self, text):
         """
@@ -37,30 +130,145 @@ class EmbeddingGenerator:
         Returns:
             Embedding vector (list of floats)
         """
-        embeddings = self.model.get_embeddings([text])
-        return embeddings[0].values
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, text)
+            if cached is not None:
+                return cached
+
+        if self.local:
+            embedding = self._embed_one(text)
+        else:
+            # Embedding calls are idempotent, so they are retried and hedged
+            embedding = embedding_caller.call(self._embed_one, text, idempotent=True)
+
+        if self.cache is not None:
+            self.cache.put(self.model_name, text, embedding)
+        return embedding
+
+    async def agenerate_embedding(self, text):
+        """
+        Generate embedding for a single text without blocking the event loop
+
+        Args:
+            text: Input text string
+
+        Returns:
+            Embedding vector (list of floats)
+        """
+        # SQLite reads and writes can wait on locks or a WAL checkpoint, so
+        # they run in a thread instead of stalling every coroutine
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, self.model_name, text)
+            if cached is not None:
+                return cached
+
+        if self.local:
+            embeddings = await self.model.get_embeddings_async([text])
+        else:
+            embeddings = await embedding_caller.acall(
+                lambda: self.model.get_embeddings_async([text]), idempotent=True
+            )
+        embedding = embeddings[0].values
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, self.model_name, text, embedding)
+        return embedding
 
-    def generate_embeddings(self, texts, batch_size=5):
+    def generate_embeddings(self, texts, batch_size=None, max_concurrency=None, progress=None):
         """
         Generate embeddings for multiple texts in batch using Vertex AI
 
+        Texts are packed into batches within the per-request item and token
+        limits, and several batches are kept in flight. A throttled or failed
+        batch is retried on its own with backoff; each finished batch goes to
+        the embedding cache right away, so a rerun after a failure only embeds
+        what is left.
+
         Args:
             texts: List of text strings
-            batch_size: Number of texts per batch (Vertex AI limit is 250)
+            batch_size: Maximum texts per batch (defaults to RAG_EMBEDDING_BATCH_SIZE)
+            max_concurrency: Batches in flight (defaults to RAG_EMBEDDING_CONCURRENCY,
+                or 1 for a local model, which parallelizes within a batch)
+            progress: Optional callback taking an EmbeddingProgress, called
+                after every batch (see print_progress)
 
         Returns:
-            List of embedding vectors
+            List of embedding vectors, in the order of texts
         """
-        all_embeddings = []
+        all_embeddings = [None] * len(texts)
+        if self.cache is not None:
+            # Only texts that have never been embedded go to the API
+            all_embeddings = self.cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(
+            text for text, embedding in zip(texts, all_embeddings) if embedding is None
+        ))
+
+        tracker = EmbeddingProgress(len(missing), cached=len(texts) - sum(e is None for e in all_embeddings))
+        new_embeddings = self._embed_batches(
+            missing, batch_size or settings.RAG_EMBEDDING_BATCH_SIZE,
+            max_concurrency or (1 if self.local else settings.RAG_EMBEDDING_CONCURRENCY), tracker, progress
+        )
+        if not missing and progress is not None:
+            progress(tracker)
+
+        by_text = dict(zip(missing, new_embeddings))
+        return [
+            embedding if embedding is not None else by_text[text]
+            for text, embedding in zip(texts, all_embeddings)
+        ]
+
+    def _embed_one(self, text):
+        """Call Vertex AI for a single text"""
+        return self.model.get_embeddings([text])[0].values
+
+    def _embed_batches(self, texts, batch_size, max_concurrency, tracker, progress):
+        """Call Vertex AI for texts in concurrent batches, keeping their order"""
+        all_embeddings = [None] * len(texts)
+        batches = pack_batches(texts, max_items=batch_size)
+        if not batches:
+            return all_embeddings
 
-        # Process in batches (Vertex AI has a limit of 250 texts per request)
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self.model.get_embeddings(batch)
-            all_embeddings.extend([emb.values for emb in batch_embeddings])
+        retries_before = ingest_embedding_caller.stats()['retries']
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="rag-embed")
+        try:
+            pending = {
+                executor.submit(self._embed_batch, texts[start:end]): (start, end)
+                for start, end in batches
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = pending.pop(future)
+                    # Raises once the caller gives up on a batch; finished batches stay cached
+                    embeddings = future.result()
+                    all_embeddings[start:end] = embeddings
+                    if self.cache is not None:
+                        self.cache.put_many(self.model_name, texts[start:end], embeddings)
 
-            if len(texts) > batch_size:
-                print(f"  Processed {min(i + batch_size, len(texts))}/{len(texts)} embeddings...")
+                    tracker.done += end - start
+                    tracker.batches += 1
+                    tracker.retries = ingest_embedding_caller.stats()['retries'] - retries_before
+                    if progress is not None:
+                        progress(tracker)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        print(f"✅ Generated {len(all_embeddings)} embeddings with Vertex AI")
         return all_embeddings
+
+    def _embed_batch(self, batch):
+        """
+        Embed one batch
+
+        Retries come from ingest_embedding_caller alone (more and longer than
+        the request path's), and an open circuit fails the batch at once
+        instead of waiting for the breaker to close.
+        """
+        if self.local:
+            return [emb.values for emb in self.model.get_embeddings(batch)]
+
+        # Large batches take longer and are too costly to duplicate
+        batch_embeddings = ingest_embedding_caller.call(
+            self.model.get_embeddings, batch, idempotent=True, hedge=False,
+            timeout=ingest_embedding_caller.timeout * max(1, len(batch) / 25)
+        )
+        return [emb.values for emb in batch_embeddings]
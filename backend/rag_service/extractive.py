@@ -0,0 +1,76 @@
+"""
+Local extractive answers for degraded mode
+Picks the sentences of the retrieved chunks that best match the question,
+without any network call
+"""
+import math
+import re
+
+from .bm25 import tokenize
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n{2,}|\n(?=[-*#]|\d+\.)")
+
+# Question words that say nothing about the topic
+STOPWORDS = frozenset("""
+a an and are as at be by can did do does for from had has have how i in is it its
+me of on or tell the to was were what when where which who why will with you your
+vasu vasu's about
+""".split())
+
+
+def split_sentences(text):
+    """Split a chunk into sentences (markdown bullets and headings count as sentences)"""
+    sentences = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        sentence = sentence.strip().lstrip("-*# ").strip()
+        if len(sentence) >= 20:
+            sentences.append(sentence)
+    return sentences
+
+
+def extractive_answer(question, documents, max_sentences=3):
+    """
+    Build an answer from the sentences most similar to the question
+
+    Sentences are scored by the question terms they contain, weighted by how
+    rare each term is across the candidate sentences, normalized by sentence
+    length and slightly favoring higher-ranked chunks. The chosen sentences
+    keep their original order.
+
+    Args:
+        question: User's question
+        documents: Retrieved chunk texts, best first
+        max_sentences: Maximum number of sentences in the answer
+
+    Returns:
+        Answer text, or None if no sentence shares a term with the question
+    """
+    query_terms = {term for term in tokenize(question) if term not in STOPWORDS}
+    if not query_terms:
+        return None
+
+    candidates = []
+    for rank, document in enumerate(documents):
+        for sentence in split_sentences(document):
+            candidates.append((rank, sentence, set(tokenize(sentence))))
+    if not candidates:
+        return None
+
+    document_frequency = {
+        term: sum(1 for _, _, terms in candidates if term in terms) for term in query_terms
+    }
+
+    scored = []
+    for position, (rank, sentence, terms) in enumerate(candidates):
+        matched = query_terms & terms
+        if not matched:
+            continue
+        weight = sum(math.log(1 + len(candidates) / document_frequency[term]) for term in matched)
+        score = weight / math.sqrt(len(terms)) / (1 + 0.1 * rank)
+        scored.append((score, position, sentence))
+
+    if not scored:
+        return None
+
+    best = sorted(scored, reverse=True)[:max_sentences]
+    return " ".join(sentence for _, _, sentence in sorted(best, key=lambda item: item[1]))
@@ -0,0 +1,383 @@
+"""
+Flat NumPy vector store
+Exact search over a memory-mapped matrix of normalized float32 embeddings,
+with documents and metadata in a compact sidecar. No SQLite, no HNSW graph:
+opening the store maps a few files, and workers share the pages
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from .base_store import BaseVectorStore
+
+EMBEDDINGS_FILENAME = "flat_embeddings.npy"
+IDS_FILENAME = "flat_ids.npy"
+SOURCES_FILENAME = "flat_sources.npy"
+OFFSETS_FILENAME = "flat_offsets.npy"
+PAYLOAD_FILENAME = "flat_payload.bin"
+META_FILENAME = "flat_meta.json"
+
+FLAT_FILES = (EMBEDDINGS_FILENAME, IDS_FILENAME, SOURCES_FILENAME, OFFSETS_FILENAME, PAYLOAD_FILENAME, META_FILENAME)
+
+
+def normalize(vectors):
+    """Scale rows to unit length (float32)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def encode_payloads(documents, metadatas):
+    """
+    Encode rows for the payload file
+
+    Returns:
+        Tuple of (concatenated UTF-8 JSON [document, metadata] rows, byte length of each row)
+    """
+    rows = [
+        json.dumps([document, metadata], ensure_ascii=False).encode('utf-8')
+        for document, metadata in zip(documents, metadatas)
+    ]
+    return b"".join(rows), np.array([len(row) for row in rows], dtype=np.int64)
+
+
+class FlatIndex:
+    """The on-disk arrays of a flat store, memory-mapped"""
+
+    def __init__(self, embeddings, ids, sources, offsets, payload, meta):
+        """
+        Wrap loaded arrays (use FlatIndex.load or FlatIndex.write)
+
+        Args:
+            embeddings: Normalized float32 matrix of shape (n, d)
+            ids: Chunk IDs, one per row
+            sources: 'source' metadata of each row ('' if missing)
+            offsets: Start of each row's payload (n + 1 entries)
+            payload: UTF-8 JSON [document, metadata] per row, concatenated
+            meta: Dict with count, dim and embedding_model
+        """
+        self.embeddings = embeddings
+        self.ids = ids
+        self.sources = sources
+        self.offsets = offsets
+        self.payload = payload
+        self.meta = meta
+        self._rows = None
+        self._rows_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory):
+        """Map the store's files, or return None if nothing was written yet"""
+        meta_path = os.path.join(directory, META_FILENAME)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta['count'] == 0:
+            empty = np.array([], dtype=str)
+            return cls(np.zeros((0, meta['dim']), dtype=np.float32), empty, empty, np.zeros(1, dtype=np.int64), b"", meta)
+
+        index = cls(
+            embeddings=np.load(os.path.join(directory, EMBEDDINGS_FILENAME), mmap_mode='r'),
+            ids=np.load(os.path.join(directory, IDS_FILENAME), mmap_mode='r'),
+            sources=None,
+            offsets=np.load(os.path.join(directory, OFFSETS_FILENAME), mmap_mode='r'),
+            payload=np.memmap(os.path.join(directory, PAYLOAD_FILENAME), dtype=np.uint8, mode='r'),
+            meta=meta,
+        )
+        sources_path = os.path.join(directory, SOURCES_FILENAME)
+        if os.path.exists(sources_path):
+            index.sources = np.load(sources_path, mmap_mode='r')
+        else:
+            # Stores written before the sources column existed
+            index.sources = np.asarray([index.record(row)[1].get('source') or '' for row in range(len(index))], dtype=str)
+        return index
+
+    @staticmethod
+    def write(directory, embeddings, ids, sources, payload, lengths, embedding_model):
+        """
+        Write a complete store
+
+        Args:
+            embeddings: Normalized float32 matrix
+            ids: Chunk IDs
+            sources: 'source' metadata of each row
+            payload: Concatenated [document, metadata] rows (see encode_payloads)
+            lengths: Byte length of each row in payload
+            embedding_model: Model name recorded with the vectors
+        """
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+
+        # Atomic swaps, meta last: readers reload when the meta file changes
+        arrays = (
+            (EMBEDDINGS_FILENAME, np.asarray(embeddings, dtype=np.float32)),
+            (IDS_FILENAME, np.asarray(ids, dtype=str)),
+            (SOURCES_FILENAME, np.asarray(sources, dtype=str)),
+            (OFFSETS_FILENAME, offsets),
+        )
+        for filename, array in arrays:
+            path = os.path.join(directory, filename)
+            np.save(path + ".tmp.npy", array)
+            os.replace(path + ".tmp.npy", path)
+
+        path = os.path.join(directory, PAYLOAD_FILENAME)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(memoryview(payload))
+        os.replace(path + ".tmp", path)
+
+        meta = {
+            'count': len(ids),
+            'dim': int(np.shape(embeddings)[1]) if len(ids) else 0,
+            'embedding_model': embedding_model,
+        }
+        path = os.path.join(directory, META_FILENAME)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def payload_at(self, row):
+        """Encoded [document, metadata] of a row"""
+        return bytes(self.payload[self.offsets[row]:self.offsets[row + 1]])
+
+    def select(self, keep):
+        """
+        Rows where keep is True
+
+        Returns:
+            Tuple of (embeddings, ids, sources, payload, lengths) to pass on to write
+        """
+        lengths = np.diff(self.offsets)
+        # One boolean mask over the payload bytes instead of a slice per row
+        payload = np.asarray(self.payload, dtype=np.uint8)[np.repeat(keep, lengths)]
+        return (
+            np.asarray(self.embeddings[keep]), np.asarray(self.ids[keep]), np.asarray(self.sources[keep]),
+            payload.tobytes(), lengths[keep],
+        )
+
+    def record(self, row):
+        """(document, metadata) of a row"""
+        document, metadata = json.loads(self.payload_at(row).decode('utf-8'))
+        return document, metadata
+
+    def row_of(self, chunk_id):
+        """Row of a chunk ID, or None (the lookup table is built on first use)"""
+        if self._rows is None:
+            with self._rows_lock:
+                if self._rows is None:
+                    self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids.tolist())}
+        return self._rows.get(chunk_id)
+
+
+class FlatVectorStore(BaseVectorStore):
+    """Vector store backed by a memory-mapped NumPy matrix (exact search)"""
+
+    def __init__(self, persist_directory="./chroma_db"):
+        """
+        Open the flat store
+
+        Args:
+            persist_directory: Directory holding the store files and side indexes
+        """
+        super().__init__(persist_directory)
+
+        # Arrays are mapped lazily and re-mapped when ingest rewrites them
+        self._index = None
+        self._index_mtime = None
+        self._index_lock = threading.Lock()
+
+    def _flat_index(self):
+        """Return the mapped index (None if the store is empty), reloading after a re-ingest"""
+        path = os.path.join(self.persist_directory, META_FILENAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._index_lock:
+            if mtime != self._index_mtime:
+                self._index = FlatIndex.load(self.persist_directory)
+                self._index_mtime = mtime
+            return self._index
+
+    def add_documents(self, documents, embeddings, metadatas, ids=None, embedding_model=None,
+                      replace_sources=False):
+        """
+        Add or update documents in the vector store (re-added IDs replace their row)
+
+        Chunks are stored under content-hash IDs (see base_store.chunk_id),
+        so adding the same chunk again updates it instead of duplicating it.
+
+        Args:
+            documents: List of text chunks
+            embeddings: List of embedding vectors
+            metadatas: List of metadata dicts
+            ids: Optional list of document IDs (defaults to content-hash IDs)
+            embedding_model: Name of the model that produced the embeddings;
+                recorded on an empty store, checked against a filled one
+            replace_sources: Also remove stored chunks of the same sources
+                that are not in this call (edited or dropped chunks)
+
+        Raises:
+            EmbeddingModelMismatch: If the store holds another model's vectors
+        """
+        if embedding_model is not None:
+            self.check_embedding_model(embedding_model)
+
+        documents, embeddings, metadatas, ids = self._prepare_rows(documents, embeddings, metadatas, ids)
+        removed = list(ids)
+        if replace_sources:
+            removed.extend(self._stale_ids(ids, metadatas))
+
+        payload, lengths = encode_payloads(documents, metadatas)
+        sources = [metadata.get('source') or '' for metadata in metadatas]
+        self._rewrite(removed, (normalize(embeddings), ids, sources, payload, lengths), embedding_model)
+        self._bump_version()
+
+        print(f"✅ Added {len(documents)} documents to vector store")
+
+    def _rewrite(self, removed, added=None, embedding_model=None):
+        """
+        Write the store without the removed IDs, followed by the added rows
+
+        The whole store is rewritten (the flat layout has no in-place updates),
+        so ingest should add its chunks in one call rather than per file.
+
+        Args:
+            removed: IDs of the rows to drop
+            added: Optional (embeddings, ids, sources, payload, lengths) of new rows
+            embedding_model: Model name recorded if the store is empty
+        """
+        index = self._flat_index()
+        parts = []
+        model = embedding_model
+        if index is not None and len(index):
+            parts.append(index.select(~np.isin(index.ids, np.asarray(list(removed), dtype=str))))
+            model = index.meta.get('embedding_model') or model
+        if added is not None:
+            parts.append(added)
+
+        if not parts:
+            FlatIndex.write(self.persist_directory, np.zeros((0, 0), dtype=np.float32), [], [], b"", [], model)
+            return
+
+        embeddings, ids, sources, payload, lengths = zip(*parts)
+        FlatIndex.write(
+            self.persist_directory,
+            np.concatenate(embeddings), np.concatenate([np.asarray(part, dtype=str) for part in ids]),
+            np.concatenate([np.asarray(part, dtype=str) for part in sources]),
+            b"".join(payload), np.concatenate(lengths), model
+        )
+
+    def search_many(self, query_embeddings, k=5, include_embeddings=False):
+        """
+        Search for several queries with one matrix product
+
+        Args:
+            query_embeddings: List of query embedding vectors
+            k: Number of results to return per query
+            include_embeddings: Also return the stored embedding of each result
+
+        Returns:
+            List of result dictionaries with ids, documents, metadatas and
+            squared L2 distances (as ChromaDB reports them), one per query
+        """
+        index = self._flat_index()
+        if index is None or len(index) == 0:
+            empty = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+            if include_embeddings:
+                empty['embeddings'] = []
+            return [dict(empty) for _ in query_embeddings]
+
+        queries = normalize(query_embeddings)
+        scores = index.embeddings @ queries.T
+        k = min(k, len(index))
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+
+        all_results = []
+        for i in range(len(queries)):
+            rows = top[:, i][np.argsort(-scores[top[:, i], i], kind='stable')]
+            records = [index.record(row) for row in rows]
+            search_results = {
+                'ids': [str(index.ids[row]) for row in rows],
+                'documents': [document for document, _ in records],
+                'metadatas': [metadata for _, metadata in records],
+                # Squared L2 distance between unit vectors
+                'distances': np.maximum(2.0 - 2.0 * scores[rows, i], 0.0).tolist(),
+            }
+            if include_embeddings:
+                search_results['embeddings'] = list(np.asarray(index.embeddings[rows]))
+            all_results.append(search_results)
+
+        return all_results
+
+    def _get_by_ids(self, ids):
+        """Return {id: (document, metadata, embedding)} for the IDs that exist"""
+        index = self._flat_index()
+        if index is None:
+            return {}
+
+        found = {}
+        for chunk_id in ids:
+            row = index.row_of(chunk_id)
+            if row is not None:
+                found[chunk_id] = (*index.record(row), np.asarray(index.embeddings[row]))
+        return found
+
+    def _all_documents(self):
+        index = self._flat_index()
+        if index is None:
+            return [], []
+        return index.ids.tolist(), [index.record(row)[0] for row in range(len(index))]
+
+    def _source_ids(self, sources):
+        index = self._flat_index()
+        if index is None or len(index) == 0:
+            return []
+
+        rows = np.arange(len(index))
+        if sources is not None:
+            rows = np.flatnonzero(np.isin(index.sources, np.asarray(list(sources), dtype=str)))
+        return [(str(index.ids[row]), str(index.sources[row]) or None) for row in rows]
+
+    def _delete_ids(self, ids):
+        self._rewrite(set(ids))
+
+    def preload(self):
+        """
+        Map the store and load the lexical index ahead of the first query
+
+        Returns:
+            Number of documents in the store
+        """
+        index = self._flat_index()
+        if index is not None and len(index):
+            # Touch the pages so the first query doesn't fault them in
+            float(np.asarray(index.embeddings).sum())
+        return super().preload()
+
+    def embedding_model(self):
+        """Name of the embedding model the stored vectors came from (None if not recorded)"""
+        index = self._flat_index()
+        return index.meta.get('embedding_model') if index is not None and len(index) else None
+
+    def count(self):
+        """Get total number of documents in store"""
+        index = self._flat_index()
+        return len(index) if index is not None else 0
+
+    def clear(self):
+        """Clear all documents from the store"""
+        for filename in FLAT_FILES:
+            path = os.path.join(self.persist_directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        self._bump_version()
+
+        self._remove_lexical_index()
+        print("✅ Cleared vector store")
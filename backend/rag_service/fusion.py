@@ -0,0 +1,80 @@
+"""
+Hybrid retrieval fusion
+Combines dense (vector) and lexical (BM25) rankings with reciprocal-rank fusion
+"""
+import numpy as np
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """
+    Fuse several rankings of the same items
+
+    Args:
+        rankings: List of ranked ID lists (best first)
+        rrf_k: RRF damping constant; larger values flatten the rank curve
+
+    Returns:
+        List of (id, fused_score) tuples, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def fuse_search_results(dense_results, lexical_results, query_embedding, k=5, rrf_k=60):
+    """
+    Merge VectorStore.search and VectorStore.lexical_search results
+
+    Chunks found only by the lexical leg get their vector distance computed
+    from the returned embeddings (squared L2, Chroma's default metric), so
+    every fused result carries a comparable distance.
+
+    Args:
+        dense_results: Result dict from VectorStore.search
+        lexical_results: Result dict from VectorStore.lexical_search
+        query_embedding: Query embedding vector
+        k: Number of fused results to keep
+        rrf_k: RRF damping constant
+
+    Returns:
+        Result dict with ids, documents, metadatas and distances (plus
+        embeddings when the dense results include them)
+    """
+    with_embeddings = 'embeddings' in dense_results
+
+    rows = {}
+    for i, chunk_id in enumerate(dense_results['ids']):
+        rows[chunk_id] = (
+            dense_results['documents'][i],
+            dense_results['metadatas'][i],
+            dense_results['distances'][i],
+            dense_results['embeddings'][i] if with_embeddings else None,
+        )
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    for i, chunk_id in enumerate(lexical_results['ids']):
+        if chunk_id not in rows:
+            embedding = np.asarray(lexical_results['embeddings'][i], dtype=np.float32)
+            distance = float(np.sum((embedding - query) ** 2))
+            rows[chunk_id] = (
+                lexical_results['documents'][i],
+                lexical_results['metadatas'][i],
+                distance,
+                lexical_results['embeddings'][i],
+            )
+
+    fused = reciprocal_rank_fusion([dense_results['ids'], lexical_results['ids']], rrf_k=rrf_k)[:k]
+
+    results = {
+        'ids': [chunk_id for chunk_id, _ in fused],
+        'documents': [rows[chunk_id][0] for chunk_id, _ in fused],
+        'metadatas': [rows[chunk_id][1] for chunk_id, _ in fused],
+        'distances': [rows[chunk_id][2] for chunk_id, _ in fused],
+    }
+    if with_embeddings:
+        results['embeddings'] = [rows[chunk_id][3] for chunk_id, _ in fused]
+
+    return results
@@ -0,0 +1,228 @@
+"""
+Per-stage latency and token instrumentation for the RAG pipeline
+Each request records its stages in a RequestTimings object; finished requests
+are folded into per-worker histograms served by the metrics endpoint
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_current = ContextVar('rag_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Stage latencies and token counts of one chatbot request
+
+    Worker threads a deadline gave up on may still report after the request
+    finished, so updates and reads take a lock and finish() freezes the record.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+        self._finished_ms = None
+
+    @contextmanager
+    def activate(self):
+        """Make this the request that stage() and record_tokens() report to"""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def add(self, name, ms):
+        """Add milliseconds to a stage (repeated stages accumulate)"""
+        with self._lock:
+            if self._finished_ms is None:
+                self.stages[name] = round(self.stages.get(name, 0.0) + ms, 1)
+
+    def add_tokens(self, call, input_tokens, output_tokens):
+        """Record the token usage of a model call (repeated calls accumulate)"""
+        with self._lock:
+            if self._finished_ms is None:
+                usage = self.tokens.setdefault(call, {'input': 0, 'output': 0})
+                usage['input'] += input_tokens
+                usage['output'] += output_tokens
+
+    def finish(self):
+        """Stop recording (later reports are dropped) and return the final as_dict()"""
+        with self._lock:
+            if self._finished_ms is None:
+                self._finished_ms = self._elapsed_ms()
+        return self.as_dict()
+
+    def _elapsed_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def total_ms(self):
+        finished_ms = self._finished_ms
+        return finished_ms if finished_ms is not None else self._elapsed_ms()
+
+    def as_dict(self):
+        """Timings block for the JSON response"""
+        with self._lock:
+            return {
+                'stages_ms': dict(self.stages),
+                'total_ms': self.total_ms(),
+                'tokens': {call: dict(usage) for call, usage in self.tokens.items()},
+            }
+
+    def server_timing(self):
+        """Value of the Server-Timing response header"""
+        timings = self.as_dict()
+        entries = [f"{name};dur={ms}" for name, ms in timings['stages_ms'].items()]
+        entries.append(f"total;dur={timings['total_ms']}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as a stage of the current request (a no-op outside one)"""
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+def record_stage(name, ms):
+    """Add an already measured stage to the current request"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, ms)
+
+
+def record_tokens(call, response):
+    """Record a Gemini response's usage_metadata against the current request"""
+    timings = _current.get()
+    usage = getattr(response, 'usage_metadata', None)
+    if timings is None or usage is None:
+        return
+    timings.add_tokens(
+        call,
+        getattr(usage, 'prompt_token_count', 0) or 0,
+        getattr(usage, 'candidates_token_count', 0) or 0,
+    )
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus-style cumulative buckets on export)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            seen += count
+            cumulative.append({'le': bound, 'count': seen})
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 1),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': cumulative,
+        }
+
+
+class MetricsRegistry:
+    """Histograms of stage latencies and token counts for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._tokens = {}
+        self._counters = {}
+        self._modes = {}
+
+    def observe_request(self, timings, outcome='generated', mode=None):
+        """
+        Fold a finished request into the histograms (finishes its timings)
+
+        Args:
+            timings: RequestTimings of the request
+            outcome: How it was answered (generated, cached, precomputed, coalesced,
+                degraded, no_context, error, or disconnected for an abandoned stream)
+            mode: Answer mode of the request, counted separately when given
+        """
+        final = timings.finish()
+        with self._lock:
+            for name, ms in final['stages_ms'].items():
+                self._histogram(self._latency, name, LATENCY_BUCKETS_MS).observe(ms)
+            self._histogram(self._latency, 'total', LATENCY_BUCKETS_MS).observe(final['total_ms'])
+
+            for call, usage in final['tokens'].items():
+                self._histogram(self._tokens, f"{call}_input", TOKEN_BUCKETS).observe(usage['input'])
+                self._histogram(self._tokens, f"{call}_output", TOKEN_BUCKETS).observe(usage['output'])
+
+            self._counters[outcome] = self._counters.get(outcome, 0) + 1
+
+            if mode is not None:
+                per_mode = self._modes.setdefault(mode, {'requests': {}, 'latency': {}})
+                per_mode['requests'][outcome] = per_mode['requests'].get(outcome, 0) + 1
+                self._histogram(per_mode['latency'], 'total', LATENCY_BUCKETS_MS).observe(final['total_ms'])
+
+    def increment(self, name, amount=1):
+        """Bump a named counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Return all histograms and counters"""
+        with self._lock:
+            return {
+                'requests': dict(self._counters),
+                'latency_ms': {name: h.snapshot() for name, h in self._latency.items()},
+                'tokens': {name: h.snapshot() for name, h in self._tokens.items()},
+                'modes': {
+                    mode: {
+                        'requests': dict(per_mode['requests']),
+                        'latency_ms': {name: h.snapshot() for name, h in per_mode['latency'].items()},
+                    }
+                    for mode, per_mode in self._modes.items()
+                },
+            }
+
+    @staticmethod
+    def _histogram(histograms, name, buckets):
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram(buckets)
+        return histogram
+
+
+# Process-wide registry (each worker reports its own numbers)
+metrics = MetricsRegistry()
@@ -0,0 +1,111 @@
+"""
+Local CPU embeddings with ONNX Runtime
+Runs a small sentence-embedding model (e.g. all-MiniLM-L6-v2 exported to
+ONNX) from a local directory, so ingest and query embedding need no network,
+credentials or quota
+"""
+import asyncio
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+MODEL_FILENAME = "model.onnx"
+TOKENIZER_FILENAME = "tokenizer.json"
+
+
+class OnnxEmbeddingModel:
+    """
+    Sentence embeddings from an ONNX transformer encoder
+
+    Same interface as the Vertex AI TextEmbeddingModel: get_embeddings(texts)
+    returns objects with a .values vector. Texts are sorted by length and run
+    in sub-batches padded only to their longest member, token embeddings are
+    mean-pooled over the attention mask and the result is L2-normalized.
+    """
+
+    def __init__(self, model_path, name=None, threads=None, max_length=256, batch_size=32, pooling="mean"):
+        """
+        Args:
+            model_path: Directory holding model.onnx and tokenizer.json
+            name: Model name recorded with the vectors (defaults to the directory name)
+            threads: ONNX Runtime intra-op threads (defaults to the CPU count)
+            max_length: Tokens per text; longer texts are truncated
+            batch_size: Texts per inference call
+            pooling: 'mean' over tokens or 'cls' (first token)
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        if pooling not in ('mean', 'cls'):
+            raise ValueError(f"Unknown pooling '{pooling}' (expected mean or cls)")
+
+        self.name = f"onnx-{name or os.path.basename(os.path.normpath(model_path))}"
+        self.batch_size = batch_size
+        self.pooling = pooling
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, TOKENIZER_FILENAME))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        # No fixed length: each batch is padded to its longest text
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_path, MODEL_FILENAME), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    @classmethod
+    def from_env(cls):
+        """Build the model from the RAG_ONNX_* environment variables"""
+        model_path = os.getenv('RAG_ONNX_MODEL_PATH')
+        if not model_path:
+            raise ValueError("RAG_EMBEDDING_BACKEND=onnx needs RAG_ONNX_MODEL_PATH (directory with model.onnx and tokenizer.json)")
+
+        return cls(
+            model_path,
+            name=os.getenv('RAG_ONNX_MODEL_NAME') or None,
+            threads=int(os.getenv('RAG_ONNX_THREADS', '0')) or None,
+            max_length=int(os.getenv('RAG_ONNX_MAX_LENGTH', '256')),
+            batch_size=int(os.getenv('RAG_ONNX_BATCH_SIZE', '32')),
+            pooling=os.getenv('RAG_ONNX_POOLING', 'mean'),
+        )
+
+    def get_embeddings(self, texts):
+        vectors = [None] * len(texts)
+
+        # Similar lengths share a batch, so little padding is computed
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed([texts[i] for i in batch])):
+                vectors[i] = vector
+
+        return [SimpleNamespace(values=vector.tolist()) for vector in vectors]
+
+    async def get_embeddings_async(self, texts):
+        return await asyncio.to_thread(self.get_embeddings, texts)
+
+    def _embed(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        output = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+
+        if output.ndim == 2:
+            # The export already pools (sentence_embedding output)
+            pooled = output
+        elif self.pooling == 'cls':
+            pooled = output[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(output.dtype)
+            pooled = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        pooled = pooled.astype(np.float32)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
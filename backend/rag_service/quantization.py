@@ -0,0 +1,200 @@
+"""
+Compact embedding storage
+Matryoshka truncation for the candidate index, and float16 / int8 copies of
+the full vectors (memory-mapped) for re-scoring the top candidates
+"""
+import os
+
+import numpy as np
+
+VALUES_FILENAME = "compact_vectors.npy"
+META_FILENAME = "compact_vectors_meta.npz"
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+def truncate(vectors, dim):
+    """
+    Keep the first dim components of each vector and re-normalize
+
+    Matryoshka-trained models (text-embedding-004 among them) pack most of the
+    signal into the leading dimensions, so the prefix is a usable embedding.
+
+    Args:
+        vectors: Array of shape (n, d)
+        dim: Target dimension (None or >= d keeps every component)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dim is None or dim >= vectors.shape[-1]:
+        return vectors
+    prefix = vectors[..., :dim]
+    return prefix / np.maximum(np.linalg.norm(prefix, axis=-1, keepdims=True), 1e-12)
+
+
+def quantize(vectors, precision):
+    """
+    Encode float vectors for storage
+
+    Args:
+        vectors: Array of shape (n, d)
+        precision: 'float32', 'float16', or 'int8' (symmetric, one scale per vector)
+
+    Returns:
+        Tuple of (values array, per-vector scales or None)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if precision == 'float32':
+        return vectors, None
+    if precision == 'float16':
+        return vectors.astype(np.float16), None
+    if precision == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        values = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return values, scales.astype(np.float32)
+    raise ValueError(f"Unknown precision '{precision}' (expected one of {', '.join(PRECISIONS)})")
+
+
+def dequantize(values, scales=None):
+    """Decode stored vectors back to float32"""
+    vectors = np.asarray(values, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors
+
+
+class CompactVectors:
+    """Full-dimension vectors of every chunk in reduced precision, looked up by chunk ID"""
+
+    def __init__(self, ids, values, scales, precision, index_dim):
+        """
+        Wrap stored arrays (use CompactVectors.build or CompactVectors.load)
+
+        Args:
+            ids: Chunk IDs, one per row
+            values: float32, float16 or int8 array of shape (n, d)
+            scales: Per-row scales for int8 (None otherwise)
+            precision: One of PRECISIONS
+            index_dim: Dimension the candidate index was truncated to (None for full)
+        """
+        self.ids = np.asarray(ids)
+        self.values = values
+        self.scales = scales
+        self.precision = precision
+        self.index_dim = index_dim
+        self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def build(cls, ids, embeddings, precision, index_dim=None):
+        values, scales = quantize(embeddings, precision)
+        return cls(ids, values, scales, precision, index_dim)
+
+    def extend(self, ids, embeddings):
+        """Return a new instance with more rows (re-added IDs replace their old row)"""
+        values, scales = quantize(embeddings, self.precision)
+        replaced = set(ids)
+        keep = np.array([chunk_id not in replaced for chunk_id in self.ids.tolist()], dtype=bool)
+        return CompactVectors(
+            np.concatenate([self.ids[keep], np.asarray(ids)]),
+            np.concatenate([np.asarray(self.values)[keep], values]),
+            np.concatenate([self.scales[keep], scales]) if scales is not None else None,
+            self.precision,
+            self.index_dim,
+        )
+
+    def without(self, ids):
+        """Return a new instance without the rows of these IDs"""
+        removed = set(ids)
+        keep = np.array([chunk_id not in removed for chunk_id in self.ids.tolist()], dtype=bool)
+        return CompactVectors(
+            self.ids[keep],
+            np.asarray(self.values)[keep],
+            self.scales[keep] if self.scales is not None else None,
+            self.precision,
+            self.index_dim,
+        )
+
+    def get(self, ids):
+        """
+        Full-dimension float32 vectors for chunk IDs
+
+        Returns:
+            Tuple of (array of shape (len(ids), d), mask of the IDs that were found)
+        """
+        found = np.array([chunk_id in self._rows for chunk_id in ids], dtype=bool)
+        rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        vectors = np.zeros((len(ids), self.values.shape[1]), dtype=np.float32)
+        if rows:
+            # Only the touched rows of the memory map are read from disk
+            vectors[found] = dequantize(self.values[rows], self.scales[rows] if self.scales is not None else None)
+        return vectors, found
+
+    def nbytes(self):
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def save(self, directory):
+        """Write the vectors next to the ChromaDB data"""
+        values_path = os.path.join(directory, VALUES_FILENAME)
+        meta_path = os.path.join(directory, META_FILENAME)
+
+        # Atomic swaps, values first: readers reload when the meta file changes
+        np.save(values_path + ".tmp.npy", np.asarray(self.values))
+        os.replace(values_path + ".tmp.npy", values_path)
+        np.savez(
+            meta_path + ".tmp.npz",
+            ids=self.ids,
+            scales=self.scales if self.scales is not None else np.zeros(0, dtype=np.float32),
+            precision=np.array(self.precision),
+            index_dim=np.array(self.index_dim or 0),
+        )
+        os.replace(meta_path + ".tmp.npz", meta_path)
+
+    @classmethod
+    def load(cls, directory):
+        """Load the vectors saved in directory (values memory-mapped), or None if there are none"""
+        meta_path = os.path.join(directory, META_FILENAME)
+        if not os.path.exists(meta_path):
+            return None
+
+        with np.load(meta_path) as meta:
+            precision = str(meta['precision'])
+            return cls(
+                ids=meta['ids'],
+                values=np.load(os.path.join(directory, VALUES_FILENAME), mmap_mode='r'),
+                scales=meta['scales'] if precision == 'int8' else None,
+                precision=precision,
+                index_dim=int(meta['index_dim']) or None,
+            )
+
+    @staticmethod
+    def remove(directory):
+        for filename in (VALUES_FILENAME, META_FILENAME):
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def rescore(query, ids, compact, k):
+    """
+    Re-rank candidates by squared L2 distance between the full-precision query
+    and the full-dimension stored vectors
+
+    Args:
+        query: Full-dimension query embedding
+        ids: Candidate chunk IDs from the truncated index
+        compact: CompactVectors holding the candidates
+        k: Number of candidates to keep
+
+    Returns:
+        Tuple of (candidate positions best first, their distances, their vectors)
+    """
+    vectors, found = compact.get(ids)
+    distances = ((vectors - np.asarray(query, dtype=np.float32)) ** 2).sum(axis=1)
+    # Chunks missing from the compact copy can't be re-scored and are dropped
+    distances[~found] = np.inf
+    order = np.argsort(distances, kind='stable')[:k]
+    order = order[np.isfinite(distances[order])]
+    return order, distances[order], vectors[order]
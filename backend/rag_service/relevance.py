@@ -0,0 +1,62 @@
+"""
+Relevance gating for retrieved chunks
+Drops chunks too far from the question and cuts the rest at the largest jump
+in distance, so weak matches never reach the prompt
+"""
+import numpy as np
+
+RESULT_LISTS = ('ids', 'documents', 'metadatas', 'distances', 'embeddings')
+
+
+def relevance_cutoff(distances, max_distance, min_gap=0.1):
+    """
+    Largest distance worth keeping, from the distance curve
+
+    Chunks above max_distance are dropped. Among the rest, sorted by distance,
+    the list is cut at the largest gap between neighbours when that gap is at
+    least min_gap (the elbow between "about this" and "loosely related").
+
+    Args:
+        distances: Vector distances of the retrieved chunks
+        max_distance: Largest distance a chunk may have to be kept
+        min_gap: Smallest distance jump treated as an elbow
+
+    Returns:
+        Distance cut-off (chunks with distance <= it are kept), or None if
+        no chunk clears max_distance
+    """
+    kept = np.sort(np.asarray([d for d in distances if d <= max_distance], dtype=np.float64))
+    if kept.size == 0:
+        return None
+    if kept.size == 1:
+        return float(kept[0])
+
+    gaps = np.diff(kept)
+    elbow = int(np.argmax(gaps))
+    if gaps[elbow] >= min_gap:
+        return float(kept[elbow])
+    return float(kept[-1])
+
+
+def gate_search_results(search_results, max_distance, min_gap=0.1):
+    """
+    Keep only the relevant chunks of a search result dict, in their original order
+
+    Args:
+        search_results: Result dict with ids, documents, metadatas and distances
+        max_distance: Largest distance a chunk may have to be kept
+        min_gap: Smallest distance jump treated as an elbow (see relevance_cutoff)
+
+    Returns:
+        Result dict with the same keys (empty lists if nothing is relevant)
+    """
+    cutoff = relevance_cutoff(search_results['distances'], max_distance, min_gap)
+    keep = [] if cutoff is None else [
+        i for i, distance in enumerate(search_results['distances']) if distance <= cutoff
+    ]
+
+    gated = dict(search_results)
+    for key in RESULT_LISTS:
+        if key in search_results:
+            gated[key] = [search_results[key][i] for i in keep]
+    return gated
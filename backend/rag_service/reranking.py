@@ -0,0 +1,67 @@
+"""
+Diversity re-ranking for retrieved chunks
+Maximal marginal relevance (MMR) over over-fetched candidates
+"""
+import numpy as np
+
+
+def maximal_marginal_relevance(query_embedding, embeddings, k, lambda_mult=0.7):
+    """
+    Select k items that are relevant to the query but not redundant
+
+    Args:
+        query_embedding: Query embedding vector
+        embeddings: Candidate embedding vectors
+        k: Number of items to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        List of selected candidate indices, in selection order
+    """
+    candidates = np.asarray(embeddings, dtype=np.float32)
+    if candidates.size == 0 or k <= 0:
+        return []
+
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    k = min(k, len(candidates))
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything already selected
+    redundancy = similarity[selected[0]].copy()
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+
+    return selected
+
+
+def rerank_search_results(search_results, query_embedding, k, lambda_mult=0.7):
+    """
+    Keep k diverse results from an over-fetched search result dict
+
+    Args:
+        search_results: Result dict that includes 'embeddings'
+        query_embedding: Query embedding vector
+        k: Number of results to keep
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        Result dict with ids, documents, metadatas and distances for the kept results
+    """
+    selected = maximal_marginal_relevance(
+        query_embedding, search_results['embeddings'], k, lambda_mult
+    )
+
+    return {
+        key: [search_results[key][i] for i in selected]
+        for key in ('ids', 'documents', 'metadatas', 'distances')
+    }
@@ -0,0 +1,460 @@
+"""
+Resilient calls to Vertex AI
+Per-call timeouts, jittered retries, hedged requests and a circuit breaker
+shared by the embedding generator and the chatbot
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _RETRYABLE_GOOGLE_ERRORS = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests,
+    )
+    _CLIENT_ERRORS = (google_exceptions.ClientError,)
+except ImportError:
+    _RETRYABLE_GOOGLE_ERRORS = ()
+    _CLIENT_ERRORS = ()
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream call can't be completed (timeout or open circuit)"""
+
+
+class UpstreamTimeout(UpstreamUnavailable):
+    """Raised when an upstream call doesn't return within its timeout"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised instead of calling an upstream that is failing"""
+
+
+RETRYABLE_ERRORS = (UpstreamTimeout, ConnectionError) + _RETRYABLE_GOOGLE_ERRORS
+
+_DEFAULT = object()
+
+# Abandoned (timed out or losing hedged) calls keep their thread until they return
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rag-upstream")
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected for reset_timeout seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """
+        Check that a call may go out
+
+        Raises:
+            CircuitOpenError: While the circuit is open
+        """
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+
+            self.rejected += 1
+            raise CircuitOpenError("upstream circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def abandon(self):
+        """Forget a call that ended without an outcome, so another trial can go out"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+
+class LatencyWindow:
+    """Recent latencies of successful calls, for percentile-based hedge delays"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, minimum_samples=20):
+        """Return the q-th percentile, or None until enough calls were seen"""
+        with self._lock:
+            if len(self._samples) < minimum_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Wraps calls to one upstream (e.g. embeddings) with a timeout, retries,
+    hedging and a circuit breaker
+
+    Retries and hedging re-send the request, so they are only used for calls
+    marked idempotent.
+    """
+
+    def __init__(self, name, timeout=10.0, retries=0, backoff=0.2, max_backoff=None, hedge=False,
+                 hedge_percentile=95, hedge_delay=0.5, breaker=None):
+        """
+        Args:
+            name: Upstream name used in metrics
+            timeout: Seconds per attempt (None for no timeout)
+            retries: Extra attempts for idempotent calls
+            backoff: Base delay before a retry (doubled per attempt, full jitter)
+            max_backoff: Cap on the doubled delay (None for no cap)
+            hedge: Send a duplicate of idempotent calls that are slower than usual
+            hedge_percentile: Latency percentile after which the duplicate is sent
+            hedge_delay: Hedge delay used until enough latencies were observed
+            breaker: CircuitBreaker (defaults to a new one)
+        """
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyWindow()
+
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0, 'failures': 0, 'timeouts': 0, 'retries': 0,
+            'hedges_sent': 0, 'hedge_wins': 0,
+        }
+
+    def call(self, func, *args, idempotent=False, hedge=None, timeout=_DEFAULT):
+        """
+        Call func(*args) in a worker thread under the caller's policies
+
+        Args:
+            idempotent: Whether the call may be retried and hedged
+            hedge: Override the caller's hedging (e.g. off for large batches)
+            timeout: Override the caller's per-attempt timeout
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            UpstreamTimeout: If the (last) attempt timed out
+            Exception: The upstream error of the last attempt
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            self._count('calls')
+            try:
+                result = self._attempt(
+                    func, args,
+                    hedge=idempotent and (self.hedge if hedge is None else hedge),
+                    timeout=self.timeout if timeout is _DEFAULT else timeout
+                )
+            except Exception as e:
+                self._failed(e)
+                if attempt == attempts - 1 or not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                self._count('retries')
+                time.sleep(self._retry_delay(attempt))
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def acall(self, make_awaitable, idempotent=False, hedge=None, timeout=_DEFAULT):
+        """
+        Async variant of call
+
+        Args:
+            make_awaitable: Zero-argument callable returning a new awaitable per attempt
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            self._count('calls')
+            try:
+                result = await self._aattempt(
+                    make_awaitable,
+                    hedge=idempotent and (self.hedge if hedge is None else hedge),
+                    timeout=self.timeout if timeout is _DEFAULT else timeout
+                )
+            except Exception as e:
+                self._failed(e)
+                if attempt == attempts - 1 or not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                self._count('retries')
+                await asyncio.sleep(self._retry_delay(attempt))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def guard(self, func, *args):
+        """
+        Start a streaming call func(*args) in the calling thread with only the circuit breaker
+
+        For calls that return a stream, where a timeout or retry can't apply.
+        The stream is wrapped so the outcome is recorded as it is consumed:
+        success at the first chunk (or at the end of an empty stream), failure
+        on an error while starting or iterating it.
+
+        Returns:
+            Iterator over the stream's chunks
+        """
+        self.breaker.before_call()
+        self._count('calls')
+        try:
+            stream = iter(func(*args))
+        except Exception as e:
+            self._failed(e)
+            raise
+        return _GuardedStream(self, stream)
+
+    def _attempt(self, func, args, hedge, timeout):
+        """One attempt, hedged with a duplicate if the first is slow"""
+        start = time.monotonic()
+        # Run with the request's context so stage timings are still recorded
+        futures = [_executor.submit(contextvars.copy_context().run, func, *args)]
+
+        if hedge:
+            delay = self._hedge_delay()
+            if timeout is None or delay < timeout:
+                done, _ = wait(futures, timeout=delay)
+                if not done:
+                    self._count('hedges_sent')
+                    futures.append(_executor.submit(contextvars.copy_context().run, func, *args))
+
+        remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None or not pending:
+                    return self._won(futures, future, start)
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+
+        for future in futures:
+            future.cancel()
+        raise UpstreamTimeout(f"{self.name} call timed out after {timeout}s")
+
+    async def _aattempt(self, make_awaitable, hedge, timeout):
+        start = time.monotonic()
+        tasks = [asyncio.ensure_future(make_awaitable())]
+
+        if hedge:
+            delay = self._hedge_delay()
+            if timeout is None or delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self._count('hedges_sent')
+                    tasks.append(asyncio.ensure_future(make_awaitable()))
+
+        try:
+            pending = set(tasks)
+            while pending:
+                remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None or not pending:
+                        return self._won(tasks, task, start)
+            raise UpstreamTimeout(f"{self.name} call timed out after {timeout}s")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _won(self, attempts, winner, start):
+        """Result of the first finished attempt (raises its error if all failed)"""
+        result = winner.result()
+        self.latencies.add(time.monotonic() - start)
+        if len(attempts) > 1 and winner is attempts[1]:
+            self._count('hedge_wins')
+        return result
+
+    def _hedge_delay(self):
+        return self.latencies.percentile(self.hedge_percentile) or self.hedge_delay
+
+    def _retry_delay(self, attempt):
+        delay = self.backoff * 2 ** attempt
+        if self.max_backoff is not None:
+            delay = min(delay, self.max_backoff)
+        return random.uniform(0, delay)
+
+    def _failed(self, error):
+        self._count('failures')
+        if isinstance(error, UpstreamTimeout):
+            self._count('timeouts')
+
+        # A rejected request (bad input, permissions) means upstream is up
+        if isinstance(error, _CLIENT_ERRORS) and not isinstance(error, RETRYABLE_ERRORS):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """Return call counters, hedge win rate and breaker state"""
+        with self._lock:
+            counters = dict(self._counters)
+        hedge_p = self.latencies.percentile(self.hedge_percentile)
+        return {
+            **counters,
+            'hedge_win_rate': round(counters['hedge_wins'] / counters['hedges_sent'], 4) if counters['hedges_sent'] else None,
+            'hedge_delay_ms': round(hedge_p * 1000, 1) if hedge_p is not None else None,
+            'breaker': self.breaker.stats(),
+        }
+
+
+# One caller per upstream, shared by every EmbeddingGenerator / chatbot in the process
+embedding_caller = ResilientCaller(
+    'embedding',
+    timeout=settings.RAG_EMBEDDING_TIMEOUT,
+    retries=settings.RAG_EMBEDDING_RETRIES,
+    hedge=settings.RAG_EMBEDDING_HEDGE,
+    hedge_delay=settings.RAG_EMBEDDING_HEDGE_DELAY,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.RAG_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.RAG_BREAKER_RESET_TIMEOUT,
+    ),
+)
+
+# Bulk ingest embedding rides out quota bursts (429s) with more retries and
+# longer backoff, behind its own breaker so it never trips the request path's
+ingest_embedding_caller = ResilientCaller(
+    'embedding_ingest',
+    timeout=settings.RAG_EMBEDDING_TIMEOUT,
+    retries=settings.RAG_INGEST_EMBEDDING_RETRIES,
+    backoff=settings.RAG_INGEST_EMBEDDING_BACKOFF,
+    max_backoff=settings.RAG_INGEST_EMBEDDING_MAX_BACKOFF,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.RAG_INGEST_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.RAG_BREAKER_RESET_TIMEOUT,
+    ),
+)
+
+generation_caller = ResilientCaller(
+    'generation',
+    timeout=settings.RAG_GENERATION_TIMEOUT,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.RAG_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.RAG_BREAKER_RESET_TIMEOUT,
+    ),
+)
+
+
+class _GuardedStream:
+    """Stream returned by ResilientCaller.guard, reporting its outcome as it is consumed"""
+
+    def __init__(self, caller, stream):
+        self._caller = caller
+        self._stream = stream
+        self._succeeded = False
+        self._finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._stream)
+        except StopIteration:
+            self._success()
+            self._finished = True
+            raise
+        except Exception as e:
+            if not self._finished:
+                self._finished = True
+                self._caller._failed(e)
+            raise
+        self._success()
+        return chunk
+
+    def _success(self):
+        if not self._succeeded and not self._finished:
+            self._succeeded = True
+            self._caller.breaker.record_success()
+
+    def close(self):
+        if not self._succeeded and not self._finished:
+            # Closed before any chunk: no outcome, but free a half-open trial
+            self._caller.breaker.abandon()
+        self._finished = True
+        close = getattr(self._stream, 'close', None)
+        if close is not None:
+            close()
+
+
+def upstream_stats():
+    """Stats of every upstream caller, for the metrics endpoint"""
+    return {
+        caller.name: caller.stats()
+        for caller in (embedding_caller, ingest_embedding_caller, generation_caller)
+    }
@@ -1,6 +1,7 @@
 """
 Serializers for RAG chatbot API
 """
+from django.conf import settings
 from rest_framework import serializers
 
 class ChatQuerySerializer(serializers.Serializer):
@@ -10,15 +11,78 @@ class ChatQuerySerializer(serializers.Serializer):
         help_text="Question to ask the chatbot"
     )
     k = serializers.IntegerField(
-        default=5,
+        required=False,
+        allow_null=True,
+        default=None,
         min_value=1,
         max_value=10,
-        help_text="Number of context documents to retrieve"
+        help_text="Number of context documents to retrieve; omit for the mode's default"
+    )
+    mode = serializers.ChoiceField(
+        choices=list(settings.RAG_ANSWER_MODES),
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="Answer mode trading quality for latency; omit for the server default"
     )
     include_sources = serializers.BooleanField(
         default=True,
         help_text="Include source documents in response"
     )
+    diversity = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        default=None,
+        min_value=0.0,
+        max_value=1.0,
+        help_text="MMR trade-off between relevance (1.0) and diversity (0.0); omit for the server default"
+    )
+    include_timings = serializers.BooleanField(
+        default=False,
+        help_text="Include per-stage latencies and token counts in response"
+    )
+
+class ChatBatchQuerySerializer(serializers.Serializer):
+    """Serializer for batch chatbot query requests"""
+    questions = serializers.ListField(
+        child=serializers.CharField(max_length=500),
+        min_length=1,
+        max_length=settings.RAG_BATCH_MAX_QUESTIONS,
+        help_text="Questions to ask the chatbot"
+    )
+    k = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        default=None,
+        min_value=1,
+        max_value=10,
+        help_text="Number of context documents to retrieve per question; omit for the mode's default"
+    )
+    mode = serializers.ChoiceField(
+        choices=list(settings.RAG_ANSWER_MODES),
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="Answer mode trading quality for latency; omit for the server default"
+    )
+    include_sources = serializers.BooleanField(
+        default=True,
+        help_text="Include source documents in responses"
+    )
+    diversity = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        default=None,
+        min_value=0.0,
+        max_value=1.0,
+        help_text="MMR trade-off between relevance (1.0) and diversity (0.0); omit for the server default"
+    )
+    max_concurrency = serializers.IntegerField(
+        default=settings.RAG_BATCH_CONCURRENCY,
+        min_value=1,
+        max_value=settings.RAG_BATCH_CONCURRENCY,
+        help_text="Maximum number of answers generated in parallel"
+    )
 
 class SourceSerializer(serializers.Serializer):
     """Serializer for source document metadata"""
@@ -31,6 +95,7 @@ class ChatResponseSerializer(serializers.Serializer):
     """Serializer for chatbot response"""
     answer = serializers.CharField()
     context_used = serializers.IntegerField()
+    mode = serializers.CharField(required=False)
     sources = SourceSerializer(many=True, required=False)
 
 class SuggestedQuestionsSerializer(serializers.Serializer):
@@ -0,0 +1,146 @@
+"""
+Single-flight coalescing of identical concurrent chatbot requests
+The first caller for a key does the work; concurrent duplicates wait for its
+result instead of sending the same prompt to Vertex AI again
+"""
+import copy
+import threading
+import time
+import uuid
+
+
+class _Call:
+    """One in-flight call that duplicates can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key across the threads of one worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func once per key at a time
+
+        Args:
+            key: Coalescing key (requests with equal keys get the same result)
+            func: Callable doing the actual work
+
+        Returns:
+            Tuple of (result, shared) where shared is True if the result was
+            produced by another caller's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # Once unregistered no follower can join, so the waiter count is final
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+
+        # Followers copy call.result, so the caller must not mutate it in place
+        return (copy.deepcopy(call.result) if shared else call.result), False
+
+    def stats(self):
+        """Return leader/coalesced counters and the number of calls in flight"""
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
+
+
+class CacheSingleFlight:
+    """
+    Coalesce calls across worker processes through the Django cache
+
+    The leader takes a lock with cache.add() and publishes its result under a
+    per-flight token; other workers poll for that result. Needs a cache shared
+    by all workers (Redis, Memcached or the database cache), not LocMemCache.
+    """
+
+    def __init__(self, cache, prefix="rag:single-flight", wait_timeout=30.0, poll_interval=0.05):
+        """
+        Args:
+            cache: Django cache instance
+            prefix: Cache key prefix
+            wait_timeout: Seconds a follower waits before doing the work itself
+            poll_interval: Seconds between result polls
+        """
+        self.cache = cache
+        self.prefix = prefix
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func once per key at a time across all workers
+
+        Returns:
+            Tuple of (result, shared), like SingleFlight.do
+        """
+        lock_key = f"{self.prefix}:lock:{key}"
+        result_key = f"{self.prefix}:result:{key}"
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            token = uuid.uuid4().hex
+            # A crashed leader's lock expires after wait_timeout
+            if self.cache.add(lock_key, token, timeout=self.wait_timeout):
+                try:
+                    result = func(*args, **kwargs)
+                    self.cache.set(result_key, {'token': token, 'result': result}, timeout=self.wait_timeout)
+                    return result, False
+                finally:
+                    self.cache.delete(lock_key)
+
+            leader_token = self.cache.get(lock_key)
+            while leader_token is not None and time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                published = self.cache.get(result_key)
+                if published is not None and published['token'] == leader_token:
+                    return published['result'], True
+                if self.cache.get(lock_key) != leader_token:
+                    # Leader finished or failed; its result may still have been published
+                    published = self.cache.get(result_key)
+                    if published is not None and published['token'] == leader_token:
+                        return published['result'], True
+                    break
+
+            if time.monotonic() >= deadline:
+                # Give up waiting on a slow or stuck leader
+                return func(*args, **kwargs), False
@@ -0,0 +1,174 @@
+"""
+Precomputed answers for the chatbot's suggested questions
+Generated after every ingest and stored next to the ChromaDB data, keyed by
+the vector store version so answers from an older index are never served
+"""
+import copy
+import json
+import os
+import re
+import threading
+
+from .answer_modes import get_answer_mode
+
+ANSWERS_FILENAME = "suggested_answers.json"
+
+
+def normalize_question(question):
+    """Match key for a question: lowercase, single spaces, no trailing punctuation"""
+    question = re.sub(r'\s+', ' ', question).strip().lower()
+    return re.sub(r'[\s?!.]+$', '', question)
+
+
+class SuggestedAnswers:
+    """Answers to the suggested questions, stored as JSON in the vector store directory"""
+
+    def __init__(self, persist_directory="./chroma_db"):
+        """
+        Open the precomputed answer store
+
+        Args:
+            persist_directory: Vector store directory holding suggested_answers.json
+        """
+        self.path = os.path.join(persist_directory, ANSWERS_FILENAME)
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._version = None
+        self._k = None
+        self._answers = {}
+        self._refreshing = None
+
+    def lookup(self, question, version, k=5):
+        """
+        Get the precomputed answer for a question
+
+        Args:
+            question: User's question
+            version: Current vector store version
+            k: Number of context documents the request asked for
+
+        Returns:
+            Response dict, or None if the question has no answer for this version
+        """
+        self._reload()
+        with self._lock:
+            if self._version != version or self._k != k:
+                return None
+            answer = self._answers.get(normalize_question(question))
+        return copy.deepcopy(answer) if answer is not None else None
+
+    def version(self):
+        """Vector store version the stored answers were generated for (None if there are none)"""
+        self._reload()
+        with self._lock:
+            return self._version
+
+    def is_current(self, version, k):
+        """Whether the stored answers were generated for this index version and k"""
+        self._reload()
+        with self._lock:
+            return self._version == version and self._k == k
+
+    def save(self, version, answers, k=5):
+        """
+        Replace the stored answers
+
+        Args:
+            version: Vector store version the answers were generated against
+            answers: Dict of question -> response dict
+            k: Number of context documents used per answer
+        """
+        payload = {
+            'version': version,
+            'k': k,
+            'answers': {normalize_question(q): answer for q, answer in answers.items()},
+        }
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, default=str)
+        # Atomic swap so serving workers never read a half-written file
+        os.replace(tmp_path, self.path)
+
+    def generate(self, bot, k=None):
+        """
+        Answer every suggested question against the current index and save them
+
+        Args:
+            bot: PortfolioRAGChatbot used to generate the answers
+            k: Number of context documents per answer (None uses the default
+                answer mode's, which is what lookups ask for)
+
+        Returns:
+            Number of answers stored
+        """
+        k = k or get_answer_mode().k
+        version = bot.vector_store.version()
+        questions = bot.get_suggested_questions()
+
+        answers = {}
+        for result in bot.query_batch(questions, k=k):
+            question = result.pop('question')
+            result.pop('index', None)
+            if 'error' in result:
+                print(f"  ⚠️  Could not precompute '{question}': {result['error']}")
+                continue
+            if result.get('degraded'):
+                # An extractive fallback would be served until the next ingest
+                print(f"  ⚠️  Could not precompute '{question}': generation unavailable")
+                continue
+            # Serving-time fields, not meaningful for a stored answer
+            result.pop('cached', None)
+            result.pop('retrieval_ms', None)
+            answers[question] = result
+
+        # Skip the write if the index changed while generating
+        if bot.vector_store.version() != version:
+            print("  ⚠️  Index changed while precomputing suggested answers, discarding them")
+            return 0
+
+        self.save(version, answers, k=k)
+        return len(answers)
+
+    def refresh_in_background(self, bot, k=None):
+        """Regenerate the answers in a background thread unless a refresh is already running"""
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return self._refreshing
+
+            def refresh():
+                try:
+                    count = self.generate(bot, k=k)
+                    print(f"✅ Precomputed {count} suggested answers")
+                except Exception as e:
+                    print(f"❌ Precomputing suggested answers failed: {e}")
+
+            self._refreshing = threading.Thread(target=refresh, name="rag-suggested-answers", daemon=True)
+            self._refreshing.start()
+            return self._refreshing
+
+    def _reload(self):
+        """Load the answers file if it changed on disk (another process may have regenerated it)"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+
+            if mtime is None:
+                payload = {}
+            else:
+                try:
+                    with open(self.path, 'r') as f:
+                        payload = json.load(f)
+                except (OSError, ValueError):
+                    return
+
+            self._mtime = mtime
+            self._version = payload.get('version')
+            self._k = payload.get('k')
+            self._answers = payload.get('answers', {})
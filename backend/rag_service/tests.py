@@ -1,3 +1,1521 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from portfolio.models import Paper
+
+from . import views, warmup
+from .admission import AdmissionController, AdmissionRejected
+from .answer_cache import SemanticAnswerCache
+from .answer_modes import get_answer_mode
+from .backends import FakeEmbeddingModel, FakeGenerativeModel, LatencyDistribution, get_backend_name
+from .base_store import chunk_id, open_vector_store
+from .blog_search import search_blog_posts
+from .bm25 import BM25Index
+from .chatbot import NO_CONTEXT_ANSWER, PortfolioRAGChatbot
+from .context_packer import ContextPacker
+from .deadline import Deadline, DeadlineExceeded
+from .embedding_cache import EmbeddingCache
+from .embeddings import EmbeddingGenerator, pack_batches
+from .flat_vector_store import FlatVectorStore
+from .fusion import fuse_search_results, reciprocal_rank_fusion
+from .metrics import RequestTimings, metrics
+from .onnx_embeddings import OnnxEmbeddingModel
+from .quantization import CompactVectors, dequantize, quantize, rescore, truncate
+from .relevance import gate_search_results, relevance_cutoff
+from .reranking import maximal_marginal_relevance, rerank_search_results
+from .resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientCaller, embedding_caller, ingest_embedding_caller
+)
+from .single_flight import SingleFlight
+from .suggested_answers import SuggestedAnswers
+from .tools import ToolResultCache, ToolRunner
+from .vector_store import CompactStorageMismatch, VectorStore
+
+
+def unit(*components):
+    vector = np.asarray(components, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def squared_distance(a, b):
+    return float(np.sum((np.asarray(a) - np.asarray(b)) ** 2))
+
+
+class StaticVectorStore:
+    """Vector store returning fixed dense and lexical results"""
+
+    def __init__(self, dense, lexical):
+        self.dense = dense
+        self.lexical = lexical
+
+    def search_many(self, query_embeddings, k=5, include_embeddings=False):
+        return [dict(self.dense) for _ in query_embeddings]
+
+    def lexical_search(self, query_text, k=5):
+        return dict(self.lexical)
+
+
+# Offline fake models with no latency; tests that want tool calls raise the rate
+FAKE_BACKEND = {
+    'RAG_MODEL_BACKEND': 'fake',
+    'RAG_EMBEDDING_BACKEND': 'fake',
+    'RAG_EMBEDDING_CACHE_ENABLED': 'False',
+    'RAG_FAKE_EMBEDDING_DIM': '64',
+    'RAG_FAKE_EMBEDDING_LATENCY': 'constant:0',
+    'RAG_FAKE_GENERATION_LATENCY': 'constant:0',
+    'RAG_FAKE_FUNCTION_CALL_RATE': '0',
+}
+
+DOCUMENTS = [
+    ('docs/kubernetes.md', "Vasu deployed Kubernetes clusters on GKE with Helm charts."),
+    ('docs/terraform.md', "Terraform modules provision the GCP infrastructure for the portfolio."),
+    ('docs/rag.md', "The RAG chatbot retrieves documentation chunks with ChromaDB embeddings."),
+    ('docs/docker.md', "Vasu learned Docker by containerizing the Django backend."),
+]
+
+ON_TOPIC_QUESTION = "How did Vasu deploy Kubernetes clusters?"
+OFF_TOPIC_QUESTION = "What is the capital of France?"
+
+
+@override_settings(RAG_SUGGESTED_ANSWERS_ENABLED=False)
+class FakeChatbotTestCase(SimpleTestCase):
+    """Runs a real PortfolioRAGChatbot on the fake backend over a small flat store"""
+
+    environment = {}
+
+    def make_chatbot(self, documents=DOCUMENTS, **kwargs):
+        patcher = mock.patch.dict(os.environ, {**FAKE_BACKEND, **self.environment})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = FlatVectorStore(directory.name)
+        generator = EmbeddingGenerator()
+        texts = [text for _, text in documents]
+        store.add_documents(
+            texts, generator.generate_embeddings(texts),
+            [{'source': source, 'chunk_id': 0, 'category': 'docs'} for source, _ in documents],
+            embedding_model=generator.model_name
+        )
+        store.rebuild_lexical_index()
+
+        bot = PortfolioRAGChatbot(vector_store=store, **kwargs)
+        self.addCleanup(bot._executor.shutdown)
+        self.addCleanup(bot._deadline_executor.shutdown)
+        return bot
+
+    def serve(self, bot):
+        """Make the API views use this chatbot"""
+        patcher = mock.patch.object(views, 'chatbot', bot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def mode_requests(mode='balanced'):
+        return dict(metrics.snapshot()['modes'].get(mode, {}).get('requests', {}))
+
+
+def read_events(response):
+    """Parse a Server-Sent Events response into (event, data) tuples"""
+    body = b"".join(response.streaming_content).decode('utf-8')
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def blog_tool(query):
+    return f"Blog post about {query}", [{'source': 'blog-7', 'category': 'blog-post', 'title': query}]
+
+
+@override_settings(
+    RAG_HYBRID_SEARCH_ENABLED=True,
+    RAG_HYBRID_FETCH_MULTIPLIER=1,
+    RAG_MMR_ENABLED=False,
+    RAG_RELEVANCE_GATING_ENABLED=True,
+    RAG_RELEVANCE_MAX_DISTANCE=1.0,
+    RAG_RELEVANCE_MIN_GAP=0.1,
+)
+class RetrievalGatingTests(SimpleTestCase):
+    query = unit(1, 0, 0)
+
+    def retrieve(self, dense, lexical, k=5):
+        # Only the retrieval stage is exercised, so skip the model setup in __init__
+        bot = PortfolioRAGChatbot.__new__(PortfolioRAGChatbot)
+        bot.vector_store = StaticVectorStore(dense, lexical)
+        bot._executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(bot._executor.shutdown)
+        return bot._retrieve("How do you use AKS?", self.query, k)
+
+    def test_lexical_only_hit_survives_gating(self):
+        near = unit(1, 0.1, 0)
+        far = unit(0, 1, 0)
+        dense = {
+            'ids': ['near', 'far'],
+            'documents': ["Kubernetes overview", "Unrelated chunk"],
+            'metadatas': [{'source': 'a.md'}, {'source': 'b.md'}],
+            'distances': [squared_distance(near, self.query), squared_distance(far, self.query)],
+        }
+        # An exact-term match whose vector is far from the question
+        aks = unit(0, 0, 1)
+        lexical = {
+            'ids': ['aks'],
+            'documents': ["We run AKS with HPA"],
+            'metadatas': [{'source': 'c.md'}],
+            'embeddings': [aks],
+            'scores': [7.5],
+        }
+
+        results = self.retrieve(dense, lexical)
+
+        self.assertIn('aks', results['ids'])
+        self.assertIn('near', results['ids'])
+        self.assertNotIn('far', results['ids'])
+
+    def test_lexical_hits_are_dropped_when_no_dense_candidate_survives(self):
+        far = unit(0, 1, 0)
+        dense = {
+            'ids': ['far'],
+            'documents': ["Unrelated chunk"],
+            'metadatas': [{'source': 'b.md'}],
+            'distances': [squared_distance(far, self.query)],
+        }
+        # Matched on a common word only
+        lexical = {
+            'ids': ['common'],
+            'documents': ["What we use"],
+            'metadatas': [{'source': 'c.md'}],
+            'embeddings': [unit(0, 0, 1)],
+            'scores': [0.4],
+        }
+
+        results = self.retrieve(dense, lexical)
+
+        self.assertEqual(results['ids'], [])
+        self.assertEqual(results['documents'], [])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_follower_gets_a_copy_the_leader_cannot_mutate(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        def work():
+            release.wait()
+            return {'answer': "shared"}
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("q", work)))
+        leader.start()
+        while flight.stats()['in_flight'] == 0:
+            time.sleep(0.001)
+        follower = threading.Thread(target=lambda: results.append(flight.do("q", work)))
+        follower.start()
+        while flight.stats()['coalesced'] == 0:
+            time.sleep(0.001)
+
+        release.set()
+        leader.join()
+        leader_result, leader_shared = results[0]
+        # What query() does to its response after the call
+        leader_result['mode'] = "balanced"
+        follower.join()
+
+        follower_result, follower_shared = results[1]
+        self.assertFalse(leader_shared)
+        self.assertTrue(follower_shared)
+        self.assertEqual(follower_result, {'answer': "shared"})
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_leader_error_reaches_followers(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def work():
+            release.wait()
+            raise RuntimeError("upstream down")
+
+        def call():
+            try:
+                flight.do("q", work)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        while flight.stats()['in_flight'] == 0:
+            time.sleep(0.001)
+        follower = threading.Thread(target=call)
+        follower.start()
+        while flight.stats()['coalesced'] == 0:
+            time.sleep(0.001)
+
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(errors, ["upstream down", "upstream down"])
+
+    def test_call_without_followers_is_not_copied(self):
+        flight = SingleFlight()
+        result = {'answer': "solo"}
+        self.assertIs(flight.do("q", lambda: result)[0], result)
+
+
+class PrecomputingBot:
+    """Just enough of PortfolioRAGChatbot for SuggestedAnswers.generate"""
+
+    def __init__(self, results):
+        self.results = results
+        self.requested_k = None
+        self.vector_store = self
+
+    def version(self):
+        return "v1"
+
+    def get_suggested_questions(self):
+        return [result['question'] for result in self.results]
+
+    def query_batch(self, questions, k=None):
+        self.requested_k = k
+        return [dict(result) for result in self.results]
+
+
+@override_settings(RAG_ANSWER_MODES={
+    'balanced': {
+        'k': 8, 'tools': True, 'max_output_tokens': 800,
+        'context_token_budget': 3000, 'answer_length': "2-4 paragraphs max",
+    },
+}, RAG_DEFAULT_ANSWER_MODE='balanced')
+class SuggestedAnswersTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.answers = SuggestedAnswers(directory.name)
+
+    def test_generated_answers_are_found_with_the_default_mode_k(self):
+        bot = PrecomputingBot([{'index': 0, 'question': "What is AKS?", 'answer': "Managed Kubernetes"}])
+
+        self.answers.generate(bot)
+
+        self.assertEqual(bot.requested_k, 8)
+        self.assertEqual(self.answers.lookup("what is aks", "v1", 8)['answer'], "Managed Kubernetes")
+        self.assertTrue(self.answers.is_current("v1", 8))
+        self.assertFalse(self.answers.is_current("v1", 5))
+
+    def test_degraded_and_failed_answers_are_not_stored(self):
+        bot = PrecomputingBot([
+            {'index': 0, 'question': "Degraded?", 'answer': "Extract", 'degraded': True},
+            {'index': 1, 'question': "Failed?", 'error': "boom"},
+            {'index': 2, 'question': "Fine?", 'answer': "Generated"},
+        ])
+
+        self.assertEqual(self.answers.generate(bot), 1)
+        self.assertIsNone(self.answers.lookup("Degraded?", "v1", 8))
+        self.assertIsNone(self.answers.lookup("Failed?", "v1", 8))
+        self.assertEqual(self.answers.lookup("Fine?", "v1", 8)['answer'], "Generated")
+
+
+class CompactStorageConfigTests(SimpleTestCase):
+    def test_compaction_needs_precision_and_index_dim(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        for precision, index_dim in (('int8', None), ('float16', None), ('float32', 256)):
+            with self.subTest(precision=precision, index_dim=index_dim):
+                with self.assertRaises(ValueError):
+                    VectorStore(directory.name, precision=precision, index_dim=index_dim)
+
+        self.assertTrue(VectorStore(directory.name, precision='int8', index_dim=256).compact_storage)
+
+    @override_settings(RAG_VECTOR_PRECISION='float16', RAG_VECTOR_INDEX_DIM=4, RAG_RESCORE_FACTOR=2)
+    def test_defaults_come_from_settings(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        store = VectorStore(directory.name)
+
+        self.assertEqual((store.precision, store.index_dim, store.rescore_factor), ('float16', 4, 2))
+
+    def test_compact_storage_refuses_a_filled_plain_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        metadata = [{'source': 'a.md', 'chunk_id': 0}]
+        VectorStore(directory.name, precision='float32', index_dim=None).add_documents(
+            ["alpha"], [unit(1, 2, 3, 4, 5, 6)], metadata
+        )
+
+        compact = VectorStore(directory.name, precision='int8', index_dim=4)
+        with self.assertRaises(CompactStorageMismatch):
+            compact.add_documents(["beta"], [unit(6, 5, 4, 3, 2, 1)], [{'source': 'b.md', 'chunk_id': 0}])
+
+        self.assertEqual(compact.count(), 1)
+        self.assertIsNone(compact._compact_vectors())
+        # After a rebuild the layout can change
+        compact.clear()
+        compact.add_documents(["beta"], [unit(6, 5, 4, 3, 2, 1)], [{'source': 'b.md', 'chunk_id': 0}])
+        self.assertIsNotNone(compact._compact_vectors())
+
+
+class ChunkIdTests(SimpleTestCase):
+    def test_stable_for_the_same_chunk(self):
+        metadata = {'source': 'docs/a.md', 'chunk_id': 0}
+        self.assertEqual(chunk_id("text", metadata), chunk_id("text", dict(metadata)))
+
+    def test_changes_with_content_position_and_source(self):
+        base = chunk_id("text", {'source': 'docs/a.md', 'chunk_id': 0})
+        self.assertNotEqual(base, chunk_id("edited", {'source': 'docs/a.md', 'chunk_id': 0}))
+        self.assertNotEqual(base, chunk_id("text", {'source': 'docs/a.md', 'chunk_id': 1}))
+        self.assertNotEqual(base, chunk_id("text", {'source': 'docs/b.md', 'chunk_id': 0}))
+
+
+class VectorStoreSourceTests:
+    """Incremental ingest behaviour shared by both backends (mixed into a TestCase)"""
+
+    def open_store(self, directory):
+        raise NotImplementedError
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = self.open_store(directory.name)
+        self.rng = np.random.default_rng(0)
+
+    def add(self, chunks, **kwargs):
+        """Add (source, position, text) chunks"""
+        self.store.add_documents(
+            documents=[text for _, _, text in chunks],
+            embeddings=self.rng.standard_normal((len(chunks), 8)).tolist(),
+            metadatas=[{'source': source, 'chunk_id': position} for source, position, _ in chunks],
+            embedding_model="test-model",
+            **kwargs
+        )
+
+    def documents(self):
+        _, documents = self.store._all_documents()
+        return sorted(documents)
+
+    def test_re_adding_the_same_chunks_is_idempotent(self):
+        chunks = [('a.md', 0, "alpha"), ('a.md', 1, "beta"), ('b.md', 0, "gamma")]
+        self.add(chunks)
+        self.add(chunks)
+
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self.documents(), ["alpha", "beta", "gamma"])
+
+    def test_repeated_chunk_within_a_batch_is_stored_once(self):
+        self.add([('a.md', 0, "alpha"), ('a.md', 0, "alpha")])
+        self.assertEqual(self.store.count(), 1)
+
+    def test_edited_chunk_replaces_the_stale_one(self):
+        self.add([('a.md', 0, "alpha"), ('a.md', 1, "beta"), ('b.md', 0, "gamma")])
+        self.add([('a.md', 0, "alpha v2")], replace_sources=True)
+
+        # Stale chunks of a.md are gone, other sources are untouched
+        self.assertEqual(self.documents(), ["alpha v2", "gamma"])
+
+    def test_without_replace_sources_old_chunks_stay(self):
+        self.add([('a.md', 0, "alpha")])
+        self.add([('a.md', 0, "alpha v2")])
+        self.assertEqual(self.documents(), ["alpha", "alpha v2"])
+
+    def test_delete_source(self):
+        self.add([('a.md', 0, "alpha"), ('a.md', 1, "beta"), ('b.md', 0, "gamma")])
+        version = self.store.version()
+
+        self.assertEqual(self.store.delete_source('a.md'), 2)
+        self.assertEqual(self.documents(), ["gamma"])
+        self.assertEqual(self.store.sources(), {'b.md'})
+        self.assertNotEqual(self.store.version(), version)
+        self.assertEqual(self.store.delete_source('missing.md'), 0)
+
+    def test_removed_sources_are_deleted(self):
+        self.add([('a.md', 0, "alpha"), ('b.md', 0, "beta"), ('blog-1', 0, "post")])
+
+        removed = self.store.remove_missing_sources({'a.md'}, keep_prefixes=('blog-',))
+
+        self.assertEqual(removed, ['b.md'])
+        self.assertEqual(self.store.sources(), {'a.md', 'blog-1'})
+
+    def test_search_finds_updated_chunks(self):
+        self.add([('a.md', 0, "alpha")])
+        embedding = unit(1, 2, 3, 4, 5, 6, 7, 8)
+        self.store.add_documents(
+            ["alpha v2"], [embedding], [{'source': 'a.md', 'chunk_id': 0}],
+            embedding_model="test-model", replace_sources=True
+        )
+
+        results = self.store.search(embedding, k=5)
+        self.assertEqual(results['documents'], ["alpha v2"])
+        self.assertAlmostEqual(results['distances'][0], 0.0, places=4)
+
+
+class FlatVectorStoreSourceTests(VectorStoreSourceTests, SimpleTestCase):
+    def open_store(self, directory):
+        return FlatVectorStore(directory)
+
+
+class ChromaVectorStoreSourceTests(VectorStoreSourceTests, SimpleTestCase):
+    def open_store(self, directory):
+        return VectorStore(directory, precision='float32', index_dim=None)
+
+
+class CompactChromaVectorStoreSourceTests(VectorStoreSourceTests, SimpleTestCase):
+    def open_store(self, directory):
+        return VectorStore(directory, precision='int8', index_dim=4)
+
+    def test_deletes_prune_the_rescoring_copy(self):
+        self.add([('a.md', 0, "alpha"), ('b.md', 0, "beta")])
+        self.store.delete_source('a.md')
+        self.assertEqual(len(self.store._compact_vectors()), 1)
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def test_paraphrase_hits_only_with_the_same_retrieval_settings(self):
+        cache = SemanticAnswerCache(threshold=0.9)
+        cache.store(unit(1, 0, 0), "v1", 5, {'answer': "cached"}, mode='balanced')
+
+        self.assertEqual(cache.lookup(unit(1, 0.1, 0), "v1", 5, 'balanced')['answer'], "cached")
+        self.assertIsNone(cache.lookup(unit(0, 1, 0), "v1", 5, 'balanced'))
+        self.assertIsNone(cache.lookup(unit(1, 0, 0), "v1", 3, 'balanced'))
+        self.assertIsNone(cache.lookup(unit(1, 0, 0), "v1", 5, 'fast'))
+        self.assertIsNone(cache.lookup(unit(1, 0, 0), "v1", 5, 'balanced', diversity=0.3))
+
+    def test_expired_answers_miss(self):
+        cache = SemanticAnswerCache(ttl_seconds=0)
+        cache.store(unit(1, 0), "v1", 5, {'answer': "stale"})
+        self.assertIsNone(cache.lookup(unit(1, 0), "v1", 5))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_least_recently_used_answer_is_evicted(self):
+        cache = SemanticAnswerCache(max_entries=2)
+        cache.store(unit(1, 0, 0), "v1", 5, {'answer': "a"})
+        cache.store(unit(0, 1, 0), "v1", 5, {'answer': "b"})
+        cache.lookup(unit(1, 0, 0), "v1", 5)
+        cache.store(unit(0, 0, 1), "v1", 5, {'answer': "c"})
+
+        self.assertIsNone(cache.lookup(unit(0, 1, 0), "v1", 5))
+        self.assertEqual(cache.lookup(unit(1, 0, 0), "v1", 5)['answer'], "a")
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_reingest_invalidates_and_late_answers_are_dropped(self):
+        cache = SemanticAnswerCache()
+        cache.store(unit(1, 0), "v1", 5, {'answer': "old index"})
+
+        self.assertIsNone(cache.lookup(unit(1, 0), "v2", 5))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+        # Generated against v1 but finished after the re-ingest
+        cache.store(unit(1, 0), "v1", 5, {'answer': "late"})
+        self.assertIsNone(cache.lookup(unit(1, 0), "v2", 5))
+
+    def test_cached_response_is_a_copy(self):
+        cache = SemanticAnswerCache()
+        cache.store(unit(1, 0), "v1", 5, {'answer': "cached", 'sources': []})
+        cache.lookup(unit(1, 0), "v1", 5)['sources'].append("mutated")
+        self.assertEqual(cache.lookup(unit(1, 0), "v1", 5)['sources'], [])
+
+
+@override_settings(RAG_SINGLE_FLIGHT_ENABLED=False)
+class ChatbotAnswerCacheTests(FakeChatbotTestCase):
+    def test_repeated_question_is_served_from_the_cache(self):
+        bot = self.make_chatbot()
+
+        first = bot.query(ON_TOPIC_QUESTION)
+        second = bot.query(ON_TOPIC_QUESTION)
+
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['answer'], first['answer'])
+
+    def test_explicit_diversity_does_not_reuse_the_default_answer(self):
+        bot = self.make_chatbot()
+        bot.query(ON_TOPIC_QUESTION)
+
+        self.assertFalse(bot.query(ON_TOPIC_QUESTION, diversity=0.9)['cached'])
+        self.assertTrue(bot.query(ON_TOPIC_QUESTION, diversity=0.9)['cached'])
+
+
+@override_settings(RAG_THROTTLE_ENABLED=False, RAG_SINGLE_FLIGHT_ENABLED=False)
+class StreamingTests(FakeChatbotTestCase):
+    environment = {'RAG_FAKE_FUNCTION_CALL_RATE': '1'}
+
+    def test_tool_round_trip_is_streamed(self):
+        bot = self.make_chatbot()
+        bot.tool_runner.tools['search_blogs'] = blog_tool
+        self.serve(bot)
+        before = self.mode_requests().get('generated', 0)
+
+        response = self.client.post(
+            '/api/chatbot/query/stream/', {'question': ON_TOPIC_QUESTION, 'include_timings': True},
+            content_type='application/json'
+        )
+        events = read_events(response)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        names = [event for event, _ in events]
+        self.assertEqual(names[0], 'sources')
+        self.assertEqual(names[-2:], ['sources', 'metadata'])
+        self.assertEqual(set(names[1:-2]), {'token'})
+
+        answer = "".join(data['text'] for event, data in events if event == 'token')
+        self.assertTrue(answer.startswith("Based on the related blog posts"))
+        self.assertEqual(events[-2][1]['sources'][0]['source'], 'blog-7')
+
+        metadata = events[-1][1]
+        self.assertEqual(metadata['mode'], 'balanced')
+        self.assertFalse(metadata['cached'])
+        self.assertIn('gemini_first_token', metadata['timings']['stages_ms'])
+        self.assertIn('tools', metadata['timings']['stages_ms'])
+        self.assertEqual(self.mode_requests()['generated'], before + 1)
+
+    @override_settings(RAG_DEGRADED_RESERVE=0.05)
+    def test_stalled_stream_falls_back_to_an_extractive_answer(self):
+        self.environment = {'RAG_FAKE_GENERATION_LATENCY': 'constant:1000'}
+        bot = self.make_chatbot()
+
+        events = list(bot.stream_query(ON_TOPIC_QUESTION, deadline=Deadline(0.2)))
+
+        tokens = [data['text'] for event, data in events if event == 'token']
+        self.assertEqual(len(tokens), 1)
+        self.assertIn("Kubernetes clusters", tokens[0])
+        self.assertTrue(events[-1][1]['degraded'])
+        # A fallback answer is never cached
+        self.assertEqual(bot.answer_cache.stats()['entries'], 0)
+
+    def test_cached_answer_is_streamed_whole(self):
+        self.environment = {'RAG_FAKE_FUNCTION_CALL_RATE': '0'}
+        bot = self.make_chatbot()
+        answer = "".join(data['text'] for event, data in bot.stream_query(ON_TOPIC_QUESTION) if event == 'token')
+
+        events = list(bot.stream_query(ON_TOPIC_QUESTION))
+
+        self.assertEqual([event for event, _ in events], ['sources', 'token', 'metadata'])
+        self.assertEqual(events[1][1]['text'], answer)
+        self.assertTrue(events[2][1]['cached'])
+
+
+@override_settings(RAG_THROTTLE_ENABLED=False, RAG_SINGLE_FLIGHT_ENABLED=False)
+class AsyncPipelineTests(FakeChatbotTestCase):
+    environment = {'RAG_FAKE_FUNCTION_CALL_RATE': '1'}
+
+    def test_prefetched_blog_search_answers_the_tool_call(self):
+        bot = self.make_chatbot()
+        searches = []
+
+        def search(query):
+            searches.append(query)
+            return blog_tool(query)
+
+        bot.tool_runner.tools['search_blogs'] = search
+        bot._search_blogs = search
+
+        response = asyncio.run(bot.aquery(ON_TOPIC_QUESTION))
+
+        # Started alongside retrieval, then reused for the model's search_blogs call
+        self.assertEqual(searches, ["kubernetes"])
+        self.assertTrue(response['answer'].startswith("Based on the related blog posts"))
+        self.assertIn('blog-7', [source['source'] for source in response['sources']])
+        self.assertEqual(response['mode'], 'balanced')
+        self.assertFalse(response['cached'])
+
+    async def test_async_view_answers_like_the_sync_view(self):
+        bot = self.make_chatbot()
+        bot.tool_runner.tools['search_blogs'] = blog_tool
+        bot._search_blogs = blog_tool
+        self.serve(bot)
+
+        response = await self.async_client.post(
+            '/api/chatbot/query/async/', {'question': ON_TOPIC_QUESTION, 'mode': 'fast', 'include_timings': True},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['mode'], 'fast')
+        self.assertIn('embedding', body['timings']['stages_ms'])
+        self.assertIn('Server-Timing', response)
+
+    async def test_async_view_rejects_invalid_input(self):
+        response = await self.async_client.post(
+            '/api/chatbot/query/async/', {'question': ""}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.sqlite3")
+
+    def test_vectors_persist_per_model(self):
+        EmbeddingCache(self.path).put_many("model-a", ["alpha", "beta"], [[1.0, 0.0], [0.0, 1.0]])
+
+        cache = EmbeddingCache(self.path)
+        self.assertEqual(cache.get_many("model-a", ["beta", "gamma", "alpha"]), [[0.0, 1.0], None, [1.0, 0.0]])
+        self.assertIsNone(cache.get("model-b", "alpha"))
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_memory_lru_is_bounded(self):
+        cache = EmbeddingCache(self.path, max_memory_entries=1)
+        cache.put("model", "alpha", [1.0])
+        cache.put("model", "beta", [2.0])
+
+        self.assertEqual(cache.stats()['memory_entries'], 1)
+        # Evicted from memory, still on disk
+        self.assertEqual(cache.get("model", "alpha"), [1.0])
+
+
+class CountingEmbeddingModel:
+    def __init__(self):
+        self.texts = []
+
+    def get_embeddings(self, texts):
+        self.texts.extend(texts)
+        return [mock.Mock(values=[float(len(text)), 1.0]) for text in texts]
+
+    async def get_embeddings_async(self, texts):
+        return self.get_embeddings(texts)
+
+
+class EmbeddingGeneratorCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.dict(os.environ, FAKE_BACKEND)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.generator = EmbeddingGenerator(cache=EmbeddingCache(os.path.join(directory.name, "cache.sqlite3")))
+        self.generator.model = self.model = CountingEmbeddingModel()
+
+    def test_only_uncached_texts_reach_the_model(self):
+        self.generator.generate_embedding("alpha")
+
+        embeddings = self.generator.generate_embeddings(["alpha", "beta", "beta"])
+
+        self.assertEqual(self.model.texts, ["alpha", "beta"])
+        self.assertEqual(embeddings, [[5.0, 1.0], [4.0, 1.0], [4.0, 1.0]])
+
+    def test_async_embedding_uses_the_cache(self):
+        self.generator.generate_embeddings(["alpha"])
+
+        self.assertEqual(asyncio.run(self.generator.agenerate_embedding("alpha")), [5.0, 1.0])
+        asyncio.run(self.generator.agenerate_embedding("gamma"))
+        self.assertEqual(self.generator.generate_embedding("gamma"), [5.0, 1.0])
+        self.assertEqual(self.model.texts, ["alpha", "gamma"])
+
+
+class BlogSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for slug, title, published, tags in (
+            ('aks', "Running AKS with Helm", datetime.date(2025, 3, 1), ["kubernetes", "azure"]),
+            ('gke', "GKE autopilot notes", datetime.date(2025, 5, 1), ["kubernetes", "gcp"]),
+            ('tf', "Terraform state on GCS", datetime.date(2025, 4, 1), ["terraform"]),
+        ):
+            Paper.objects.create(
+                title=title, abstract=f"{title}. " + "details " * 200, source_id=slug,
+                published_date=published, category='mlops', tags=tags,
+            )
+
+    def test_every_term_must_match_and_newest_come_first(self):
+        results = search_blog_posts("Kubernetes", limit=3)
+        self.assertEqual([post['title'] for post in results], ["GKE autopilot notes", "Running AKS with Helm"])
+
+        results = search_blog_posts("kubernetes, helm")
+        self.assertEqual([post['title'] for post in results], ["Running AKS with Helm"])
+        self.assertEqual(search_blog_posts("   "), [])
+
+    def test_limit_and_excerpt_are_applied_in_the_query(self):
+        results = search_blog_posts("details", limit=2, excerpt_chars=40)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(results[0]['excerpt']), 40)
+        self.assertNotIn('abstract', results[0])
+
+    def test_chatbot_tool_formats_posts_as_context_and_sources(self):
+        bot = PortfolioRAGChatbot.__new__(PortfolioRAGChatbot)
+
+        context, sources = bot._search_blogs("terraform")
+
+        self.assertIn("Blog Post: Terraform state on GCS", context)
+        self.assertIn("Tags: terraform", context)
+        self.assertEqual(sources[0]['source'], f"blog-{Paper.objects.get(source_id='tf').id}")
+        self.assertEqual(sources[0]['category'], 'blog-post')
+
+
+class FusionTests(SimpleTestCase):
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd']], rrf_k=60)
+        self.assertEqual([item for item, _ in fused][:2], ['b', 'a'])
+
+    def test_lexical_only_hits_get_a_dense_distance(self):
+        query = unit(1, 0)
+        dense = {
+            'ids': ['a'], 'documents': ["A"], 'metadatas': [{}], 'distances': [0.1],
+        }
+        lexical = {
+            'ids': ['b', 'a'], 'documents': ["B", "A"], 'metadatas': [{}, {}],
+            'embeddings': [unit(0, 1), unit(1, 0)], 'scores': [3.0, 1.0],
+        }
+
+        fused = fuse_search_results(dense, lexical, query, k=5)
+
+        self.assertEqual(sorted(fused['ids']), ['a', 'b'])
+        distances = dict(zip(fused['ids'], fused['distances']))
+        self.assertEqual(distances['a'], 0.1)
+        self.assertAlmostEqual(distances['b'], 2.0, places=5)
+
+
+class BM25Tests(SimpleTestCase):
+    def test_exact_terms_rank_first_and_survive_save(self):
+        index = BM25Index.build(
+            ['k8s', 'aks', 'tf'],
+            ["Kubernetes cluster autoscaling", "We run AKS with HPA on Azure", "Terraform modules for GCP"],
+        )
+        self.assertEqual(index.search("AKS HPA", k=1)[0][0], 'aks')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        index.save(directory.name)
+        self.assertEqual(BM25Index.load(directory.name).search("terraform", k=1)[0][0], 'tf')
+
+
+class ContextPackerTests(SimpleTestCase):
+    def test_duplicates_dropped_and_neighbours_stitched(self):
+        results = {
+            'documents': ["one two three four", "three four five six", "one two three four"],
+            'metadatas': [
+                {'source': 'a.md', 'chunk_id': 0}, {'source': 'a.md', 'chunk_id': 1}, {'source': 'a.md', 'chunk_id': 0},
+            ],
+        }
+        context, stats = ContextPacker(token_budget=1000).pack(results)
+
+        self.assertEqual(stats['duplicates_removed'], 1)
+        self.assertEqual(stats['chunks_merged'], 1)
+        self.assertIn("one two three four five six", context)
+
+    def test_budget_trims_the_best_passage(self):
+        results = {'documents': ["word " * 400], 'metadatas': [{'source': 'a.md', 'chunk_id': 0}]}
+        _, stats = ContextPacker(token_budget=50).pack(results)
+        self.assertLessEqual(stats['tokens'], 50)
+
+
+class RerankingTests(SimpleTestCase):
+    def test_mmr_skips_near_duplicates(self):
+        query = unit(1, 0, 0)
+        embeddings = [unit(1, 0.05, 0), unit(1, 0.06, 0), unit(1, 0, 0.5)]
+        self.assertEqual(maximal_marginal_relevance(query, embeddings, k=2, lambda_mult=0.5), [0, 2])
+
+    def test_pure_relevance_keeps_the_nearest(self):
+        query = unit(1, 0, 0)
+        embeddings = [unit(1, 0.05, 0), unit(1, 0.06, 0), unit(1, 0, 0.5)]
+        self.assertEqual(maximal_marginal_relevance(query, embeddings, k=2, lambda_mult=1.0), [0, 1])
+
+    def test_reranked_results_stay_aligned(self):
+        results = {
+            'ids': ['a', 'b', 'c'], 'documents': ["A", "B", "C"], 'metadatas': [{'n': 0}, {'n': 1}, {'n': 2}],
+            'distances': [0.1, 0.2, 0.3], 'embeddings': [unit(1, 0.05, 0), unit(1, 0.06, 0), unit(1, 0, 0.5)],
+        }
+        reranked = rerank_search_results(results, unit(1, 0, 0), k=2, lambda_mult=0.5)
+        self.assertEqual(reranked, {
+            'ids': ['a', 'c'], 'documents': ["A", "C"], 'metadatas': [{'n': 0}, {'n': 2}], 'distances': [0.1, 0.3],
+        })
+
+
+class WarmupTests(FakeChatbotTestCase):
+    def setUp(self):
+        self.addCleanup(warmup._state.update, status='disabled', timings={}, error=None)
+
+    def test_warm_up_builds_the_chatbot_and_loads_the_indexes(self):
+        self.serve(self.make_chatbot())
+
+        warmup.warm_up()
+
+        status = warmup.warmup_status()
+        self.assertEqual(status['status'], 'ready')
+        for step in ('chatbot_init', 'index_load', 'dummy_embedding', 'dummy_retrieval', 'total'):
+            self.assertIn(step, status['timings'])
+        self.assertEqual(self.client.get('/api/chatbot/ready/').status_code, 200)
+
+    def test_failed_warm_up_is_not_ready(self):
+        with mock.patch.object(views, 'get_chatbot', side_effect=RuntimeError("no credentials")):
+            warmup.warm_up()
+
+        status = warmup.warmup_status()
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], "no credentials")
+
+        with mock.patch.object(views, 'start_warmup') as start:
+            response = self.client.get('/api/chatbot/ready/')
+        self.assertEqual(response.status_code, 503)
+        start.assert_called_once()
+
+
+class FakeBackendTests(SimpleTestCase):
+    def test_backend_is_validated(self):
+        with mock.patch.dict(os.environ, {'RAG_MODEL_BACKEND': 'FAKE'}):
+            self.assertEqual(get_backend_name(), 'fake')
+        with mock.patch.dict(os.environ, {'RAG_MODEL_BACKEND': 'openai'}):
+            with self.assertRaises(ValueError):
+                get_backend_name()
+
+    def test_embeddings_are_deterministic_and_word_overlap_is_similar(self):
+        model = FakeEmbeddingModel(dimension=64)
+        kubernetes, again, helm, terraform = (
+            np.asarray(embedding.values) for embedding in model.get_embeddings(
+                ["Kubernetes clusters", "Kubernetes clusters", "Kubernetes with Helm", "Terraform state"]
+            )
+        )
+        np.testing.assert_array_equal(kubernetes, again)
+        self.assertAlmostEqual(float(np.linalg.norm(kubernetes)), 1.0, places=5)
+        self.assertGreater(kubernetes @ helm, kubernetes @ terraform)
+
+    def test_latency_specs(self):
+        self.assertEqual(LatencyDistribution.parse("constant:250").sample(), 0.25)
+        self.assertTrue(0.1 <= LatencyDistribution.parse("uniform:100:200").sample() <= 0.2)
+        for spec in ("constant", "uniform:1", "gamma:1:2"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                LatencyDistribution.parse(spec)
+
+    def test_chat_calls_the_tool_then_answers_in_chunks(self):
+        chat = FakeGenerativeModel(function_call_rate=1.0, answer_tokens=20).start_chat()
+
+        call = chat.send_message("Context\n\nQuestion: How is Kubernetes deployed?\n")
+        function_call = call.candidates[0].content.parts[0].function_call
+        self.assertEqual((function_call.name, function_call.args), ("search_blogs", {'query': "kubernetes"}))
+
+        chunks = list(chat.send_message(["function response"], stream=True))
+        self.assertEqual(len(chunks), 3)
+        text = "".join(chunk.candidates[0].content.parts[0].text for chunk in chunks)
+        self.assertTrue(text.startswith("Based on the related blog posts about 'How is Kubernetes deployed?'"))
+        self.assertEqual(len(text.split()), 20)
+        self.assertEqual(chunks[0].usage_metadata.candidates_token_count, 8)
+
+
+@override_settings(RAG_THROTTLE_ENABLED=False)
+class BatchTests(FakeChatbotTestCase):
+    def post_batch(self, questions, **kwargs):
+        response = self.client.post(
+            '/api/chatbot/query/batch/', {'questions': questions, **kwargs},
+            content_type='application/json'
+        )
+        body = b"".join(response.streaming_content).decode('utf-8')
+        return response, [json.loads(line) for line in body.splitlines()]
+
+    def test_answers_are_streamed_as_ndjson(self):
+        self.serve(self.make_chatbot())
+        questions = [ON_TOPIC_QUESTION, "How did Vasu learn Docker?"]
+
+        response, lines = self.post_batch(questions, max_concurrency=2)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(sorted(line['index'] for line in lines), [0, 1])
+        for line in lines:
+            self.assertEqual(line['question'], questions[line['index']])
+            self.assertEqual(line['mode'], 'balanced')
+            self.assertTrue(line['answer'])
+            self.assertIn('sources', line)
+
+    @override_settings(RAG_ADMISSION_ENABLED=True)
+    def test_generations_take_admission_slots(self):
+        self.environment = {'RAG_FAKE_GENERATION_LATENCY': 'constant:20'}
+        bot = self.make_chatbot()
+        self.serve(bot)
+        controller = AdmissionController(max_in_flight=2, queue_size=1, queue_timeout=1)
+        patcher = mock.patch.object(views, 'admission', controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        answer = bot._answer_from_results
+        lock = threading.Lock()
+        running, peak = [0], [0]
+
+        def counting_answer(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                return answer(*args, **kwargs)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        with mock.patch.object(bot, '_answer_from_results', counting_answer):
+            _, lines = self.post_batch([f"{ON_TOPIC_QUESTION} ({i})" for i in range(6)], max_concurrency=4)
+
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(peak[0], 2)
+        stats = controller.stats()
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['admitted'], 1)
+        self.assertGreater(stats['admitted_background'], 0)
+
+    def test_background_slots_wait_for_queued_requests(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=1, queue_timeout=1)
+        controller.acquire()
+        order = []
+
+        def background():
+            controller.acquire_background()
+            order.append('background')
+            controller.release()
+
+        def request():
+            controller.acquire()
+            order.append('request')
+            controller.release()
+
+        worker = threading.Thread(target=background)
+        worker.start()
+        time.sleep(0.01)
+        queued = threading.Thread(target=request)
+        queued.start()
+        time.sleep(0.01)
+        controller.release()
+        worker.join(1)
+        queued.join(1)
+
+        self.assertEqual(order, ['request', 'background'])
+
+    @override_settings(RAG_THROTTLE_ENABLED=True, RAG_THROTTLE_BURST=5)
+    def test_batch_spends_a_token_per_question(self):
+        self.serve(self.make_chatbot())
+        client = {'REMOTE_ADDR': '10.0.11.1'}
+        questions = [ON_TOPIC_QUESTION] * 3
+
+        first = self.client.post(
+            '/api/chatbot/query/batch/', {'questions': questions},
+            content_type='application/json', **client
+        )
+        second = self.client.post(
+            '/api/chatbot/query/batch/', {'questions': questions},
+            content_type='application/json', **client
+        )
+
+        self.assertEqual(first.status_code, 200)
+        b"".join(first.streaming_content)
+        self.assertEqual(second.status_code, 429)
+
+
+class RequestTimingsTests(SimpleTestCase):
+    def test_reports_after_the_request_finished_are_dropped(self):
+        timings = RequestTimings()
+        timings.add('retrieval', 5)
+        timings.add_tokens('generation', 10, 20)
+
+        metrics.observe_request(timings, 'degraded', 'timings-test')
+        final = timings.as_dict()
+        # An abandoned deadline thread reporting late
+        timings.add('gemini_generate', 900)
+        timings.add_tokens('generation', 10, 20)
+
+        self.assertEqual(timings.as_dict(), final)
+        self.assertEqual(final['stages_ms'], {'retrieval': 5.0})
+        self.assertEqual(final['tokens'], {'generation': {'input': 10, 'output': 20}})
+
+    def test_reads_are_safe_while_threads_record(self):
+        timings = RequestTimings()
+        stop = threading.Event()
+
+        def record():
+            i = 0
+            while not stop.is_set():
+                timings.add(f"stage_{i % 500}", 1)
+                i += 1
+
+        worker = threading.Thread(target=record)
+        worker.start()
+        try:
+            for _ in range(200):
+                timings.server_timing()
+                timings.as_dict()
+        finally:
+            stop.set()
+            worker.join()
+
+
+class AdmissionTests(SimpleTestCase):
+    def test_rejects_when_slots_and_queue_are_taken(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=0, queue_timeout=0.01)
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire()
+
+        controller.release()
+        with controller.slot():
+            self.assertEqual(controller.stats()['in_flight'], 1)
+        self.assertEqual(controller.stats()['rejected_queue_full'], 1)
+
+    def test_queue_times_out(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=1, queue_timeout=0.01)
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.acquire()
+        self.assertEqual(rejected.exception.reason, "queue timeout")
+
+    @override_settings(RAG_THROTTLE_ENABLED=True, RAG_THROTTLE_RATE=6, RAG_THROTTLE_BURST=2)
+    def test_client_past_its_burst_is_throttled(self):
+        client = {'REMOTE_ADDR': '10.0.15.1'}
+        bad_request = {'question': ''}
+
+        for _ in range(2):
+            response = self.client.post('/api/chatbot/query/', bad_request, content_type='application/json', **client)
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/chatbot/query/', bad_request, content_type='application/json', **client)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertLessEqual(int(response['Retry-After']), 10)
+        other = self.client.post('/api/chatbot/query/', bad_request, content_type='application/json', REMOTE_ADDR='10.0.15.2')
+        self.assertEqual(other.status_code, 400)
+
+
+class ToolRunnerTests(SimpleTestCase):
+    def make_runner(self, tool):
+        runner = ToolRunner({'search_blogs': tool}, cache=ToolResultCache(ttl_seconds=300))
+        self.addCleanup(runner._executor.shutdown)
+        return runner
+
+    def test_results_are_cached_per_normalized_call(self):
+        calls = []
+
+        def tool(query):
+            calls.append(query)
+            return blog_tool(query)
+
+        runner = self.make_runner(tool)
+        deadline = time.monotonic() + 1
+
+        first = runner.run([('search_blogs', {'query': 'Helm'})], deadline)
+        second = runner.run([('search_blogs', {'query': ' helm '})], deadline)
+
+        self.assertEqual(first, second)
+        self.assertEqual(calls, ['Helm'])
+        self.assertEqual(runner.cache.stats()['hits'], 1)
+
+    def test_failed_blog_search_is_not_cached(self):
+        bot = PortfolioRAGChatbot.__new__(PortfolioRAGChatbot)
+        runner = self.make_runner(bot._search_blogs)
+        call = [('search_blogs', {'query': 'helm'})]
+
+        with mock.patch('rag_service.chatbot.search_blog_posts', side_effect=RuntimeError("connection reset")):
+            (_, content, sources), = runner.run(call, time.monotonic() + 1)
+        self.assertEqual(content, "The tool failed: connection reset")
+        self.assertEqual(sources, [])
+        self.assertEqual(runner.cache.stats()['entries'], 0)
+
+        posts = [{
+            'id': 7, 'title': 'Helm', 'authors': 'Vasu', 'published_date': '2024-01-01',
+            'tags': ['helm'], 'excerpt': 'Charts',
+        }]
+        with mock.patch('rag_service.chatbot.search_blog_posts', return_value=posts):
+            (_, content, sources), = runner.run(call, time.monotonic() + 1)
+        self.assertIn("Blog Post: Helm", content)
+        self.assertEqual(sources[0]['source'], 'blog-7')
+
+
+class RelevanceTests(SimpleTestCase):
+    def test_cutoff_at_the_largest_gap(self):
+        self.assertEqual(relevance_cutoff([0.2, 0.25, 0.7, 0.75], max_distance=1.0), 0.25)
+
+    def test_nothing_within_max_distance(self):
+        self.assertIsNone(relevance_cutoff([1.2, 1.5], max_distance=1.0))
+
+    def test_gate_keeps_original_order(self):
+        results = {
+            'ids': ['b', 'a', 'c'], 'documents': ["B", "A", "C"],
+            'metadatas': [{}, {}, {}], 'distances': [0.25, 0.2, 0.9],
+        }
+        gated = gate_search_results(results, max_distance=1.0)
+        self.assertEqual(gated['ids'], ['b', 'a'])
+
+
+@override_settings(RAG_HYBRID_SEARCH_ENABLED=True, RAG_RELEVANCE_GATING_ENABLED=True, RAG_RELEVANCE_MAX_DISTANCE=1.0)
+class OffTopicTests(FakeChatbotTestCase):
+    def test_off_topic_question_never_reaches_the_model(self):
+        bot = self.make_chatbot()
+        bot.model = mock.Mock(wraps=bot.model)
+        bot.plain_model = mock.Mock(wraps=bot.plain_model)
+
+        response = bot.query(OFF_TOPIC_QUESTION)
+
+        self.assertEqual(response['answer'], NO_CONTEXT_ANSWER)
+        self.assertEqual(response['context_used'], 0)
+        self.assertEqual(bot.model.mock_calls, [])
+        self.assertEqual(bot.plain_model.mock_calls, [])
+
+    def test_on_topic_question_is_still_answered(self):
+        bot = self.make_chatbot()
+
+        response = bot.query(ON_TOPIC_QUESTION)
+
+        self.assertNotEqual(response['answer'], NO_CONTEXT_ANSWER)
+        self.assertEqual(response['sources'][0]['source'], 'docs/kubernetes.md')
+
+
+@override_settings(RAG_DEGRADED_RESERVE=0.05, RAG_SINGLE_FLIGHT_ENABLED=False)
+class DeadlineTests(FakeChatbotTestCase):
+    def test_run_gives_up_at_the_deadline(self):
+        deadline = Deadline(0.1)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertEqual(deadline.run(executor, lambda: "fast"), "fast")
+            with self.assertRaises(DeadlineExceeded):
+                deadline.run(executor, time.sleep, 0.5, reserve=0.05)
+
+    def test_slow_generation_falls_back_to_an_extractive_answer(self):
+        self.environment = {'RAG_FAKE_GENERATION_LATENCY': 'constant:1000'}
+        bot = self.make_chatbot()
+
+        response = bot.query(ON_TOPIC_QUESTION, deadline=Deadline(0.2))
+
+        self.assertTrue(response['degraded'])
+        self.assertIn("Kubernetes clusters", response['answer'])
+        self.assertEqual(response['sources'][0]['source'], 'docs/kubernetes.md')
+        self.assertEqual(bot.answer_cache.stats()['entries'], 0)
+
+    def test_slow_embedding_falls_back_to_a_lexical_search(self):
+        self.environment = {'RAG_FAKE_EMBEDDING_LATENCY': 'constant:500'}
+        bot = self.make_chatbot()
+
+        response = bot.query("How did Vasu learn Docker?", deadline=Deadline(0.2))
+
+        self.assertTrue(response['degraded'])
+        self.assertIn("containerizing the Django backend", response['answer'])
+
+
+class ResilienceTests(SimpleTestCase):
+    def test_breaker_opens_and_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+        breaker.record_failure()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.02)
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_idempotent_calls_are_retried(self):
+        caller = ResilientCaller('test', timeout=1.0, retries=2, backoff=0.001)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("reset")
+            return "ok"
+
+        self.assertEqual(caller.call(flaky, idempotent=True), "ok")
+        self.assertEqual(len(attempts), 3)
+
+    def test_open_circuit_fails_without_calling(self):
+        caller = ResilientCaller('test', retries=2, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        caller.breaker.record_failure()
+        calls = []
+
+        with self.assertRaises(CircuitOpenError):
+            caller.call(lambda: calls.append(1), idempotent=True)
+        self.assertEqual(calls, [])
+
+    def test_guarded_stream_records_its_outcome_while_consumed(self):
+        caller = ResilientCaller('test', breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+        def broken_stream():
+            yield "first"
+            raise ConnectionError("stream reset")
+
+        stream = caller.guard(broken_stream)
+        # Nothing has been received yet
+        self.assertEqual(caller.breaker.stats()['consecutive_failures'], 0)
+        self.assertEqual(next(stream), "first")
+        with self.assertRaises(ConnectionError):
+            next(stream)
+
+        self.assertEqual(caller.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(caller.stats()['failures'], 1)
+        with self.assertRaises(CircuitOpenError):
+            caller.guard(broken_stream)
+
+    def test_stream_closed_early_frees_the_half_open_trial(self):
+        caller = ResilientCaller('test', breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+        caller.breaker.record_failure()
+
+        caller.guard(lambda: iter(["chunk"])).close()
+
+        self.assertEqual(list(caller.guard(lambda: iter(["chunk"]))), ["chunk"])
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+
+@override_settings(RAG_THROTTLE_ENABLED=False, RAG_SINGLE_FLIGHT_ENABLED=False)
+class AnswerModeTests(FakeChatbotTestCase):
+    environment = {'RAG_FAKE_FUNCTION_CALL_RATE': '1'}
+
+    def test_fast_mode_retrieves_less_and_never_calls_tools(self):
+        bot = self.make_chatbot()
+        bot.tool_runner.tools['search_blogs'] = blog_tool
+        self.serve(bot)
+        before = self.mode_requests('fast').get('generated', 0)
+
+        with mock.patch.object(bot, '_retrieve', wraps=bot._retrieve) as retrieve:
+            response = self.client.post(
+                '/api/chatbot/query/', {'question': ON_TOPIC_QUESTION, 'mode': 'fast'},
+                content_type='application/json'
+            )
+
+        data = response.json()
+        self.assertEqual(data['mode'], 'fast')
+        self.assertEqual(retrieve.call_args.args[2], 3)
+        self.assertNotIn('blog-7', [source['source'] for source in data['sources']])
+        self.assertEqual(self.mode_requests('fast')['generated'], before + 1)
+
+    def test_balanced_mode_uses_tools(self):
+        bot = self.make_chatbot()
+        bot.tool_runner.tools['search_blogs'] = blog_tool
+
+        response = bot.query(ON_TOPIC_QUESTION, mode='balanced')
+
+        self.assertEqual(response['mode'], 'balanced')
+        self.assertIn('blog-7', [source['source'] for source in response['sources']])
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_answer_mode('turbo')
+        response = self.client.post(
+            '/api/chatbot/query/', {'question': ON_TOPIC_QUESTION, 'mode': 'turbo'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ThrottledEmbeddingModel(CountingEmbeddingModel):
+    """Rejects the first few batch calls as a quota burst would"""
+
+    def __init__(self, throttled_calls):
+        super().__init__()
+        self.throttled_calls = throttled_calls
+        self.calls = 0
+
+    def get_embeddings(self, texts):
+        self.calls += 1
+        if self.calls <= self.throttled_calls:
+            raise ConnectionError("429 quota exceeded")
+        return super().get_embeddings(texts)
+
+
+class EmbeddingBatchTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, FAKE_BACKEND)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for caller, breaker in (
+            (embedding_caller, CircuitBreaker(failure_threshold=3, reset_timeout=60)),
+            (ingest_embedding_caller, CircuitBreaker(failure_threshold=30, reset_timeout=60)),
+        ):
+            patcher = mock.patch.object(caller, 'breaker', breaker)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ingest_embedding_caller, 'backoff', 0.001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.generator = EmbeddingGenerator()
+
+    def test_batches_respect_item_and_token_limits(self):
+        texts = ["a" * 40] * 5 + ["b" * 400]
+
+        self.assertEqual(pack_batches(texts, max_items=2, max_tokens=1000), [(0, 2), (2, 4), (4, 6)])
+        self.assertEqual(pack_batches(texts, max_items=10, max_tokens=50), [(0, 5), (5, 6)])
+
+    @override_settings(RAG_EMBEDDING_BATCH_SIZE=2)
+    def test_throttled_batches_are_retried_without_touching_the_request_breaker(self):
+        self.generator.model = model = ThrottledEmbeddingModel(throttled_calls=4)
+        updates = []
+
+        embeddings = self.generator.generate_embeddings(
+            ["alpha", "beta", "gamma"], max_concurrency=1, progress=lambda p: updates.append(p.retries)
+        )
+
+        self.assertEqual(embeddings, [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]])
+        self.assertEqual(model.calls, 6)
+        self.assertEqual(updates[-1], 4)
+        # Four failures in a row would have opened the request-path breaker
+        self.assertEqual(embedding_caller.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(ingest_embedding_caller.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retry_delay_is_capped(self):
+        caller = ResilientCaller('test', backoff=1.0, max_backoff=2.0)
+
+        self.assertTrue(all(caller._retry_delay(10) <= 2.0 for _ in range(50)))
+
+
+class WordTokenizer:
+    """Tokenizer stand-in: one id per word (its length), padded to the longest text"""
+
+    def encode_batch(self, texts):
+        ids = [[len(word) for word in text.split()] for text in texts]
+        longest = max(len(row) for row in ids)
+        return [
+            mock.Mock(
+                ids=row + [0] * (longest - len(row)),
+                attention_mask=[1] * len(row) + [0] * (longest - len(row)),
+                type_ids=[0] * longest,
+            )
+            for row in ids
+        ]
+
+
+class TokenEmbeddingSession:
+    """ONNX session stand-in whose token embeddings are (id, 1)"""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, output_names, feeds):
+        input_ids = feeds['input_ids']
+        self.batches.append(input_ids.shape)
+        return [np.stack([input_ids, np.ones_like(input_ids)], axis=-1).astype(np.float32)]
+
+
+class OnnxEmbeddingModelTests(SimpleTestCase):
+    def make_model(self, pooling='mean', batch_size=2):
+        # The model logic is exercised without loading an ONNX file in __init__
+        model = OnnxEmbeddingModel.__new__(OnnxEmbeddingModel)
+        model.batch_size = batch_size
+        model.pooling = pooling
+        model.tokenizer = WordTokenizer()
+        model.session = TokenEmbeddingSession()
+        model.input_names = {'input_ids', 'attention_mask'}
+        return model
+
+    def test_mean_pooling_ignores_padding_and_keeps_text_order(self):
+        model = self.make_model()
+        texts = ["kubernetes clusters on gke", "helm", "ci cd"]
+
+        vectors = [embedding.values for embedding in model.get_embeddings(texts)]
+
+        np.testing.assert_allclose(vectors[0], unit(5.75, 1), rtol=1e-6)
+        np.testing.assert_allclose(vectors[1], unit(4, 1), rtol=1e-6)
+        np.testing.assert_allclose(vectors[2], unit(2, 1), rtol=1e-6)
+        # Shortest texts share a batch padded to two words, the longest runs alone
+        self.assertEqual(model.session.batches, [(2, 2), (1, 4)])
+
+    def test_cls_pooling_takes_the_first_token(self):
+        model = self.make_model(pooling='cls')
+
+        vector, = model.get_embeddings(["terraform on gcp"])
+
+        np.testing.assert_allclose(vector.values, unit(9, 1), rtol=1e-6)
+
+    def test_model_path_is_required(self):
+        with mock.patch.dict(os.environ, {'RAG_ONNX_MODEL_PATH': ''}):
+            with self.assertRaises(ValueError):
+                OnnxEmbeddingModel.from_env()
+
+
+class QuantizationTests(SimpleTestCase):
+    def test_int8_round_trip_is_close(self):
+        vectors = np.asarray([unit(1, 2, 3, 4), unit(-4, 3, -2, 1)], dtype=np.float32)
+        values, scales = quantize(vectors, 'int8')
+        self.assertEqual(values.dtype, np.int8)
+        np.testing.assert_allclose(dequantize(values, scales), vectors, atol=0.01)
+
+    def test_truncate_renormalizes(self):
+        truncated = truncate([unit(3, 4, 12)], 2)
+        self.assertAlmostEqual(float(np.linalg.norm(truncated[0])), 1.0, places=5)
+
+    def test_rescore_drops_unknown_ids_and_orders_by_full_distance(self):
+        vectors = np.asarray([unit(1, 0, 0), unit(0.9, 0.1, 0), unit(0, 0, 1)], dtype=np.float32)
+        compact = CompactVectors.build(['a', 'b', 'c'], vectors, 'float16', index_dim=2)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        compact.save(directory.name)
+        compact = CompactVectors.load(directory.name)
+
+        order, distances, _ = rescore(unit(1, 0, 0), ['c', 'missing', 'b', 'a'], compact, k=3)
+
+        self.assertEqual(order.tolist(), [3, 2, 0])
+        self.assertEqual(len(compact.without(['a'])), 2)
+
+
+class FlatVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = FlatVectorStore(self.directory)
+
+    def add(self, rows, **kwargs):
+        self.store.add_documents(
+            [text for _, _, text, _ in rows],
+            [vector for _, _, _, vector in rows],
+            [{'source': source, 'chunk_id': 0} for _, source, _, _ in rows],
+            ids=[chunk for chunk, _, _, _ in rows],
+            **kwargs
+        )
+
+    def test_search_is_exact_with_squared_l2_distances(self):
+        self.add([
+            ('x', 'x.md', "along x", [2, 0, 0]),
+            ('xy', 'xy.md', "between x and y", [1, 1, 0]),
+            ('z', 'z.md', "along z", [0, 0, 3]),
+        ])
+
+        by_x, by_z = self.store.search_many([[1, 0, 0], [0, 0, 1]], k=2, include_embeddings=True)
+
+        self.assertEqual(by_x['ids'], ['x', 'xy'])
+        self.assertEqual(by_x['documents'], ["along x", "between x and y"])
+        self.assertEqual(by_x['metadatas'][0]['source'], 'x.md')
+        np.testing.assert_allclose(by_x['distances'], [0.0, squared_distance(unit(1, 1, 0), unit(1, 0, 0))], atol=1e-6)
+        np.testing.assert_allclose(by_x['embeddings'][1], unit(1, 1, 0), atol=1e-6)
+        self.assertEqual(by_z['ids'][0], 'z')
+        self.assertEqual(len(self.store.search([1, 0, 0], k=10)['ids']), 3)
+
+    def test_upsert_replaces_the_row(self):
+        self.add([('a', 'a.md', "old text", [1, 0, 0])])
+
+        self.add([('a', 'a.md', "new text", [0, 1, 0])])
+
+        self.assertEqual(self.store.count(), 1)
+        result = self.store.search([0, 1, 0], k=1)
+        self.assertEqual(result['documents'], ["new text"])
+        self.assertAlmostEqual(result['distances'][0], 0.0, places=5)
+
+    def test_deletes_and_model_survive_reopening(self):
+        self.add([
+            ('a', 'a.md', "alpha", [1, 0, 0]),
+            ('b', 'b.md', "beta", [0, 1, 0]),
+        ], embedding_model='model-a')
+
+        self.store.delete_source('a.md')
+        reopened = FlatVectorStore(self.directory)
+
+        self.assertEqual(reopened.count(), 1)
+        self.assertEqual(reopened.embedding_model(), 'model-a')
+        self.assertEqual(reopened.search([1, 0, 0], k=5)['ids'], ['b'])
+
+    def test_empty_store_returns_no_results(self):
+        result = self.store.search([1, 0, 0], k=3, include_embeddings=True)
+
+        self.assertEqual(result, {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': []})
+
+    def test_backend_is_selected_by_setting(self):
+        with override_settings(RAG_VECTOR_STORE_BACKEND='Flat'):
+            self.assertIsInstance(open_vector_store(self.directory), FlatVectorStore)
+        with override_settings(RAG_VECTOR_STORE_BACKEND='faiss'):
+            with self.assertRaises(ValueError):
+                open_vector_store(self.directory)
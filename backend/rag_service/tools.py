@@ -0,0 +1,193 @@
+"""
+Tool execution for the Gemini function-calling loop
+Runs every function call of a model turn concurrently within the request's
+tool time budget, with a short-lived cache of results per call
+"""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import close_old_connections
+
+TOOL_TIMEOUT_MESSAGE = "The tool did not answer in time. Answer from the context you already have."
+TOOL_LIMIT_MESSAGE = "Tool budget exhausted. Answer from the context you already have."
+
+
+def call_in_pool_thread(func, *args, **kwargs):
+    """
+    Call a tool from a long-lived pool thread
+
+    Django only recycles database connections on the request thread, so a
+    connection the server dropped would otherwise stay broken in the pool
+    thread for good.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class ToolResultCache:
+    """Results of recent tool calls, keyed by tool name and normalized arguments"""
+
+    def __init__(self, ttl_seconds=300, max_entries=256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name, args):
+        """Cache key of a call (string arguments compared case-insensitively)"""
+        normalized = {
+            arg: value.strip().lower() if isinstance(value, str) else value
+            for arg, value in args.items()
+        }
+        return f"{name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+    def get(self, key):
+        """Return the cached result, or None on a miss"""
+        if self.ttl_seconds <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        if self.ttl_seconds <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+
+class ToolRunner:
+    """
+    Executes the function calls of one model turn
+
+    Tools are callables taking the call's arguments as keyword arguments and
+    returning (content, sources): the text sent back to the model and the
+    source dicts shown to the user.
+    """
+
+    def __init__(self, tools, cache=None, max_workers=4):
+        """
+        Args:
+            tools: Mapping of function name to tool callable
+            cache: ToolResultCache (None disables caching)
+            max_workers: Maximum tool calls running at once
+        """
+        self.tools = tools
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-tools")
+
+    def run(self, calls, deadline, known=None):
+        """
+        Run function calls concurrently
+
+        Args:
+            calls: List of (name, args) tuples
+            deadline: time.monotonic() value by which results are needed
+            known: Optional mapping of cache key to an already computed result
+
+        Returns:
+            List of (name, content, sources), in call order; calls that miss
+            the deadline get a timeout message and no sources
+        """
+        results, pending = self._lookup(calls, known)
+
+        # Tools run with the request's context so their stages are timed
+        futures = {
+            index: self._executor.submit(contextvars.copy_context().run, call_in_pool_thread, self.tools[name], **args)
+            for index, (name, args) in pending.items()
+        }
+        wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+
+        for index, future in futures.items():
+            name, args = calls[index]
+            if future.done():
+                results[index] = self._finish(name, args, future.exception(), future)
+            else:
+                future.cancel()
+                results[index] = (name, TOOL_TIMEOUT_MESSAGE, [])
+
+        return [results[index] for index in range(len(calls))]
+
+    async def arun(self, calls, deadline, known=None):
+        """Async variant of run (tools run in threads)"""
+        results, pending = self._lookup(calls, known)
+
+        indexes = list(pending)
+        tasks = [
+            asyncio.create_task(asyncio.to_thread(call_in_pool_thread, self.tools[name], **args))
+            for name, args in pending.values()
+        ]
+        if tasks:
+            await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+
+        for index, task in zip(indexes, tasks):
+            name, args = calls[index]
+            if task.done():
+                results[index] = self._finish(name, args, task.exception(), task)
+            else:
+                task.cancel()
+                results[index] = (name, TOOL_TIMEOUT_MESSAGE, [])
+
+        return [results[index] for index in range(len(calls))]
+
+    def _lookup(self, calls, known):
+        """Resolve calls from known results and the cache; return (results, pending calls)"""
+        results = {}
+        pending = {}
+        for index, (name, args) in enumerate(calls):
+            if name not in self.tools:
+                results[index] = (name, f"Unknown function: {name}", [])
+                continue
+
+            key = ToolResultCache.key(name, args)
+            result = (known or {}).get(key)
+            if result is None and self.cache is not None:
+                result = self.cache.get(key)
+            if result is not None:
+                results[index] = (name, *result)
+            else:
+                pending[index] = (name, args)
+        return results, pending
+
+    def _finish(self, name, args, error, done):
+        """Turn a finished call into a result, caching it if it succeeded"""
+        if error is not None:
+            print(f"⚠️  Tool {name} failed: {error}")
+            return (name, f"The tool failed: {error}", [])
+
+        result = done.result()
+        if self.cache is not None:
+            self.cache.put(ToolResultCache.key(name, args), result)
+        return (name, *result)
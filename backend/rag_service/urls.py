@@ -4,12 +4,22 @@ URL patterns for RAG chatbot API
 from django.urls import path
 from .views import (
     ChatbotQueryView,
+    ChatbotStreamView,
+    ChatbotBatchView,
     SuggestedQuestionsView,
-    ChatbotHealthView
+    ChatbotHealthView,
+    ChatbotReadinessView,
+    ChatbotMetricsView,
+    chatbot_query_async
 )
 
 urlpatterns = [
     path('query/', ChatbotQueryView.as_view(), name='chatbot-query'),
+    path('query/async/', chatbot_query_async, name='chatbot-query-async'),
+    path('query/stream/', ChatbotStreamView.as_view(), name='chatbot-query-stream'),
+    path('query/batch/', ChatbotBatchView.as_view(), name='chatbot-query-batch'),
     path('suggestions/', SuggestedQuestionsView.as_view(), name='chatbot-suggestions'),
     path('health/', ChatbotHealthView.as_view(), name='chatbot-health'),
+    path('ready/', ChatbotReadinessView.as_view(), name='chatbot-ready'),
+    path('metrics/', ChatbotMetricsView.as_view(), name='chatbot-metrics'),
 ]
@@ -4,17 +4,61 @@ Stores document embeddings for RAG retrieval
 """
 import chromadb
 from chromadb.config import Settings
+from django.conf import settings
 import os
+import threading
+from .base_store import BaseVectorStore
+from .quantization import META_FILENAME, PRECISIONS, CompactVectors, rescore, truncate
 
-class VectorStore:
+EMBEDDING_MODEL_KEY = "embedding_model"
+COLLECTION_METADATA = {"description": "Vasu's portfolio documentation and journey"}
+
+_DEFAULT = object()
+
+
+class CompactStorageMismatch(ValueError):
+    """Compact storage was asked for on a store already holding plain vectors"""
+
+class VectorStore(BaseVectorStore):
     """ChromaDB-based vector store for portfolio documentation"""
 
-    def __init__(self, persist_directory="./chroma_db"):
-        """Initialize ChromaDB client and collection"""
-        self.persist_directory = persist_directory
+    def __init__(self, persist_directory="./chroma_db", precision=_DEFAULT, index_dim=_DEFAULT):
+        """
+        Initialize ChromaDB client and collection
+
+        Compact storage (applied at ingest) indexes vectors truncated to
+        index_dim in ChromaDB and keeps the full vectors in precision for
+        re-scoring RAG_RESCORE_FACTOR x k candidates per query.
 
-        # Create persist directory if it doesn't exist
-        os.makedirs(persist_directory, exist_ok=True)
+        Args:
+            persist_directory: Directory holding the ChromaDB data and side indexes
+            precision: Precision of the full vectors kept for re-scoring when
+                documents are added ('float32' with no index_dim stores plain
+                vectors; defaults to RAG_VECTOR_PRECISION)
+            index_dim: Dimension of the vectors indexed in ChromaDB (None for
+                full; defaults to RAG_VECTOR_INDEX_DIM)
+
+        Raises:
+            ValueError: If only one of precision and index_dim asks for compact
+                storage (either alone makes the store larger, not smaller)
+        """
+        if precision is _DEFAULT:
+            precision = settings.RAG_VECTOR_PRECISION
+        if index_dim is _DEFAULT:
+            index_dim = settings.RAG_VECTOR_INDEX_DIM or None
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown RAG_VECTOR_PRECISION '{precision}' (expected one of {', '.join(PRECISIONS)})")
+        if (precision == 'float32') != (index_dim is None):
+            # ChromaDB always keeps float32 vectors, so the re-scoring copy only
+            # pays off when it is reduced precision and the index is truncated
+            raise ValueError(
+                "Compact storage needs both RAG_VECTOR_PRECISION (float16 or int8) and RAG_VECTOR_INDEX_DIM; "
+                f"got precision={precision}, index_dim={index_dim}"
+            )
+        super().__init__(persist_directory)
+        self.precision = precision
+        self.index_dim = index_dim
+        self.rescore_factor = settings.RAG_RESCORE_FACTOR
 
         # Initialize ChromaDB client with persistence
         self.client = chromadb.PersistentClient(path=persist_directory)
@@ -22,55 +66,210 @@ class VectorStore:
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name="portfolio_docs",
-            metadata={"description": "Vasu's portfolio documentation and journey"}
+            metadata=COLLECTION_METADATA
         )
 
-    def add_documents(self, documents, embeddings, metadatas, ids=None):
+        # Compact full vectors, reloaded when ingest rewrites them
+        self._compact = None
+        self._compact_mtime = None
+        self._compact_lock = threading.Lock()
+
+    @property
+    def compact_storage(self):
+        """Whether add_documents stores vectors compactly"""
+        return self.precision != 'float32' or self.index_dim is not None
+
+    def add_documents(self, documents, embeddings, metadatas, ids=None, embedding_model=None,
+                      replace_sources=False):
         """
-        Add documents to the vector store
+        Add or update documents in the vector store
+
+        Chunks are upserted under content-hash IDs (see base_store.chunk_id),
+        so adding the same chunk again updates it instead of duplicating it.
 
         Args:
             documents: List of text chunks
             embeddings: List of embedding vectors
             metadatas: List of metadata dicts
-            ids: Optional list of document IDs
+            ids: Optional list of document IDs (defaults to content-hash IDs)
+            embedding_model: Name of the model that produced the embeddings;
+                recorded on an empty store, checked against a filled one
+            replace_sources: Also remove stored chunks of the same sources
+                that are not in this call (edited or dropped chunks)
+
+        Raises:
+            EmbeddingModelMismatch: If the store holds another model's vectors
+            CompactStorageMismatch: If compact storage is configured but the
+                store already holds plain vectors
         """
-        if ids is None:
-            # Generate IDs if not provided
-            existing_count = self.collection.count()
-            ids = [f"doc_{existing_count + i}" for i in range(len(documents))]
+        if self.compact_storage and self._compact_vectors() is None and self.collection.count() > 0:
+            # Truncated vectors next to full ones would break every search
+            raise CompactStorageMismatch(
+                f"Vector store at {self.persist_directory} holds {self.collection.count()} plain float32 vectors; "
+                f"compact storage (precision={self.precision}, index_dim={self.index_dim}) needs a rebuild "
+                "(re-ingest with --rebuild), or keep plain storage by unsetting RAG_VECTOR_PRECISION and RAG_VECTOR_INDEX_DIM"
+            )
+
+        if embedding_model is not None:
+            self.check_embedding_model(embedding_model)
+            if self.embedding_model() is None and self.collection.count() == 0:
+                self.collection.modify(metadata={**COLLECTION_METADATA, EMBEDDING_MODEL_KEY: embedding_model})
+
+        documents, embeddings, metadatas, ids = self._prepare_rows(documents, embeddings, metadatas, ids)
+        if replace_sources:
+            stale = self._stale_ids(ids, metadatas)
+            if stale:
+                self._delete_ids(stale)
 
-        self.collection.add(
+        # A store that already holds compact vectors keeps its layout
+        compact = self._compact_vectors()
+        if compact is None and self.compact_storage:
+            compact = CompactVectors.build(ids, embeddings, self.precision, self.index_dim)
+        elif compact is not None:
+            compact = compact.extend(ids, embeddings)
+        if compact is not None:
+            compact.save(self.persist_directory)
+            embeddings = truncate(embeddings, compact.index_dim).tolist()
+
+        self.collection.upsert(
             documents=documents,
             embeddings=embeddings,
             metadatas=metadatas,
             ids=ids
         )
+        self._bump_version()
 
         print(f"✅ Added {len(documents)} documents to vector store")
 
-    def search(self, query_embedding, k=5):
+    def search_many(self, query_embeddings, k=5, include_embeddings=False):
         """
-        Search for similar documents
+        Search for several queries with a single collection query
 
         Args:
-            query_embedding: Query embedding vector
-            k: Number of results to return
+            query_embeddings: List of query embedding vectors
+            k: Number of results to return per query
+            include_embeddings: Also return the stored embedding of each result
 
         Returns:
-            Dictionary with documents, metadatas, and distances
+            List of result dictionaries (as returned by search), one per query
         """
+        compact = self._compact_vectors()
+        if compact is not None:
+            return self._search_compact(compact, query_embeddings, k)
+
+        include = ['documents', 'metadatas', 'distances']
+        if include_embeddings:
+            include.append('embeddings')
+
+        results = self.collection.query(
+            query_embeddings=list(query_embeddings),
+            n_results=k,
+            include=include
+        )
+
+        all_results = []
+        for i in range(len(query_embeddings)):
+            search_results = {
+                'ids': results['ids'][i] if results['ids'] else [],
+                'documents': results['documents'][i] if results['documents'] else [],
+                'metadatas': results['metadatas'][i] if results['metadatas'] else [],
+                'distances': results['distances'][i] if results['distances'] else []
+            }
+            if include_embeddings:
+                search_results['embeddings'] = list(results['embeddings'][i]) if results['embeddings'] is not None else []
+            all_results.append(search_results)
+
+        return all_results
+
+    def _search_compact(self, compact, query_embeddings, k):
+        """Search the truncated index, then re-score the candidates with the full vectors"""
         results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k
+            query_embeddings=truncate(query_embeddings, compact.index_dim).tolist(),
+            n_results=k * self.rescore_factor,
+            include=['documents', 'metadatas']
         )
 
+        all_results = []
+        for i, query_embedding in enumerate(query_embeddings):
+            ids = results['ids'][i] if results['ids'] else []
+            order, distances, vectors = rescore(query_embedding, ids, compact, k)
+            all_results.append({
+                'ids': [ids[j] for j in order],
+                'documents': [results['documents'][i][j] for j in order],
+                'metadatas': [results['metadatas'][i][j] for j in order],
+                'distances': distances.tolist(),
+                # Full vectors, so callers can compare them with the query
+                'embeddings': list(vectors),
+            })
+
+        return all_results
+
+    def _get_by_ids(self, ids):
+        """Return {id: (document, metadata, embedding)} for the IDs that exist"""
+        results = self.collection.get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+        embeddings = results['embeddings']
+
+        compact = self._compact_vectors()
+        if compact is not None:
+            # ChromaDB holds truncated vectors; the dense leg compares full ones
+            embeddings = list(compact.get(results['ids'])[0])
+
+        # collection.get does not preserve the requested order
         return {
-            'documents': results['documents'][0] if results['documents'] else [],
-            'metadatas': results['metadatas'][0] if results['metadatas'] else [],
-            'distances': results['distances'][0] if results['distances'] else []
+            chunk_id: (results['documents'][i], results['metadatas'][i], embeddings[i])
+            for i, chunk_id in enumerate(results['ids'])
         }
 
+    def _all_documents(self):
+        results = self.collection.get(include=['documents'])
+        return results['ids'], results['documents']
+
+    def _source_ids(self, sources):
+        if sources is not None and not sources:
+            return []
+        where = {'source': {'$in': sorted(sources)}} if sources is not None else None
+        results = self.collection.get(where=where, include=['metadatas'])
+        return [
+            (chunk, (metadata or {}).get('source'))
+            for chunk, metadata in zip(results['ids'], results['metadatas'])
+        ]
+
+    def _delete_ids(self, ids):
+        self.collection.delete(ids=ids)
+
+        compact = self._compact_vectors()
+        if compact is not None:
+            compact.without(ids).save(self.persist_directory)
+
+    def _compact_vectors(self):
+        """Return the compact full vectors (None without compact storage), reloading after a re-ingest"""
+        path = os.path.join(self.persist_directory, META_FILENAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._compact_lock:
+            if mtime != self._compact_mtime:
+                self._compact = CompactVectors.load(self.persist_directory)
+                self._compact_mtime = mtime
+            return self._compact
+
+    def preload(self):
+        """
+        Load on-disk indexes ahead of the first query
+
+        Returns:
+            Number of documents in the store
+        """
+        count = super().preload()
+        self._compact_vectors()
+        return count
+
+    def embedding_model(self):
+        """Name of the embedding model the stored vectors came from (None if not recorded)"""
+        return (self.collection.metadata or {}).get(EMBEDDING_MODEL_KEY)
+
     def count(self):
         """Get total number of documents in store"""
         return self.collection.count()
@@ -80,6 +279,10 @@ class VectorStore:
         self.client.delete_collection("portfolio_docs")
         self.collection = self.client.get_or_create_collection(
             name="portfolio_docs",
-            metadata={"description": "Vasu's portfolio documentation and journey"}
+            metadata=COLLECTION_METADATA
         )
+        self._bump_version()
+
+        self._remove_lexical_index()
+        CompactVectors.remove(self.persist_directory)
         print("✅ Cleared vector store")
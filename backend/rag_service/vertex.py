@@ -0,0 +1,30 @@
+"""
+Shared Vertex AI SDK initialization
+The chatbot and embedding generator both need it, but it only has to run once
+"""
+import threading
+
+import vertexai
+
+_initialized = set()
+_lock = threading.Lock()
+
+
+def init_vertexai(project_id, location):
+    """
+    Initialize the Vertex AI SDK once per process for a project/location
+
+    Args:
+        project_id: GCP project ID
+        location: GCP region
+
+    Returns:
+        True if this call performed the initialization
+    """
+    key = (project_id, location)
+    with _lock:
+        if key in _initialized:
+            return False
+        vertexai.init(project=project_id, location=location)
+        _initialized.add(key)
+        return True
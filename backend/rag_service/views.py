@@ -1,25 +1,45 @@
 """
 API views for RAG chatbot
 """
+import json
+import math
+import threading
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .chatbot import PortfolioRAGChatbot
+from .chatbot import PortfolioRAGChatbot, NO_CONTEXT_ANSWER
+from .metrics import RequestTimings, metrics, stage
+from .admission import AdmissionRejected, ChatbotBatchRateThrottle, ChatbotRateThrottle, admission
+from .deadline import request_deadline
+from .resilience import upstream_stats
+from .warmup import start_warmup, warmup_status
 from .serializers import (
     ChatQuerySerializer,
+    ChatBatchQuerySerializer,
     ChatResponseSerializer,
     SuggestedQuestionsSerializer
 )
 
 # Initialize chatbot (singleton pattern)
 chatbot = None
+_chatbot_lock = threading.Lock()
 
 def get_chatbot():
     """Get or create chatbot instance"""
     global chatbot
     if chatbot is None:
-        chatbot = PortfolioRAGChatbot()
+        # The warm-up thread and early requests may race to build it
+        with _chatbot_lock:
+            if chatbot is None:
+                chatbot = PortfolioRAGChatbot()
     return chatbot
 
 class ChatbotQueryView(APIView):
@@ -27,6 +47,7 @@ class ChatbotQueryView(APIView):
     API endpoint for chatbot queries
     Accepts questions and returns AI-generated answers using RAG
     """
+    throttle_classes = [ChatbotRateThrottle]
 
     def post(self, request):
         """Handle chatbot query"""
@@ -40,27 +61,357 @@ class ChatbotQueryView(APIView):
 
         # Extract parameters
         question = serializer.validated_data['question']
-        k = serializer.validated_data.get('k', 5)
+        k = serializer.validated_data.get('k')
         include_sources = serializer.validated_data.get('include_sources', True)
+        diversity = serializer.validated_data.get('diversity')
+        mode = serializer.validated_data.get('mode') or settings.RAG_DEFAULT_ANSWER_MODE
+        include_timings = serializer.validated_data.get('include_timings', False)
+
+        # The deadline covers the admission wait as well
+        deadline = request_deadline()
+        timings = RequestTimings()
+        try:
+            with timings.activate(), stage('admission_wait'):
+                admit()
+        except AdmissionRejected as e:
+            return overloaded_response(e)
 
         try:
             # Get chatbot and query
             bot = get_chatbot()
-            response = bot.query(
-                question=question,
-                k=k,
-                include_sources=include_sources
-            )
+            with timings.activate():
+                response = bot.query(
+                    question=question,
+                    k=k,
+                    include_sources=include_sources,
+                    diversity=diversity,
+                    deadline=deadline,
+                    mode=mode
+                )
+            metrics.observe_request(timings, request_outcome(response), mode)
+
+            if include_timings:
+                response['timings'] = timings.as_dict()
 
             # Return response
-            return Response(response, status=status.HTTP_200_OK)
+            http_response = Response(response, status=status.HTTP_200_OK)
+            http_response['Server-Timing'] = timings.server_timing()
+            return http_response
+
+        except Exception as e:
+            metrics.observe_request(timings, 'error', mode)
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        finally:
+            release()
+
+class ChatbotStreamView(APIView):
+    """
+    Streaming API endpoint for chatbot queries
+    Emits Server-Sent Events: sources, then answer tokens, then metadata
+    """
+    throttle_classes = [ChatbotRateThrottle]
+
+    def post(self, request):
+        """Handle streaming chatbot query"""
+        serializer = ChatQuerySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        question = serializer.validated_data['question']
+        k = serializer.validated_data.get('k')
+        include_sources = serializer.validated_data.get('include_sources', True)
+        diversity = serializer.validated_data.get('diversity')
+        mode = serializer.validated_data.get('mode') or settings.RAG_DEFAULT_ANSWER_MODE
+        include_timings = serializer.validated_data.get('include_timings', False)
+
+        try:
+            bot = get_chatbot()
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
+        deadline = request_deadline()
+        timings = RequestTimings()
+        try:
+            with timings.activate(), stage('admission_wait'):
+                admit()
+        except AdmissionRejected as e:
+            return overloaded_response(e)
+
+        events = bot.stream_query(
+            question=question,
+            k=k,
+            include_sources=include_sources,
+            diversity=diversity,
+            mode=mode,
+            deadline=deadline
+        )
+        events = timed_stream(events, timings, mode, include_timings)
+
+        # The slot is held until the stream is exhausted or the client goes away
+        response = StreamingHttpResponse(
+            AdmittedStream(format_sse(event, data) for event, data in events),
+            content_type='text/event-stream'
+        )
+        # Disable caching and proxy buffering so tokens reach the client immediately
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class ChatbotBatchView(APIView):
+    """
+    Batch API endpoint for chatbot queries
+    Answers many questions with one embedding call and one vector search,
+    streaming one JSON object per line (NDJSON) as each answer completes
+    """
+    throttle_classes = [ChatbotBatchRateThrottle]
+
+    def post(self, request):
+        """Handle batch chatbot query"""
+        serializer = ChatBatchQuerySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = serializer.validated_data
+
+        try:
+            bot = get_chatbot()
         except Exception as e:
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        try:
+            admit()
+        except AdmissionRejected as e:
+            return overloaded_response(e)
+
+        results = bot.query_batch(
+            questions=data['questions'],
+            k=data.get('k'),
+            include_sources=data.get('include_sources', True),
+            diversity=data.get('diversity'),
+            max_concurrency=data['max_concurrency'],
+            mode=data.get('mode'),
+            generation_slot=BatchGenerationSlots()
+        )
+
+        response = StreamingHttpResponse(
+            AdmittedStream(json.dumps(result) + "\n" for result in results),
+            content_type='application/x-ndjson'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+@csrf_exempt
+@require_POST
+async def chatbot_query_async(request):
+    """
+    Async API endpoint for chatbot queries
+    Same contract as ChatbotQueryView, but runs the overlapped async RAG
+    pipeline so the worker is free while waiting on Vertex AI (serve with ASGI;
+    under the WSGI Procfile it holds a thread like the sync view)
+    """
+    # Same limits as ChatbotQueryView, which gets them from DRF
+    throttle = ChatbotRateThrottle()
+    if not await sync_to_async(throttle.allow_request)(request, None):
+        return throttled_response(throttle)
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    serializer = ChatQuerySerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse({"error": serializer.errors}, status=400)
+
+    question = serializer.validated_data['question']
+    k = serializer.validated_data.get('k')
+    include_sources = serializer.validated_data.get('include_sources', True)
+    diversity = serializer.validated_data.get('diversity')
+    mode = serializer.validated_data.get('mode') or settings.RAG_DEFAULT_ANSWER_MODE
+    include_timings = serializer.validated_data.get('include_timings', False)
+
+    deadline = request_deadline()
+    timings = RequestTimings()
+    try:
+        with timings.activate(), stage('admission_wait'):
+            # The queue wait blocks, so keep it off the event loop
+            await sync_to_async(admit, thread_sensitive=False)()
+    except AdmissionRejected as e:
+        return overloaded_response(e, response_class=JsonResponse)
+
+    try:
+        bot = await sync_to_async(get_chatbot)()
+        with timings.activate():
+            response = await bot.aquery(
+                question=question,
+                k=k,
+                include_sources=include_sources,
+                diversity=diversity,
+                deadline=deadline,
+                mode=mode
+            )
+        metrics.observe_request(timings, request_outcome(response), mode)
+
+        if include_timings:
+            response['timings'] = timings.as_dict()
+
+        http_response = JsonResponse(response, status=200)
+        http_response['Server-Timing'] = timings.server_timing()
+        return http_response
+
+    except Exception as e:
+        metrics.observe_request(timings, 'error', mode)
+        return JsonResponse({"error": str(e)}, status=500)
+
+    finally:
+        release()
+
+def format_sse(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def timed_stream(events, timings, mode, include_timings=False):
+    """
+    Record the stages of a streamed answer and fold them into the metrics
+
+    The server iterates the stream after the view has returned, so the
+    timings are activated around each step instead of around the view. The
+    request is observed when the stream ends, including on disconnect.
+    """
+    answer = []
+    outcome = 'disconnected'
+    try:
+        while True:
+            with timings.activate():
+                try:
+                    event, data = next(events)
+                except StopIteration:
+                    break
+
+            if event == 'token':
+                answer.append(data['text'])
+            elif event == 'error':
+                outcome = 'error'
+            elif event == 'metadata':
+                outcome = request_outcome({**data, 'answer': "".join(answer)})
+                if include_timings:
+                    data = {**data, 'timings': timings.as_dict()}
+            yield event, data
+    finally:
+        events.close()
+        metrics.observe_request(timings, outcome, mode)
+
+def admit():
+    """Take an LLM slot for this request (see admission.AdmissionController)"""
+    if settings.RAG_ADMISSION_ENABLED:
+        admission.acquire()
+
+def release():
+    """Give back the slot taken by admit()"""
+    if settings.RAG_ADMISSION_ENABLED:
+        admission.release()
+
+def overloaded_response(rejection, response_class=Response):
+    """503 telling the client when to retry"""
+    metrics.increment('rejected')
+    response = response_class(
+        {"error": "The chatbot is busy, please try again shortly", "reason": rejection.reason},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(rejection.retry_after)
+    return response
+
+def throttled_response(throttle):
+    """429 for views outside DRF, shaped like DRF's Throttled error"""
+    wait = throttle.wait()
+    detail = "Request was throttled."
+    if wait is not None:
+        detail += f" Expected available in {math.ceil(wait)} seconds."
+    response = JsonResponse({"detail": detail}, status=429)
+    if wait is not None:
+        response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+class AdmittedStream:
+    """Streaming response body that releases its admission slot when closed"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._released = False
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        # Django closes the response after the last chunk or on disconnect,
+        # even if iteration never started
+        self._chunks.close()
+        if not self._released:
+            self._released = True
+            release()
+
+class BatchGenerationSlots:
+    """
+    Admission for the generations of one batch
+
+    The batch's own slot (taken with admit()) carries one generation at a
+    time; each further concurrent generation waits for a background slot, so
+    a batch never has more Gemini calls in flight than slots it holds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._own_slot_free = True
+
+    @contextmanager
+    def __call__(self):
+        with self._lock:
+            own, self._own_slot_free = self._own_slot_free, False
+        if not own and settings.RAG_ADMISSION_ENABLED:
+            admission.acquire_background()
+        try:
+            yield
+        finally:
+            if own:
+                with self._lock:
+                    self._own_slot_free = True
+            elif settings.RAG_ADMISSION_ENABLED:
+                admission.release()
+
+def request_outcome(response):
+    """How a chatbot response was produced, for the request counters"""
+    if response.get('degraded'):
+        return 'degraded'
+    if response.get('precomputed'):
+        return 'precomputed'
+    if response.get('coalesced'):
+        return 'coalesced'
+    if response.get('cached'):
+        return 'cached'
+    if response.get('answer') == NO_CONTEXT_ANSWER:
+        return 'no_context'
+    if 'cached' not in response:
+        # The pipeline caught an exception and answered with an apology
+        return 'error'
+    return 'generated'
+
 class SuggestedQuestionsView(APIView):
     """
     API endpoint to get suggested questions
@@ -90,7 +441,12 @@ class ChatbotHealthView(APIView):
             return Response({
                 "status": "healthy",
                 "vector_store_documents": doc_count,
-                "ready": doc_count > 0
+                "ready": doc_count > 0,
+                "answer_cache": bot.answer_cache.stats() if bot.answer_cache else None,
+                "single_flight": bot.single_flight.stats() if bot.single_flight else None,
+                "admission": admission.stats() if settings.RAG_ADMISSION_ENABLED else None,
+                "tool_cache": bot.tool_runner.cache.stats(),
+                "warmup": warmup_status()
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -98,3 +454,37 @@ class ChatbotHealthView(APIView):
                 "status": "unhealthy",
                 "error": str(e)
             }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+class ChatbotMetricsView(APIView):
+    """
+    Metrics endpoint for chatbot service
+    Per-stage latency and token count histograms of this worker, plus
+    circuit breaker state and hedging stats of the Vertex AI calls
+    """
+
+    def get(self, request):
+        """Return the histograms and request counters"""
+        return Response(
+            {**metrics.snapshot(), "upstream": upstream_stats()},
+            status=status.HTTP_200_OK
+        )
+
+class ChatbotReadinessView(APIView):
+    """
+    Readiness probe for the chatbot service
+    Not ready (503) until the boot-time warm-up has finished
+    """
+
+    def get(self, request):
+        """Report whether this worker has finished warming up"""
+        warmup = warmup_status()
+
+        if warmup['status'] == 'failed':
+            # Try again instead of leaving the worker unready forever
+            start_warmup()
+
+        ready = warmup['status'] in ('ready', 'disabled')
+        return Response(
+            {"ready": ready, "warmup": warmup},
+            status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
@@ -0,0 +1,80 @@
+"""
+Eager chatbot warm-up at worker boot
+Builds the chatbot, loads the indexes and runs a dummy retrieval before the
+first user request lands on the worker
+"""
+import threading
+import time
+
+WARMUP_QUESTION = "What technologies did Vasu master in the sprint?"
+
+_state = {'status': 'disabled', 'timings': {}, 'error': None}
+_lock = threading.Lock()
+_thread = None
+
+
+def start_warmup():
+    """Start the warm-up in a background thread (once per process, again after a failure)"""
+    global _thread
+    with _lock:
+        if _state['status'] in ('warming', 'ready'):
+            return _thread
+
+        _state.update(status='warming', timings={}, error=None)
+        _thread = threading.Thread(target=warm_up, name="rag-warmup", daemon=True)
+        _thread.start()
+        return _thread
+
+
+def warm_up():
+    """Initialize the chatbot and exercise the retrieval path, recording step timings"""
+    from .views import get_chatbot
+
+    timings = {}
+    started = time.perf_counter()
+
+    try:
+        step = time.perf_counter()
+        bot = get_chatbot()
+        timings['chatbot_init'] = _elapsed_ms(step)
+        timings['chatbot_init_steps'] = dict(getattr(bot, 'init_timings', {}))
+
+        step = time.perf_counter()
+        document_count = bot.vector_store.preload()
+        timings['index_load'] = _elapsed_ms(step)
+
+        step = time.perf_counter()
+        embedding = bot.embedding_gen.generate_embedding(WARMUP_QUESTION)
+        timings['dummy_embedding'] = _elapsed_ms(step)
+
+        step = time.perf_counter()
+        bot._retrieve(WARMUP_QUESTION, embedding, k=5)
+        timings['dummy_retrieval'] = _elapsed_ms(step)
+
+        # Answers to the suggested questions are missing or from an older index
+        bot.refresh_suggested_answers()
+
+        timings['total'] = _elapsed_ms(started)
+        with _lock:
+            _state.update(status='ready', timings=timings)
+        print(f"✅ Chatbot warm-up finished in {timings['total']}ms ({document_count} documents)")
+
+    except Exception as e:
+        timings['total'] = _elapsed_ms(started)
+        with _lock:
+            _state.update(status='failed', timings=timings, error=str(e))
+        print(f"❌ Chatbot warm-up failed: {e}")
+
+
+def warmup_status():
+    """Return the warm-up status, step timings and error (if any)"""
+    with _lock:
+        return {
+            'status': _state['status'],
+            'timings': dict(_state['timings']),
+            'error': _state['error'],
+        }
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)